@@ -0,0 +1,116 @@
+# 导入必要的库
+import json  # 导入json模块用于读写JSON行
+import sys  # 导入sys模块用于读写标准输入输出
+import time  # 导入时间模块用于统计耗时
+
+
+def write_records(records, path):
+    """把记录逐行写入JSONL文件
+
+    Args:
+        records: 记录字典的迭代器
+        path: 文件路径，"-" 表示标准输出
+
+    Returns:
+        写入的记录数
+    """
+    count = 0
+    f = sys.stdout if path == "-" else open(path, 'w', encoding='utf-8')
+    try:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return count
+
+
+def read_records(path):
+    """逐行读取JSONL文件中的记录，跳过空行
+
+    Args:
+        path: 文件路径，"-" 表示标准输入
+
+    Returns:
+        逐个产生记录字典的迭代器
+
+    Raises:
+        ValueError: 某一行不是合法的JSON对象
+    """
+    f = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8')
+    try:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"第 {line_number} 行不是合法的JSON: {e}") from e
+            if not isinstance(record, dict):
+                raise ValueError(f"第 {line_number} 行不是JSON对象")
+            yield record
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def export_archive(store, path):
+    """把所有对话导出为JSONL文件，每行一条记录
+
+    每个对话先写一条 {"type": "conversation", ...} 记录，随后是它的 {"type": "message", ...} 记录。
+
+    Args:
+        store: 对话存储（ConversationStore）
+        path: 文件路径，"-" 表示标准输出
+
+    Returns:
+        写入的记录数
+    """
+    return write_records(store.iter_archive(), path)
+
+
+def import_archive(store, path):
+    """从JSONL文件导入对话，已经存在的对话会被跳过
+
+    不经过界面，全部写入数据库后下次启动时才建立侧边栏和搜索索引。
+
+    Args:
+        store: 对话存储（ConversationStore）
+        path: 文件路径，"-" 表示标准输入
+
+    Returns:
+        导入的统计，见 ConversationStore.import_archive
+
+    Raises:
+        ValueError: 文件格式不正确（出错之前的批次已经写入）
+    """
+    try:
+        return store.import_archive(read_records(path))
+    except KeyError as e:
+        raise ValueError(f"记录缺少字段: {e}") from e
+
+
+def run_archive_command(store, export_path=None, import_path=None):
+    """执行命令行中的导出或导入，并打印结果
+
+    Returns:
+        进程的退出码
+    """
+    start = time.perf_counter()
+    try:
+        if export_path is not None:
+            count = export_archive(store, export_path)
+            print(f"已导出 {count} 条记录，用时 {time.perf_counter() - start:.2f} 秒", file=sys.stderr)
+        if import_path is not None:
+            stats = import_archive(store, import_path)
+            print(
+                f"已导入 {stats['conversations']} 个对话、{stats['messages']} 条消息，"
+                f"跳过 {stats['skipped']} 个已存在的对话，用时 {time.perf_counter() - start:.2f} 秒",
+                file=sys.stderr
+            )
+    except (OSError, ValueError) as e:
+        print(f"操作失败: {e}", file=sys.stderr)
+        return 1
+    return 0
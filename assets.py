@@ -0,0 +1,346 @@
+# 导入必要的库
+import os  # 导入os模块用于处理文件路径
+import queue  # 导入队列模块用于把后台缩放的结果交给界面线程
+import threading  # 导入线程模块用于在后台预处理和缩放图片
+from collections import OrderedDict  # 导入有序字典用于实现LRU缓存
+from tkinter import PhotoImage, TclError  # 导入Tk自带的图片类型，读取PNG不需要PIL
+
+# 程序自带的图片目录
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'photos')
+# 预处理时为每张图片生成的尺寸（宽, 高）
+ASSET_SIZES = {
+    'icon.png': [(16, 16), (32, 32), (64, 64)],
+}
+
+
+def default_cache_dir():
+    """返回预处理图片的缓存目录，可用环境变量 DEEPSEEK_ASSET_CACHE 修改"""
+    path = os.environ.get("DEEPSEEK_ASSET_CACHE")
+    if path:
+        return path
+    return os.path.join(os.path.expanduser("~"), ".deepseek_chat", "assets")
+
+
+def asset_path(name):
+    """返回原始图片的路径"""
+    return os.path.join(ASSET_DIR, name)
+
+
+def cache_path(name, size, cache_dir=None):
+    """返回某个尺寸的预处理图片的路径
+
+    Args:
+        name: 图片文件名，例如 icon.png
+        size: (宽, 高)
+        cache_dir: 缓存目录，默认为 default_cache_dir()
+    """
+    stem = os.path.splitext(name)[0]
+    return os.path.join(cache_dir or default_cache_dir(), f"{stem}_{size[0]}x{size[1]}.png")
+
+
+def is_cached(name, size, cache_dir=None):
+    """判断预处理图片是否存在且不比原始图片旧"""
+    path = cache_path(name, size, cache_dir)
+    try:
+        return os.path.getmtime(path) >= os.path.getmtime(asset_path(name))
+    except OSError:
+        return False
+
+
+def missing_sizes(cache_dir=None, sizes=None):
+    """返回还没有预处理的 (图片, 尺寸) 列表"""
+    sizes = sizes if sizes is not None else ASSET_SIZES
+    return [
+        (name, size)
+        for name, name_sizes in sizes.items()
+        for size in name_sizes
+        if os.path.exists(asset_path(name)) and not is_cached(name, size, cache_dir)
+    ]
+
+
+def prepare_cache(cache_dir=None, sizes=None):
+    """用PIL把图片缩放成需要的尺寸，保存为Tk可以直接读取的PNG
+
+    只有这里需要PIL，运行时读取缓存不需要解码和缩放。
+
+    Args:
+        cache_dir: 缓存目录，默认为 default_cache_dir()
+        sizes: 图片文件名 -> 尺寸列表，默认为 ASSET_SIZES
+
+    Returns:
+        新生成的文件数量
+
+    Raises:
+        ImportError: 没有安装PIL
+    """
+    from PIL import Image  # PIL导入较慢，只在预处理时导入
+
+    cache_dir = cache_dir or default_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    written = 0
+    for name, size in missing_sizes(cache_dir, sizes):
+        with Image.open(asset_path(name)) as image:
+            scaled = image.convert('RGBA').resize(size, Image.LANCZOS)
+        path = cache_path(name, size, cache_dir)
+        # 先写入临时文件再替换，避免另一个进程读到写了一半的图片
+        temp_path = path + ".tmp"
+        scaled.save(temp_path, 'PNG')
+        os.replace(temp_path, path)
+        written += 1
+    return written
+
+
+def prepare_cache_in_background(cache_dir=None):
+    """缓存不完整时，在后台线程中预处理图片，下次启动即可直接使用
+
+    Returns:
+        后台线程对象，不需要预处理时返回None
+    """
+    if not missing_sizes(cache_dir):
+        return None
+
+    def run():
+        try:
+            prepare_cache(cache_dir)
+        except ImportError:
+            # 没有安装PIL时只使用原始尺寸的图片
+            pass
+        except OSError as e:
+            print(f"无法预处理图片: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def load_photo(name, size=None, master=None, cache_dir=None):
+    """用Tk直接读取图片，不需要PIL
+
+    Args:
+        name: 图片文件名
+        size: (宽, 高)，为None时读取原始图片
+        master: 图片所属的Tk窗口
+        cache_dir: 缓存目录
+
+    Returns:
+        PhotoImage对象，这个尺寸还没有预处理时返回None
+    """
+    if size is None:
+        path = asset_path(name)
+    elif is_cached(name, size, cache_dir):
+        path = cache_path(name, size, cache_dir)
+    else:
+        return None
+    try:
+        return PhotoImage(master=master, file=path)
+    except TclError:
+        return None
+
+
+def cover_size(source_size, target_size):
+    """保持比例缩放图片，使它刚好铺满目标区域（多出的部分会被裁掉）
+
+    Args:
+        source_size: 原始图片的 (宽, 高)
+        target_size: 目标区域的 (宽, 高)
+
+    Returns:
+        缩放后的 (宽, 高)
+    """
+    ratio = max(target_size[0] / source_size[0], target_size[1] / source_size[1])
+    return max(1, round(source_size[0] * ratio)), max(1, round(source_size[1] * ratio))
+
+
+class AssetManager:
+    """图片资源管理器
+
+    每张原始图片只解码一次；缩放后的PhotoImage按 (图片, 尺寸, DPI缩放比例) 保存在LRU缓存中，
+    超过上限时丢弃最久没有使用的，内存不会随着窗口大小的变化无限增长。
+    背景这类大图可以用 request 在后台线程中缩放，界面线程只负责创建PhotoImage。
+    没有安装PIL时只能使用原始尺寸和预处理好的尺寸。
+    """
+
+    # 检查后台缩放结果的间隔（毫秒）
+    POLL_MS = 16
+
+    def __init__(self, master, max_photos=16, cache_dir=None):
+        """初始化资源管理器
+
+        Args:
+            master: tkinter根窗口对象
+            max_photos: 最多缓存的PhotoImage数量
+            cache_dir: 预处理图片的缓存目录
+        """
+        self.master = master
+        self.max_photos = max_photos
+        self.cache_dir = cache_dir
+        # 图片文件名 -> 解码后的PIL图片，每张图片只解码一次
+        self.sources = {}
+        self.source_lock = threading.Lock()
+        # (图片, 尺寸, 缩放比例) -> PhotoImage，按最近使用的顺序排列
+        self.photos = OrderedDict()
+        # 屏幕的DPI缩放比例，96 DPI为1
+        self.scale = self.dpi_scale()
+        # 图片文件名 -> 最新请求的 (尺寸, 缩放比例, 是否铺满, 回调)
+        self.wanted = {}
+        # 正在后台缩放的图片
+        self.running = set()
+        self.results = queue.Queue()
+        self.poll_job = None
+
+    def dpi_scale(self):
+        """按屏幕DPI计算缩放比例，取0.25的整数倍"""
+        try:
+            scale = self.master.winfo_fpixels('1i') / 96
+        except Exception:
+            return 1.0
+        return max(1.0, round(scale * 4) / 4)
+
+    def physical_size(self, size, scale):
+        """把逻辑尺寸换算成屏幕像素"""
+        return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+    def source(self, name):
+        """返回解码后的原始图片，第一次调用时解码，可以在后台线程中调用
+
+        Returns:
+            PIL图片，没有安装PIL或图片无法读取时返回None
+        """
+        with self.source_lock:
+            if name not in self.sources:
+                try:
+                    from PIL import Image  # PIL导入较慢，需要时才导入
+                    with Image.open(asset_path(name)) as image:
+                        self.sources[name] = image.convert('RGBA')
+                except (ImportError, OSError):
+                    self.sources[name] = None
+            return self.sources[name]
+
+    def remember(self, key, photo):
+        """把PhotoImage放入LRU缓存，超出上限时丢弃最久没有使用的"""
+        self.photos[key] = photo
+        self.photos.move_to_end(key)
+        while len(self.photos) > self.max_photos:
+            self.photos.popitem(last=False)
+
+    def cached(self, key):
+        """从LRU缓存中读取PhotoImage，没有时返回None"""
+        photo = self.photos.get(key)
+        if photo is not None:
+            self.photos.move_to_end(key)
+        return photo
+
+    def photo(self, name, size=None, scale=None):
+        """返回指定尺寸的图片，在界面线程中调用
+
+        依次尝试：LRU缓存、预处理好的PNG（Tk直接读取）、用PIL缩放已解码的原图。
+
+        Args:
+            name: 图片文件名
+            size: 逻辑尺寸 (宽, 高)，为None时使用原始尺寸
+            scale: 缩放比例，默认为屏幕的DPI缩放比例；size已经是屏幕像素时传1
+
+        Returns:
+            PhotoImage对象，无法读取时返回None；正在显示的图片需要调用方保留引用，
+            否则从缓存中丢弃后会被回收
+        """
+        scale = self.scale if scale is None else scale
+        key = (name, size, scale)
+        photo = self.cached(key)
+        if photo is not None:
+            return photo
+
+        if size is None:
+            photo = load_photo(name, master=self.master)
+        else:
+            pixels = self.physical_size(size, scale)
+            photo = load_photo(name, pixels, self.master, self.cache_dir)
+            if photo is None:
+                image = self.source(name)
+                if image is not None:
+                    photo = self.to_photo(image.resize(pixels, self.resample()))
+        if photo is not None:
+            self.remember(key, photo)
+        return photo
+
+    def request(self, name, size, callback, scale=None, cover=False):
+        """在后台线程中缩放图片，完成后在界面线程中调用 callback(photo)
+
+        同一张图片只保留最新的请求：缩放期间又有新的请求（例如连续改变窗口大小）时，
+        当前的缩放完成后直接处理最新的尺寸，中间的尺寸会被跳过。
+
+        Args:
+            name: 图片文件名
+            size: 逻辑尺寸 (宽, 高)
+            callback: 接收PhotoImage的函数
+            scale: 缩放比例，默认为屏幕的DPI缩放比例
+            cover: 为True时保持比例铺满目标尺寸，否则直接缩放到目标尺寸
+        """
+        scale = self.scale if scale is None else scale
+        photo = self.cached((name, size, scale))
+        if photo is not None:
+            self.wanted.pop(name, None)
+            callback(photo)
+            return
+        self.wanted[name] = (size, scale, cover, callback)
+        if name not in self.running:
+            self.start_resize(name)
+
+    def start_resize(self, name):
+        """为图片最新的请求启动后台缩放"""
+        size, scale, cover, callback = self.wanted[name]
+        self.running.add(name)
+
+        def run():
+            image = self.source(name)
+            if image is not None:
+                pixels = self.physical_size(size, scale)
+                if cover:
+                    pixels = cover_size(image.size, pixels)
+                image = image.resize(pixels, self.resample())
+            self.results.put((name, size, scale, image))
+
+        threading.Thread(target=run, daemon=True).start()
+        if self.poll_job is None:
+            self.poll_job = self.master.after(self.POLL_MS, self.poll_results)
+
+    def poll_results(self):
+        """在界面线程中处理后台缩放的结果"""
+        self.poll_job = None
+        while True:
+            try:
+                name, size, scale, image = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.running.discard(name)
+            if image is not None:
+                self.remember((name, size, scale), self.to_photo(image))
+            wanted = self.wanted.get(name)
+            if wanted is None:
+                continue
+            if image is None:
+                # 没有PIL或图片无法读取，放弃这个请求
+                del self.wanted[name]
+            elif wanted[:2] == (size, scale):
+                del self.wanted[name]
+                wanted[3](self.photos[(name, size, scale)])
+            else:
+                # 缩放期间有了更新的请求
+                self.start_resize(name)
+        if self.running and self.poll_job is None:
+            self.poll_job = self.master.after(self.POLL_MS, self.poll_results)
+
+    def to_photo(self, image):
+        """把PIL图片转换成PhotoImage，必须在界面线程中调用"""
+        from PIL import ImageTk
+        return ImageTk.PhotoImage(image, master=self.master)
+
+    def resample(self):
+        """缩放使用的插值方法"""
+        from PIL import Image
+        return Image.LANCZOS
+
+
+if __name__ == '__main__':
+    # 运行 python assets.py 预先生成所有尺寸的图片
+    print(f"已生成 {prepare_cache()} 张图片，保存在 {default_cache_dir()}")
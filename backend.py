@@ -0,0 +1,242 @@
+# 导入必要的库
+import json  # 导入json模块用于编码请求和解析流式数据
+import os  # 导入os模块用于读取环境变量
+import queue  # 导入队列模块用于在线程之间传递文本片段
+import threading  # 导入线程模块用于在后台请求模型
+import time  # 导入时间模块用于统计延迟
+from http_client import HTTPClient  # 导入带连接池和重试的HTTP客户端
+
+# 模型不可用时的默认回复
+BUSY_REPLY = "服务器繁忙，请稍后重试。"
+
+
+class ChatBackend:
+    """模型后端的基类，所有后端都以流式方式返回回复"""
+
+    # 回复是否可以写入回复缓存，固定的提示回复不是模型的回答，不应该被缓存
+    cacheable = True
+
+    def stream_reply(self, history):
+        """根据聊天历史逐段生成回复
+
+        Args:
+            history: 聊天历史，格式为 [{"role": ..., "content": ...}, ...]
+
+        Returns:
+            逐个产生回复文本片段的迭代器
+        """
+        raise NotImplementedError
+
+
+class StaticBackend(ChatBackend):
+    """返回固定回复的后端，在没有配置模型接口时使用"""
+
+    # 默认的回复是繁忙提示，缓存之后配置好接口、服务恢复时还会一直返回它
+    cacheable = False
+
+    def __init__(self, reply=BUSY_REPLY, delay=0.0):
+        """初始化固定回复后端
+
+        Args:
+            reply: 固定的回复内容
+            delay: 每个字符之间的间隔（秒）
+        """
+        self.reply = reply
+        self.delay = delay
+
+    def stream_reply(self, history):
+        """逐字返回固定回复"""
+        for char in self.reply:
+            if self.delay:
+                time.sleep(self.delay)
+            yield char
+
+
+class OpenAICompatibleBackend(ChatBackend):
+    """兼容OpenAI/DeepSeek chat-completions接口的流式后端"""
+
+    def __init__(self, base_url, api_key=None, model="deepseek-chat", system_prompt=None, client=None):
+        """初始化流式后端
+
+        Args:
+            base_url: 接口地址，例如 https://api.deepseek.com
+            api_key: 接口密钥，本地测试服务器可以为空
+            model: 模型名称
+            system_prompt: 系统提示词
+            client: 共用的HTTPClient，为None时使用默认设置新建一个
+        """
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.api_key = api_key
+        self.model = model
+        self.system_prompt = system_prompt
+        # 所有回复共用一个连接池，不会每条消息都重新建立连接
+        self.client = client or HTTPClient()
+
+    def build_messages(self, history):
+        """把聊天历史转换成接口需要的消息列表"""
+        messages = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        for msg in history:
+            messages.append({"role": msg["role"], "content": msg["content"]})
+        return messages
+
+    def stream_reply(self, history):
+        """请求接口并逐段返回模型回复"""
+        body = json.dumps({
+            "model": self.model,
+            "messages": self.build_messages(history),
+            "stream": True
+        }).encode('utf-8')
+        headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        with self.client.request('POST', self.url, body=body, headers=headers) as response:
+            yield from iter_sse_content(response)
+            # 正常读完时连接放回连接池；中途取消时 with 语句会关闭连接
+            response.release()
+
+
+def iter_sse_content(lines):
+    """解析SSE数据流，返回其中的回复文本片段
+
+    Args:
+        lines: 逐行产生字节串的可迭代对象（例如HTTP响应）
+
+    Raises:
+        ConnectionError: 数据流在结束标记之前就断开了，已经返回的内容不完整
+    """
+    finished = False
+    for raw_line in lines:
+        line = raw_line.decode('utf-8').strip()
+        # 忽略空行、注释和非data字段
+        if not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        chunk = json.loads(data)
+        for choice in chunk.get("choices", []):
+            content = choice.get("delta", {}).get("content")
+            if content:
+                yield content
+            if choice.get("finish_reason"):
+                finished = True
+    # 有的接口不发送[DONE]，以finish_reason作为结束
+    if not finished:
+        raise ConnectionError("流式响应在结束前中断")
+
+
+def create_backend_from_env():
+    """根据环境变量创建后端
+
+    DEEPSEEK_BASE_URL、DEEPSEEK_API_KEY 和 DEEPSEEK_MODEL 决定使用的接口，
+    两个都没有设置时使用固定回复后端。
+    DEEPSEEK_CONNECT_TIMEOUT、DEEPSEEK_READ_TIMEOUT（秒）和 DEEPSEEK_MAX_RETRIES 设置网络请求。
+    """
+    base_url = os.environ.get("DEEPSEEK_BASE_URL")
+    api_key = os.environ.get("DEEPSEEK_API_KEY")
+    if not base_url and not api_key:
+        return StaticBackend()
+    return OpenAICompatibleBackend(
+        base_url or "https://api.deepseek.com",
+        api_key=api_key,
+        model=os.environ.get("DEEPSEEK_MODEL", "deepseek-chat"),
+        system_prompt=os.environ.get("DEEPSEEK_SYSTEM_PROMPT"),
+        client=HTTPClient(
+            connect_timeout=float(os.environ.get("DEEPSEEK_CONNECT_TIMEOUT", 10)),
+            read_timeout=float(os.environ.get("DEEPSEEK_READ_TIMEOUT", 60)),
+            max_retries=int(os.environ.get("DEEPSEEK_MAX_RETRIES", 3))
+        )
+    )
+
+
+class LatencyMeter:
+    """统计一次回复的首字延迟和渲染速度"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.last_token_at = None
+        self.token_count = 0
+
+    def record(self, text):
+        """记录一次渲染到界面上的文本片段"""
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.last_token_at = now
+        self.token_count += 1
+
+    @property
+    def time_to_first_token(self):
+        """首字延迟（秒），还没有收到内容时为None"""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def tokens_per_second(self):
+        """首字之后的渲染速度（片段/秒）"""
+        if self.token_count < 2:
+            return None
+        elapsed = self.last_token_at - self.first_token_at
+        if elapsed <= 0:
+            return None
+        return (self.token_count - 1) / elapsed
+
+    def summary(self):
+        """生成便于打印的统计信息"""
+        ttft = self.time_to_first_token
+        tps = self.tokens_per_second
+        ttft_text = f"{ttft * 1000:.0f} ms" if ttft is not None else "-"
+        tps_text = f"{tps:.1f} tokens/s" if tps is not None else "-"
+        return f"首字延迟 {ttft_text}，渲染速度 {tps_text}，共 {self.token_count} 个片段"
+
+
+class StreamWorker:
+    """在后台线程中运行后端，把结果放入队列由界面线程取出"""
+
+    def __init__(self, backend, history):
+        """初始化后台任务
+
+        Args:
+            backend: 使用的模型后端
+            history: 聊天历史的副本
+        """
+        self.backend = backend
+        self.history = history
+        self.events = queue.Queue()
+        self.cancelled = threading.Event()
+        self.meter = LatencyMeter()
+        # 界面线程已经显示的回复内容
+        self.text = ""
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        """启动后台线程"""
+        self.thread.start()
+
+    def cancel(self):
+        """请求停止生成，已经收到的内容会保留"""
+        self.cancelled.set()
+
+    def run(self):
+        """后台线程的主体，逐段读取回复"""
+        try:
+            for text in self.backend.stream_reply(self.history):
+                if self.cancelled.is_set():
+                    break
+                self.events.put(("token", text))
+        except Exception as e:
+            self.events.put(("error", str(e)))
+        self.events.put(("done", None))
+
+    def drain(self):
+        """取出当前所有已到达的事件，不会阻塞"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
@@ -0,0 +1,285 @@
+# 导入必要的库
+import json  # 导入json模块用于写入结果
+import os  # 导入os模块用于处理路径和临时数据库
+import sys  # 导入sys模块用于打印进度
+import tempfile  # 导入临时文件模块用于存放批处理的对话
+import time  # 导入时间模块用于限速和统计吞吐量
+from collections import deque  # 导入双端队列用于排队等待发送的提示
+from archive import read_records  # 导入逐行读取JSONL的函数
+from context import create_context_builder_from_env, estimate_tokens  # 导入聊天历史组装器和token估计
+from scheduler import ReplyScheduler  # 导入按对话排队的回复调度器
+from session import ChatSession, ConversationManager  # 导入对话状态和对话管理器
+from storage import ConversationStore  # 导入SQLite对话存储
+
+# 没有事件时两次轮询之间的间隔（秒）
+POLL_INTERVAL = 0.01
+
+
+class TokenBucket:
+    """令牌桶限速：平均每秒 rate 个请求，允许最多 capacity 个的突发"""
+
+    def __init__(self, rate, capacity=1):
+        """初始化令牌桶
+
+        Args:
+            rate: 每秒补充的令牌数，0表示不限速
+            capacity: 令牌桶的容量
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def delay(self):
+        """返回还要等待多少秒才有令牌，有令牌时为0"""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        """取走一个令牌，调用前 delay 应该返回0"""
+        if self.rate > 0:
+            self.tokens -= 1
+
+
+class BatchItem:
+    """一条批处理任务：一个提示或多轮对话脚本"""
+
+    def __init__(self, item_id, turns):
+        self.id = item_id
+        self.turns = turns
+        self.session = ChatSession()
+        # 下一个要发送的轮次
+        self.next_turn = 0
+        self.replies = []
+        self.errors = []
+        self.tokens = 0
+        self.started_at = None
+
+    @property
+    def finished(self):
+        return len(self.replies) == len(self.turns)
+
+    def result(self):
+        """生成写入结果文件的记录"""
+        return {
+            "id": self.id,
+            # 出错的轮次没有回复（reply 为None），不记录繁忙提示
+            "turns": [{"prompt": prompt, "reply": reply} for prompt, reply in zip(self.turns, self.replies)],
+            "error": "; ".join(self.errors) or None,
+            "tokens": self.tokens,
+            "seconds": round(time.perf_counter() - self.started_at, 3)
+        }
+
+
+def parse_item(record, line_number):
+    """把输入文件中的一条记录转换成任务
+
+    记录可以是 {"id": ..., "prompt": "..."}，也可以是多轮的 {"id": ..., "turns": ["...", "..."]}；
+    没有 id 时使用行号。
+
+    Raises:
+        ValueError: 记录中没有提示
+    """
+    turns = record.get("turns")
+    if turns is None and "prompt" in record:
+        turns = [record["prompt"]]
+    if not turns or not all(isinstance(turn, str) and turn.strip() for turn in turns):
+        raise ValueError(f"第 {line_number} 条记录没有提示")
+    return BatchItem(str(record.get("id", line_number)), turns)
+
+
+def completed_ids(path):
+    """整理已有的结果文件，返回已经成功完成的任务ID，用于中断后继续
+
+    只保留每个ID第一条成功的结果，失败的结果会被删除（这些任务会重新运行），
+    结果文件中每个任务最终只有一条记录。最后一行可能因为中断只写了一半，读不出的行直接丢弃。
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    temporary = path + ".tmp"
+    with open(path, 'r', encoding='utf-8') as f, open(temporary, 'w', encoding='utf-8') as out:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(record, dict) or record.get("error"):
+                continue
+            item_id = str(record.get("id"))
+            if item_id not in done:
+                done.add(item_id)
+                out.write(json.dumps(record, ensure_ascii=False))
+                out.write("\n")
+    os.replace(temporary, path)
+    return done
+
+
+class BatchRunner:
+    """不启动界面，用和界面相同的对话管理器和回复调度器批量运行提示
+
+    同时进行的任务不超过 concurrency 个，发送每一轮之前从令牌桶取令牌。
+    多轮脚本的下一轮在上一轮的回复保存之后才发送，上下文和界面中连续提问时相同。
+    每个任务完成后立即把结果写入文件，中断后再次运行时跳过已经成功的任务。
+    """
+
+    def __init__(self, backend, output, concurrency=4, rate=0, burst=1, store=None):
+        """初始化
+
+        Args:
+            backend: 模型后端
+            output: 结果文件（已打开的文本文件）
+            concurrency: 最多同时进行的任务数量
+            rate: 每秒最多发送的请求数，0表示不限速
+            burst: 限速时允许的突发请求数
+            store: 保存批处理对话的存储，默认保存在内存中
+        """
+        self.manager = ConversationManager(store or ConversationStore(":memory:"))
+        self.scheduler = ReplyScheduler(self.manager, backend, concurrency, create_context_builder_from_env())
+        self.output = output
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        # 等待发送下一轮的任务，已经开始的多轮脚本排在前面
+        self.ready = deque()
+        # 请求 -> 任务
+        self.running = {}
+        # 收到过错误事件的请求，它的回复是繁忙提示而不是模型的回复
+        self.errored = set()
+        self.stats = {"completed": 0, "failed": 0, "requests": 0, "tokens": 0}
+
+    def run(self, items):
+        """运行所有任务，返回统计信息
+
+        Args:
+            items: BatchItem的迭代器，按需要逐个读取，不会一次全部读入内存
+        """
+        items = iter(items)
+        exhausted = False
+        while True:
+            # 在并发和限速允许时发送下一轮
+            while len(self.running) < self.concurrency:
+                if not self.ready and not exhausted:
+                    item = next(items, None)
+                    if item is None:
+                        exhausted = True
+                    else:
+                        self.ready.append(item)
+                if not self.ready or self.bucket.delay() > 0:
+                    break
+                self.bucket.take()
+                self.submit(self.ready.popleft())
+            if not self.running and not self.ready and exhausted:
+                return self.stats
+            events = self.scheduler.poll()
+            for kind, request, data in events:
+                self.handle_event(kind, request, data)
+            if not events:
+                time.sleep(min(POLL_INTERVAL, self.bucket.delay()) or POLL_INTERVAL)
+
+    def submit(self, item):
+        """发送任务的下一轮"""
+        if item.started_at is None:
+            item.started_at = time.perf_counter()
+        request = self.scheduler.submit(item.session, item.turns[item.next_turn])
+        item.next_turn += 1
+        self.running[request] = item
+        self.stats["requests"] += 1
+
+    def handle_event(self, kind, request, data):
+        """处理调度器的事件"""
+        item = self.running.get(request)
+        if item is None:
+            return
+        if kind == "error":
+            item.errors.append(f"第 {len(item.replies) + 1} 轮: {data}")
+            self.errored.add(request)
+        elif kind in ("done", "cancelled"):
+            del self.running[request]
+            if request in self.errored:
+                # 出错的轮次不记录回复，也不计入吞吐量
+                self.errored.discard(request)
+                item.replies.append(None)
+            else:
+                item.replies.append(request.text)
+                tokens = estimate_tokens(request.text)
+                item.tokens += tokens
+                self.stats["tokens"] += tokens
+            if item.finished or item.errors:
+                self.finish(item)
+            else:
+                # 已经开始的脚本优先，尽快完成并释放它的聊天历史
+                self.ready.appendleft(item)
+
+    def finish(self, item):
+        """写入一个任务的结果，出错的任务不再发送剩下的轮次"""
+        self.output.write(json.dumps(item.result(), ensure_ascii=False))
+        self.output.write("\n")
+        self.output.flush()
+        self.stats["failed" if item.errors else "completed"] += 1
+        # 结果已经写入文件，删除这个对话，临时数据库不会随任务数量增长
+        self.manager.delete_conversation(item.session.conversation_id)
+
+    def cancel(self):
+        """中断时取消进行中的请求"""
+        for request in list(self.running):
+            self.scheduler.cancel(request, keep=False)
+        self.running.clear()
+
+
+def run_batch_command(backend, input_path, output_path=None, concurrency=4, rate=0, burst=1):
+    """执行命令行中的批处理，并打印吞吐量
+
+    Args:
+        backend: 模型后端
+        input_path: 提示文件（JSONL），"-" 表示标准输入
+        output_path: 结果文件，默认为输入文件名加上 .results.jsonl
+        concurrency: 最多同时进行的任务数量
+        rate: 每秒最多发送的请求数，0表示不限速
+        burst: 限速时允许的突发请求数
+
+    Returns:
+        进程的退出码
+    """
+    if output_path is None:
+        output_path = ("batch" if input_path == "-" else os.path.splitext(input_path)[0]) + ".results.jsonl"
+    done = completed_ids(output_path)
+
+    def pending_items():
+        for line_number, record in enumerate(read_records(input_path), 1):
+            item = parse_item(record, line_number)
+            if item.id not in done:
+                yield item
+
+    start = time.perf_counter()
+    # 对话写入临时数据库，不会出现在界面的对话列表中，内存占用也不随任务数量增长
+    with tempfile.TemporaryDirectory() as directory, open(output_path, 'a', encoding='utf-8') as output:
+        store = ConversationStore(os.path.join(directory, "batch.db"), compress_level=0)
+        runner = BatchRunner(backend, output, concurrency, rate, burst, store)
+        try:
+            stats = runner.run(pending_items())
+            code = 0
+        except KeyboardInterrupt:
+            runner.cancel()
+            stats = runner.stats
+            print("已中断，再次运行相同的命令会跳过已经完成的任务", file=sys.stderr)
+            code = 130
+        except (OSError, ValueError) as e:
+            runner.cancel()
+            stats = runner.stats
+            print(f"操作失败: {e}", file=sys.stderr)
+            code = 1
+        finally:
+            store.close()
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(
+        f"完成 {stats['completed']} 个任务，失败 {stats['failed']} 个，跳过 {len(done)} 个已完成的任务，"
+        f"结果写入 {output_path}\n"
+        f"用时 {elapsed:.2f} 秒，{stats['requests'] / elapsed:.2f} 请求/秒，"
+        f"{stats['tokens'] / elapsed:.1f} tokens/秒（估计值）",
+        file=sys.stderr
+    )
+    return code
@@ -0,0 +1,127 @@
+# 消息压缩的测试：不同压缩级别、有无预设字典时的压缩率，以及打开对话时读取和解压的延迟
+# 用法：python benchmarks/bench_compression.py --conversations 200 --per-conversation 200
+#       python benchmarks/bench_compression.py --db ~/.deepseek_chat/conversations.db   （使用真实的对话）
+import argparse  # 导入命令行参数解析模块
+import os  # 导入os模块用于处理路径
+import random  # 导入随机数模块用于生成测试数据
+import sys  # 导入sys模块用于设置导入路径
+import tempfile  # 导入临时文件模块用于创建测试数据库
+import time  # 导入时间模块用于计时
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compressor import BodyCodec, train_dictionary  # noqa: E402
+from storage import ConversationStore  # noqa: E402
+from synthetic import percentile, random_history  # noqa: E402
+
+LEVELS = (0, 1, 3, 6, 9)
+
+
+def load_conversations(args):
+    """返回测试使用的对话，每个对话是消息内容的列表"""
+    if args.db:
+        store = ConversationStore(os.path.expanduser(args.db), compress_level=0)
+        try:
+            ids = [row[0] for row in store.list_conversations()][-args.conversations:]
+            return [[msg.content for msg in store.load_messages(conversation_id)] for conversation_id in ids]
+        finally:
+            store.close()
+    rng = random.Random(args.seed)
+    return [
+        [msg["content"] for msg in random_history(rng, args.per_conversation, args.chars)]
+        for _ in range(args.conversations)
+    ]
+
+
+def measure_codec(codec, conversations):
+    """压缩所有对话，返回 (压缩率, 每条消息的压缩耗时微秒, 每个对话的解压耗时毫秒列表)"""
+    raw = stored = 0
+    encode_time = 0.0
+    encoded = []
+    for messages in conversations:
+        rows = []
+        start = time.perf_counter()
+        for text in messages:
+            rows.append(codec.encode(text))
+        encode_time += time.perf_counter() - start
+        for text, (content, body, dictionary_id) in zip(messages, rows):
+            raw += len(text.encode('utf-8'))
+            stored += len(body) if body is not None else len(content.encode('utf-8'))
+        encoded.append(rows)
+    decode_ms = []
+    for rows in encoded:
+        start = time.perf_counter()
+        for row in rows:
+            codec.decode(*row)
+        decode_ms.append((time.perf_counter() - start) * 1000)
+    count = sum(len(messages) for messages in conversations)
+    return raw / stored, encode_time / count * 1e6, decode_ms
+
+
+def measure_store(level, conversations, directory):
+    """按实际的存储方式写入数据库，返回 (数据库大小, 打开对话的耗时毫秒列表)"""
+    path = os.path.join(directory, f"level{level}.db")
+    store = ConversationStore(path, compress_level=level)
+    records = []
+    for index, messages in enumerate(conversations):
+        conversation_id = f"c{index}"
+        records.append({"type": "conversation", "id": conversation_id, "title": conversation_id, "timestamp": index})
+        records.extend({"type": "message", "conversation_id": conversation_id,
+                        "role": "user" if i % 2 == 0 else "assistant", "content": text}
+                       for i, text in enumerate(messages))
+    store.import_archive(records)
+    store.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    store.connection.execute("VACUUM")
+    size = os.path.getsize(path)
+    load_ms = []
+    for index in range(len(conversations)):
+        start = time.perf_counter()
+        store.load_messages(f"c{index}")
+        load_ms.append((time.perf_counter() - start) * 1000)
+    store.close()
+    return size, load_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息压缩测试")
+    parser.add_argument('--conversations', type=int, default=200, help="对话数量")
+    parser.add_argument('--per-conversation', type=int, default=200, help="每个对话的消息条数")
+    parser.add_argument('--chars', type=int, default=200, help="平均每条消息的字符数")
+    parser.add_argument('--db', help="使用这个数据库中的对话代替合成数据")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    conversations = load_conversations(args)
+    if len(conversations) < 2:
+        print("对话太少，无法测试")
+        return
+    # 前一半用于训练字典，后一半用于测试
+    half = len(conversations) // 2
+    start = time.perf_counter()
+    dictionary = train_dictionary(text for messages in conversations[:half] for text in messages)
+    print(f"训练字典用时 {(time.perf_counter() - start) * 1000:.0f} ms，大小 {len(dictionary)} 字节")
+    if not args.db:
+        print("合成数据由随机的字组成，重复很少，压缩率是下限；用 --db 测试真实的对话")
+    test = conversations[half:]
+
+    print("\n级别  字典  压缩率  压缩(us/条)  解压一个对话 p50/p95 (ms)")
+    for level in LEVELS:
+        for use_dictionary in (False, True):
+            if level == 0 and use_dictionary:
+                continue
+            codec = BodyCodec(level)
+            if use_dictionary and dictionary:
+                codec.add_dictionary(1, dictionary)
+            ratio, encode_us, decode_ms = measure_codec(codec, test)
+            print(f"{level:>4}  {'有' if use_dictionary else '无':>3}  {ratio:6.2f}  {encode_us:11.1f}  "
+                  f"{percentile(decode_ms, 50):.2f} / {percentile(decode_ms, 95):.2f}")
+
+    print("\n写入数据库（自动训练字典）后打开对话的延迟")
+    print("级别  数据库大小(MB)  打开 p50/p95 (ms)")
+    with tempfile.TemporaryDirectory() as directory:
+        for level in LEVELS:
+            size, load_ms = measure_store(level, conversations, directory)
+            print(f"{level:>4}  {size / 1024 / 1024:14.1f}  {percentile(load_ms, 50):.2f} / {percentile(load_ms, 95):.2f}")
+
+
+if __name__ == '__main__':
+    main()
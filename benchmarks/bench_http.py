@@ -0,0 +1,86 @@
+# HTTP客户端的测试：对注入了故障的本地测试服务器发送请求，检查连接复用、重试和中途断开的处理
+# 用法：python benchmarks/bench_http.py --requests 200 --concurrency 8 --rate-limit-every 5 --drop-rate 0.05
+import argparse  # 导入命令行参数解析模块
+import os  # 导入os模块用于处理路径
+import sys  # 导入sys模块用于设置导入路径
+import threading  # 导入线程模块用于并发发送请求
+import time  # 导入时间模块用于计时
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend import OpenAICompatibleBackend  # noqa: E402
+from http_client import HTTPClient  # noqa: E402
+from stub_server import make_server  # noqa: E402
+from synthetic import summarize  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP客户端故障注入测试")
+    parser.add_argument('--requests', type=int, default=100, help="请求总数")
+    parser.add_argument('--concurrency', type=int, default=4, help="同时进行的请求数")
+    parser.add_argument('--reply', default="你好，这是一条测试回复。", help="测试服务器返回的内容")
+    parser.add_argument('--delay', type=float, default=0.002, help="每个片段之间的间隔（秒）")
+    parser.add_argument('--first-delay', type=float, default=0.02, help="首个片段之前的等待（秒）")
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="每隔几个请求返回一次429")
+    parser.add_argument('--retry-after', type=int, default=0, help="429响应的Retry-After（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回503的概率")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="流式响应中途断开的概率")
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--backoff', type=float, default=0.05, help="第一次重试的最长等待时间（秒）")
+    args = parser.parse_args()
+
+    server = make_server(
+        port=0, reply=args.reply, delay=args.delay, first_delay=args.first_delay,
+        rate_limit_every=args.rate_limit_every, retry_after=args.retry_after,
+        error_rate=args.error_rate, drop_rate=args.drop_rate
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = HTTPClient(read_timeout=10, max_retries=args.max_retries, backoff_base=args.backoff)
+    backend = OpenAICompatibleBackend(f"http://127.0.0.1:{server.server_address[1]}", client=client)
+
+    latencies = []
+    first_tokens = []
+    outcomes = {"ok": 0, "incomplete": 0, "failed": 0}
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def worker():
+        for _ in counter:
+            start = time.perf_counter()
+            first = None
+            text = ""
+            try:
+                for part in backend.stream_reply([{"role": "user", "content": "你好"}]):
+                    if first is None:
+                        first = time.perf_counter() - start
+                    text += part
+                outcome = "ok" if text == args.reply else "incomplete"
+            except Exception:
+                outcome = "incomplete" if text else "failed"
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == "ok":
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    first_tokens.append(first * 1000)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"完成 {args.requests} 个请求，用时 {elapsed:.2f} 秒")
+    print(f"结果：成功 {outcomes['ok']}，中途断开 {outcomes['incomplete']}，失败 {outcomes['failed']}")
+    print(f"客户端：{client.stats}")
+    print(f"服务器：{server.stats}")
+    if latencies:
+        total = summarize(latencies)
+        ttft = summarize(first_tokens)
+        print(f"总耗时：p50 {total['p50_ms']:.1f} ms，p95 {total['p95_ms']:.1f} ms，p99 {total['p99_ms']:.1f} ms")
+        print(f"首字延迟：p50 {ttft['p50_ms']:.1f} ms，p95 {ttft['p95_ms']:.1f} ms，p99 {ttft['p99_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# 聊天历史的内存测试：比较从数据库读取的消息保存为字典列表和保存为Message的内存占用
+# 用法：python benchmarks/bench_memory.py --messages 300000
+import argparse  # 导入命令行参数解析模块
+import gc  # 导入垃圾回收模块，测量前先回收
+import os  # 导入os模块用于处理路径
+import random  # 导入随机数模块用于生成测试数据
+import sys  # 导入sys模块用于设置导入路径
+import time  # 导入时间模块用于计时
+import tracemalloc  # 导入tracemalloc用于统计内存分配
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from messages import MessageLog  # noqa: E402
+from storage import ConversationStore  # noqa: E402
+from synthetic import populate_store  # noqa: E402
+
+
+def load_dicts(store, conversation_id):
+    """按原来的格式读取一个对话：每条消息一个字典"""
+    rows = store.connection.execute(
+        "SELECT role, content, created_at, tokens FROM messages WHERE conversation_id = ? ORDER BY id",
+        (conversation_id,)
+    )
+    return [{"role": role, "content": content, "created_at": created_at, "tokens": tokens}
+            for role, content, created_at, tokens in rows]
+
+
+def load_logs(store, conversation_id):
+    """按现在的格式读取一个对话：Message组成的MessageLog"""
+    return MessageLog(store.load_messages(conversation_id))
+
+
+def measure(loader, store, conversation_ids):
+    """读取所有对话，返回 (占用的字节数, 用时秒数)，内容字符串在两种格式中相同，也计算在内"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    histories = [loader(store, conversation_id) for conversation_id in conversation_ids]
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del histories
+    return size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天历史的内存测试")
+    parser.add_argument('--messages', type=int, default=200000, help="消息总数")
+    parser.add_argument('--per-conversation', type=int, default=200, help="每个对话的消息条数")
+    parser.add_argument('--chars', type=int, default=60, help="平均每条消息的字符数")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    store = ConversationStore(":memory:")
+    conversations = max(1, args.messages // args.per_conversation)
+    print(f"生成 {conversations} 个对话，每个 {args.per_conversation} 条消息...")
+    conversation_ids = populate_store(store, conversations, args.per_conversation, args.chars, seed=args.seed)
+    random.Random(args.seed).shuffle(conversation_ids)
+    total = conversations * args.per_conversation
+
+    # 只统计内容字符串，作为两种格式共同的部分
+    gc.collect()
+    tracemalloc.start()
+    contents = [row[0] for row in store.connection.execute("SELECT content FROM messages")]
+    content_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del contents
+
+    results = {}
+    for name, loader in (("字典列表", load_dicts), ("Message", load_logs)):
+        size, elapsed = measure(loader, store, conversation_ids)
+        results[name] = size
+        overhead = (size - content_size) / total
+        print(f"{name}：共 {size / 1024 / 1024:.1f} MB（内容 {content_size / 1024 / 1024:.1f} MB），"
+              f"每条消息额外 {overhead:.0f} 字节，读取用时 {elapsed:.2f} 秒")
+    dict_overhead = results["字典列表"] - content_size
+    log_overhead = results["Message"] - content_size
+    print(f"除内容外的内存减少 {(1 - log_overhead / dict_overhead) * 100:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
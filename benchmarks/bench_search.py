@@ -0,0 +1,51 @@
+# 搜索索引的性能测试：建立索引的时间和查询延迟
+# 用法：python benchmarks/bench_search.py --messages 1000000
+import argparse  # 导入命令行参数解析模块
+import os  # 导入os模块用于处理路径
+import random  # 导入随机数模块用于生成测试数据
+import sys  # 导入sys模块用于设置导入路径
+import time  # 导入时间模块用于计时
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search_index import SearchIndex  # noqa: E402
+from synthetic import percentile, random_message  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索索引性能测试")
+    parser.add_argument('--messages', type=int, default=200000, help="测试消息数量")
+    parser.add_argument('--length', type=int, default=60, help="平均消息长度（字符）")
+    parser.add_argument('--cjk', type=float, default=0.9, help="中文片段所占的比例")
+    parser.add_argument('--queries', type=int, default=200, help="查询次数")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"生成 {args.messages} 条测试消息...")
+    messages = [random_message(rng, rng.randint(args.length // 2, args.length * 3 // 2), args.cjk) for _ in range(args.messages)]
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.build(enumerate(messages, 1))
+    build_time = time.perf_counter() - start
+    print(f"建立索引：{build_time:.2f} s（{args.messages / build_time:.0f} 条/秒），词表大小 {len(index.postings)}")
+
+    # 从消息中截取片段作为查询，覆盖单字、词和短句
+    queries = []
+    for _ in range(args.queries):
+        text = rng.choice(messages)
+        size = rng.choice([1, 2, 4, 8])
+        offset = rng.randint(0, max(0, len(text) - size))
+        queries.append(text[offset:offset + size])
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"查询延迟：p50 {percentile(latencies, 50):.2f} ms，p95 {percentile(latencies, 95):.2f} ms，"
+          f"p99 {percentile(latencies, 99):.2f} ms，最大 {max(latencies):.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
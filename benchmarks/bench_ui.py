@@ -0,0 +1,273 @@
+# 聊天界面热点路径的性能测试，可以在没有显示器的Linux上通过Xvfb运行
+# 用法：python benchmarks/bench_ui.py --output bench.json
+# 没有DISPLAY时，如果安装了Xvfb会自动启动一个虚拟显示器，也可以用 xvfb-run 运行。
+# 每个测试项在单独的子进程中运行，峰值内存（RSS）互不影响；结果以JSON输出，便于比较不同提交。
+import argparse  # 导入命令行参数解析模块
+import json  # 导入json模块用于输出结果
+import os  # 导入os模块用于处理路径和环境变量
+import platform  # 导入platform模块用于记录运行环境
+import resource  # 导入resource模块用于读取峰值内存
+import shutil  # 导入shutil模块用于查找Xvfb
+import subprocess  # 导入subprocess模块用于运行子进程
+import sys  # 导入sys模块用于设置导入路径
+import tempfile  # 导入tempfile模块用于创建临时数据库
+import time  # 导入时间模块用于计时
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import populate_store, random_message, summarize  # noqa: E402
+
+# 所有测试项
+SCENARIOS = [
+    "open_chat", "switch_chat", "append_message", "delete_conversation", "populate_sidebar", "resize_window",
+    "stream_code"
+]
+# 使用 --sidebar-sizes 作为对话数量的测试项
+SIDEBAR_SCENARIOS = ("populate_sidebar", "resize_window")
+
+
+def ensure_display():
+    """确保有可用的X显示器，没有时尝试启动Xvfb
+
+    Returns:
+        启动的Xvfb进程，使用已有显示器时为None
+    """
+    if os.environ.get("DISPLAY"):
+        return None
+    if not shutil.which("Xvfb"):
+        sys.exit("没有可用的显示器：请设置DISPLAY、安装Xvfb，或使用 xvfb-run 运行")
+    for number in range(99, 120):
+        if os.path.exists(f"/tmp/.X{number}-lock"):
+            continue
+        process = subprocess.Popen(
+            ["Xvfb", f":{number}", "-screen", "0", "1600x900x24", "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        # 等待Xvfb创建套接字
+        for _ in range(50):
+            if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+                os.environ["DISPLAY"] = f":{number}"
+                return process
+            time.sleep(0.1)
+        process.terminate()
+    sys.exit("无法启动Xvfb")
+
+
+def make_window(db_path):
+    """使用指定的数据库创建聊天窗口，并等待初始化完成"""
+    os.environ["DEEPSEEK_CHAT_DB"] = db_path
+    from tkinter import Tk
+    from main import ChatWindow
+    root = Tk()
+    window = ChatWindow(root)
+    # 不等待窗口显示，直接加载延后的对话列表和搜索索引
+    window.finish_startup()
+    settle(root, window)
+    wait_for_index(window)
+    return root, window
+
+
+def settle(root, window):
+    """等待后台读取的对话打开，写入渲染缓冲区并处理布局，使计时包含界面更新"""
+    while window.loading_conversation_id is not None:
+        root.update()
+        time.sleep(0.001)
+    window.renderer.flush()
+    root.update_idletasks()
+
+
+def wait_for_index(window, timeout=600):
+    """等待后台的搜索索引建立完成，避免影响计时"""
+    deadline = time.time() + timeout
+    while window.manager.search_index.building and time.time() < deadline:
+        time.sleep(0.05)
+
+
+def measure(root, window, action, repeat):
+    """重复执行一个操作并记录每次的耗时（毫秒）
+
+    Args:
+        action: 接收本次序号的函数
+    """
+    latencies = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        action(index)
+        settle(root, window)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def run_scenario(name, size, args, db_path):
+    """在当前进程中运行一个测试项，返回延迟列表"""
+    from storage import ConversationStore
+
+    store = ConversationStore(db_path)
+    if name == "populate_sidebar":
+        # 侧边栏测试：size个对话，计时包含创建窗口和第一次布局
+        populate_store(store, size, 2, args.chars, args.cjk, args.seed)
+        store.close()
+        latencies = []
+        for _ in range(args.sidebar_repeat):
+            start = time.perf_counter()
+            root, window = make_window(db_path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            root.destroy()
+        return latencies
+    if name == "resize_window":
+        # 侧边栏有size个对话时拖动窗口大小：每次改变一次尺寸，计时包含空闲时的布局
+        populate_store(store, size, 2, args.chars, args.cjk, args.seed)
+        store.close()
+        root, window = make_window(db_path)
+
+        def action(index):
+            root.geometry(f"{1000 + index % 40 * 10}x{700 + index % 25 * 8}")
+            root.update()
+        latencies = measure(root, window, action, args.repeat)
+        root.destroy()
+        return latencies
+
+    conversations = max(2, args.conversations)
+    if name == "delete_conversation":
+        conversations = max(conversations, args.repeat + 1)
+    ids = populate_store(store, conversations, size, args.chars, args.cjk, args.seed)
+    store.close()
+    root, window = make_window(db_path)
+
+    if name == "open_chat":
+        # 每次都从一个新对话打开已保存的对话
+        def action(index):
+            window.start_new_conversation()
+            window.load_conversation(ids[index % len(ids)])
+    elif name == "switch_chat":
+        # 在两个已保存的对话之间来回切换
+        window.load_conversation(ids[0])
+        settle(root, window)
+
+        def action(index):
+            window.load_conversation(ids[(index + 1) % 2])
+    elif name == "append_message":
+        # 在一个长对话中追加消息（不请求模型）
+        window.load_conversation(ids[0])
+        settle(root, window)
+        import random
+        rng = random.Random(args.seed)
+        texts = [random_message(rng, args.chars, args.cjk) for _ in range(args.repeat)]
+
+        def action(index):
+            window.display_message("你", texts[index], key=len(window.chat_history))
+            window.manager.append_message("user", texts[index])
+    elif name == "delete_conversation":
+        def action(index):
+            window.manager.delete_conversation(ids[index])
+    elif name == "stream_code":
+        # 在一个长对话之后流式显示一段很长的代码回复，每次追加一行（分成几个片段），计时为每一帧的写入
+        window.load_conversation(ids[0])
+        placeholder = window.display_message("DeepSeek", "")
+        window.append_to_message(placeholder, "下面是代码：\n```python\n")
+        settle(root, window)
+        lines = [f"    result_{i} = compute(value_{i}, **options)  # 第 {i} 行\n" for i in range(args.code_lines)]
+
+        def action(index):
+            line = lines[index % len(lines)]
+            for start in range(0, len(line), 12):
+                window.append_to_message(placeholder, line[start:start + 12])
+        latencies = measure(root, window, action, args.code_lines)
+        root.destroy()
+        return latencies
+    else:
+        raise ValueError(f"未知的测试项: {name}")
+
+    latencies = measure(root, window, action, args.repeat)
+    root.destroy()
+    return latencies
+
+
+def run_child(args):
+    """子进程入口：运行一个测试项并以JSON输出结果"""
+    ensure_display()
+    with tempfile.TemporaryDirectory() as directory:
+        latencies = run_scenario(args.run_scenario, args.size, args, os.path.join(directory, "bench.db"))
+    result = {"scenario": args.run_scenario, "size": args.size}
+    result.update(summarize(latencies))
+    # Linux上ru_maxrss的单位是KB
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(result))
+
+
+def git_commit():
+    """返回当前的git提交，无法获取时返回None"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天界面热点路径性能测试")
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS), help="要运行的测试项，用逗号分隔")
+    parser.add_argument('--messages', type=int, default=500, help="每个对话的消息条数")
+    parser.add_argument('--chars', type=int, default=200, help="平均每条消息的字符数")
+    parser.add_argument('--cjk', type=float, default=0.9, help="中文片段所占的比例（0到1）")
+    parser.add_argument('--conversations', type=int, default=20, help="打开、切换对话测试使用的对话数量")
+    parser.add_argument('--sidebar-sizes', default="100,10000,100000", help="侧边栏测试的对话数量，用逗号分隔")
+    parser.add_argument('--repeat', type=int, default=50, help="每个测试项的重复次数")
+    parser.add_argument('--sidebar-repeat', type=int, default=3, help="侧边栏测试的重复次数")
+    parser.add_argument('--code-lines', type=int, default=5000, help="流式代码回复测试的代码行数")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="结果JSON文件，默认输出到标准输出")
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        run_child(args)
+        return
+
+    xvfb = ensure_display()
+    try:
+        results = []
+        for name in args.scenarios.split(","):
+            if name in SIDEBAR_SCENARIOS:
+                sizes = [int(size) for size in args.sidebar_sizes.split(",")]
+            else:
+                sizes = [args.messages]
+            for size in sizes:
+                print(f"运行 {name}（{size}）...", file=sys.stderr)
+                command = [sys.executable, os.path.abspath(__file__), '--run-scenario', name, '--size', str(size)]
+                for option in ('chars', 'cjk', 'conversations', 'repeat', 'sidebar_repeat', 'code_lines', 'seed'):
+                    command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+                output = subprocess.check_output(command, cwd=ROOT_DIR)
+                results.append(json.loads(output.decode().strip().splitlines()[-1]))
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "messages": args.messages,
+            "chars": args.chars,
+            "cjk": args.cjk,
+            "conversations": args.conversations,
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
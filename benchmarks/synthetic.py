@@ -0,0 +1,99 @@
+# 生成性能测试使用的合成对话数据
+import random  # 导入随机数模块用于生成测试数据
+import time  # 导入时间模块用于生成时间戳
+import uuid  # 导入uuid模块用于生成对话ID
+
+# 生成测试消息使用的常用汉字和英文单词
+COMMON_CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处理府研质"
+WORDS = ["python", "tkinter", "deepseek", "api", "model", "token", "cache", "sqlite", "thread", "error",
+         "the", "request", "response", "stream", "window", "message", "history", "sidebar"]
+
+
+def random_message(rng, length, cjk_ratio=0.9):
+    """生成一条中英混合的测试消息
+
+    Args:
+        rng: random.Random对象
+        length: 消息的大致长度（字符）
+        cjk_ratio: 中文片段所占的比例（0到1）
+    """
+    parts = []
+    size = 0
+    while size < length:
+        if rng.random() < cjk_ratio:
+            part = "".join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(4, 16))) + rng.choice("，。？！")
+        else:
+            part = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))) + rng.choice(", . ? ! ")
+        parts.append(part)
+        size += len(part)
+    return "".join(parts)
+
+
+def random_history(rng, messages, chars, cjk_ratio=0.9):
+    """生成一段聊天历史，用户和助手交替发言
+
+    Args:
+        rng: random.Random对象
+        messages: 消息条数
+        chars: 平均每条消息的字符数
+        cjk_ratio: 中文片段所占的比例
+    """
+    history = []
+    for index in range(messages):
+        role = "user" if index % 2 == 0 else "assistant"
+        length = rng.randint(max(1, chars // 2), max(1, chars * 3 // 2))
+        history.append({"role": role, "content": random_message(rng, length, cjk_ratio)})
+    return history
+
+
+def populate_store(store, conversations, messages, chars, cjk_ratio=0.9, seed=1):
+    """向存储中批量写入合成对话
+
+    Args:
+        store: ConversationStore对象
+        conversations: 对话数量
+        messages: 每个对话的消息条数
+        chars: 平均每条消息的字符数
+        cjk_ratio: 中文片段所占的比例
+        seed: 随机数种子
+
+    Returns:
+        写入的对话ID列表
+    """
+    rng = random.Random(seed)
+    now = time.time()
+    conversation_ids = []
+    with store.connection:
+        for index in range(conversations):
+            conversation_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            history = random_history(rng, messages, chars, cjk_ratio)
+            title = history[0]["content"][:20] if history else "新对话"
+            timestamp = now - (conversations - index) * 60
+            store.connection.execute(
+                "INSERT INTO conversations (id, title, timestamp) VALUES (?, ?, ?)",
+                (conversation_id, title, timestamp)
+            )
+            store.connection.executemany(
+                "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                [(conversation_id, msg["role"], msg["content"], timestamp) for msg in history]
+            )
+            conversation_ids.append(conversation_id)
+    return conversation_ids
+
+
+def percentile(values, p):
+    """计算百分位数"""
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(latencies):
+    """汇总一组延迟（毫秒），返回p50/p95/p99等统计值"""
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(max(latencies), 3)
+    }
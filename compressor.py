@@ -0,0 +1,112 @@
+# 导入必要的库
+import os  # 导入os模块用于读取环境变量
+import re  # 导入正则表达式模块用于切分训练字典的片段
+import zlib  # 导入zlib用于压缩消息内容
+from collections import Counter  # 导入计数器用于统计常见片段
+
+# 短于它的消息（字节）不压缩，压缩后几乎不会变小
+MIN_COMPRESS_BYTES = 64
+# 预设字典的大小上限，zlib最多使用32KB
+DICTIONARY_SIZE = 32 * 1024
+# 训练字典时切分出的片段：一个短句或短语，带上结尾的标点
+FRAGMENT_RE = re.compile(r"[^，。？！；、,.?!;\n]{2,40}[，。？！；、,.?!;\n]?")
+# 训练字典时统计的短字符串的长度（字符）
+NGRAM_LENGTH = 4
+
+
+def train_dictionary(texts, size=DICTIONARY_SIZE):
+    """用一批消息训练zlib的预设字典
+
+    统计重复出现的短句、短语和固定长度的短字符串，按 出现次数×长度 挑选，直到字典写满。
+    zlib引用距离越近越省空间，所以最有价值的片段放在字典的末尾。
+
+    Args:
+        texts: 消息内容的迭代器
+        size: 字典的大小上限（字节）
+
+    Returns:
+        字典的字节串，没有重复的片段时为空字节串
+    """
+    counts = Counter()
+    for text in texts:
+        counts.update(FRAGMENT_RE.findall(text))
+        counts.update(text[i:i + NGRAM_LENGTH] for i in range(0, len(text) - NGRAM_LENGTH + 1, 2))
+    fragments = []
+    used = 0
+    for fragment, count in sorted(counts.items(), key=lambda item: item[1] * len(item[0]), reverse=True):
+        if count < 3:
+            break
+        data = fragment.encode('utf-8')
+        if used + len(data) > size:
+            continue
+        fragments.append(data)
+        used += len(data)
+    return b"".join(reversed(fragments))
+
+
+class BodyCodec:
+    """消息内容的压缩和解压
+
+    每条消息单独压缩，打开对话时只需要解压这个对话的消息。单条消息较短，
+    压缩时使用从已有消息训练出的预设字典，常见的句子和短语可以直接引用字典中的内容。
+    字典保存在数据库中，按编号引用，训练新字典后旧消息仍然用各自的字典解压。
+    解压时只会缓存新读取的字典，可以在后台线程中使用。
+    """
+
+    def __init__(self, level=6):
+        """初始化
+
+        Args:
+            level: zlib压缩级别（1-9），0表示不压缩
+        """
+        self.level = level
+        # 字典编号 -> 字典内容
+        self.dictionaries = {}
+        # 压缩新消息使用的字典编号，None表示不用字典
+        self.dictionary_id = None
+        # 遇到不认识的字典编号时读取字典的函数（例如另一个进程新训练了字典）
+        self.loader = None
+
+    def add_dictionary(self, dictionary_id, data):
+        """加入一个字典，编号最大的字典用于压缩新消息"""
+        self.dictionaries[dictionary_id] = data
+        if self.dictionary_id is None or dictionary_id > self.dictionary_id:
+            self.dictionary_id = dictionary_id
+
+    def encode(self, text):
+        """压缩一条消息
+
+        Returns:
+            (content, body, dictionary_id)：不压缩时 body 为None，内容保存在 content 中；
+            压缩时 content 为空字符串，dictionary_id 为使用的字典编号（没有用字典时为None）
+        """
+        data = text.encode('utf-8')
+        if self.level <= 0 or len(data) < MIN_COMPRESS_BYTES:
+            return text, None, None
+        dictionary_id = self.dictionary_id
+        if dictionary_id is not None:
+            compressor = zlib.compressobj(self.level, zdict=self.dictionaries[dictionary_id])
+        else:
+            compressor = zlib.compressobj(self.level)
+        body = compressor.compress(data) + compressor.flush()
+        if len(body) >= len(data):
+            return text, None, None
+        return "", body, dictionary_id
+
+    def decode(self, content, body, dictionary_id):
+        """还原 encode 保存的消息内容"""
+        if body is None:
+            return content
+        if dictionary_id is not None:
+            dictionary = self.dictionaries.get(dictionary_id)
+            if dictionary is None and self.loader is not None:
+                dictionary = self.dictionaries[dictionary_id] = self.loader(dictionary_id)
+            decompressor = zlib.decompressobj(zdict=dictionary)
+        else:
+            decompressor = zlib.decompressobj()
+        return (decompressor.decompress(body) + decompressor.flush()).decode('utf-8')
+
+
+def compress_level_from_env():
+    """返回环境变量 DEEPSEEK_COMPRESS_LEVEL 设置的压缩级别，默认6，0表示不压缩"""
+    return int(os.environ.get("DEEPSEEK_COMPRESS_LEVEL", 6))
@@ -0,0 +1,130 @@
+# 导入必要的库
+import math  # 导入数学模块用于取整
+import os  # 导入os模块用于读取环境变量
+from search_index import CJK_RE  # 导入中日韩文字的正则表达式
+
+# 每条消息在接口中的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD = 4
+# 摘要中每条消息保留的字符数
+SUMMARY_LINE_LENGTH = 40
+
+
+def estimate_tokens(text):
+    """粗略估计文本的token数量，不需要分词器
+
+    中日韩文字大约每个字0.6个token，其它字符大约每个0.3个token。
+
+    Args:
+        text: 文本
+
+    Returns:
+        估计的token数量
+    """
+    cjk = len(CJK_RE.findall(text))
+    return math.ceil(cjk * 0.6 + (len(text) - cjk) * 0.3)
+
+
+def message_tokens(message):
+    """返回一条消息的token数量，第一次计算后缓存在消息中
+
+    Args:
+        message: 消息（Message）
+    """
+    tokens = message.tokens
+    if tokens is None:
+        tokens = message.tokens = estimate_tokens(message.content) + MESSAGE_OVERHEAD
+    return tokens
+
+
+def summary_line(message):
+    """把一条较早的消息压缩成摘要中的一行"""
+    speaker = "用户" if message.role == "user" else "助手"
+    text = " ".join(message.content.split())
+    if len(text) > SUMMARY_LINE_LENGTH:
+        text = text[:SUMMARY_LINE_LENGTH] + "..."
+    return f"{speaker}：{text}"
+
+
+class ContextBuilder:
+    """在token预算内组装发送给模型的聊天历史
+
+    从最新的消息往前取，直到预算用完，只访问会被发送的消息，
+    所以组装的开销只和预算有关，与对话的长度无关。
+    可以选择用一段摘要代替放不下的较早消息，摘要按窗口的起点缓存在对话中，
+    起点移动时只需要重新压缩起点之前的若干条消息（同样受摘要的预算限制）。
+    """
+
+    def __init__(self, budget=6000, summary_tokens=0):
+        """初始化组装器
+
+        Args:
+            budget: 聊天历史的token预算（不包括系统提示词）
+            summary_tokens: 较早消息的摘要的token预算，0表示不生成摘要
+        """
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+
+    def build(self, session):
+        """组装一个对话要发送的聊天历史
+
+        最新的一条消息总会被发送，即使它本身就超出了预算。
+
+        Args:
+            session: 对话（ChatSession）
+
+        Returns:
+            [{"role": ..., "content": ...}, ...] 格式的消息列表，有摘要时第一条是系统消息
+        """
+        history = session.history
+        used = 0
+        start = len(history)
+        while start > 0:
+            tokens = message_tokens(history[start - 1])
+            if used + tokens > self.budget and start < len(history):
+                break
+            used += tokens
+            start -= 1
+        messages = [history[index].to_api() for index in range(start, len(history))]
+        if start > 0 and self.summary_tokens > 0:
+            messages.insert(0, {"role": "system", "content": self.summary_for(session, start)})
+        return messages
+
+    def summary_for(self, session, start):
+        """返回窗口起点之前的消息的摘要，结果缓存在对话中
+
+        从起点往前压缩，摘要的预算用完为止，更早的内容省略。
+
+        Args:
+            session: 对话
+            start: 窗口中第一条消息的下标
+        """
+        cached = session.summary
+        if cached is not None and cached[0] == start:
+            return cached[1]
+        lines = []
+        used = 0
+        index = start - 1
+        while index >= 0:
+            line = summary_line(session.history[index])
+            tokens = estimate_tokens(line) + 1
+            if used + tokens > self.summary_tokens:
+                break
+            lines.append(line)
+            used += tokens
+            index -= 1
+        header = "之前的对话摘要" + ("（更早的内容已省略）" if index >= 0 else "") + "："
+        text = "\n".join([header] + lines[::-1])
+        session.summary = (start, text)
+        return text
+
+
+def create_context_builder_from_env():
+    """根据环境变量创建组装器
+
+    DEEPSEEK_CONTEXT_TOKENS 设置聊天历史的token预算，
+    DEEPSEEK_SUMMARY_TOKENS 设置较早消息的摘要的预算（默认不生成摘要）。
+    """
+    return ContextBuilder(
+        budget=int(os.environ.get("DEEPSEEK_CONTEXT_TOKENS", 6000)),
+        summary_tokens=int(os.environ.get("DEEPSEEK_SUMMARY_TOKENS", 0))
+    )
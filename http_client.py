@@ -0,0 +1,245 @@
+# 导入必要的库
+import random  # 导入随机数模块用于退避时间的抖动
+import threading  # 导入线程模块用于保护连接池
+import time  # 导入时间模块用于等待重试
+from urllib.parse import urlsplit  # 导入URL解析函数
+
+# 复用的空闲连接已经被服务器关闭时出现的错误，这时服务器还没有收到请求，可以直接换连接重发
+# （http.client.RemoteDisconnected 是 ConnectionResetError 的子类）
+STALE_CONNECTION_ERRORS = (ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
+
+
+class HTTPError(Exception):
+    """请求失败：重试用完后仍然返回错误状态码，或者连接中断"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 响应头
+
+    Args:
+        value: 秒数或者HTTP日期
+
+    Returns:
+        需要等待的秒数，无法解析时返回None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime  # 只有服务器返回日期格式时才需要
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class PooledResponse:
+    """连接池中的响应，可以逐行迭代
+
+    正常读完后调用 release 把连接放回连接池；没有读完就关闭（例如取消了回复）时，
+    连接中还有未读的数据，不能复用，会被直接关闭。
+    """
+
+    def __init__(self, client, key, connection, response):
+        self.client = client
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.status = response.status
+        self.headers = response.headers
+
+    def __iter__(self):
+        return iter(self.response)
+
+    def read(self):
+        """读取剩余的全部内容"""
+        return self.response.read()
+
+    def release(self):
+        """读完剩余的内容，把连接放回连接池"""
+        if self.connection is None:
+            return
+        import http.client
+        try:
+            self.response.read()
+        except (http.client.HTTPException, OSError):
+            self.close()
+            return
+        if self.response.will_close:
+            self.close()
+        else:
+            self.client.put_connection(self.key, self.connection)
+            self.connection = None
+
+    def close(self):
+        """关闭连接，不再复用"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class HTTPClient:
+    """带连接池的HTTP/1.1客户端，可以在多个线程中共用
+
+    同一个主机的连接在请求结束后保留（keep-alive），下一次请求直接复用，不需要重新建立TCP和TLS连接。
+    服务器返回429或503时按指数退避加随机抖动重试，响应中有 Retry-After 时按它的要求等待；
+    收到响应之前连接断开也会重试。已经开始读取的流式响应中途断开时不会重试，避免内容重复。
+    """
+
+    def __init__(self, connect_timeout=10, read_timeout=60, max_retries=3, backoff_base=0.5,
+                 backoff_cap=8.0, max_retry_after=30.0, max_idle_per_host=4, retry_statuses=(429, 503)):
+        """初始化客户端
+
+        Args:
+            connect_timeout: 建立连接的超时时间（秒）
+            read_timeout: 等待响应数据的超时时间（秒），流式响应中两段数据之间的间隔也受它限制
+            max_retries: 最多重试的次数
+            backoff_base: 第一次重试的最长等待时间（秒），之后每次翻倍
+            backoff_cap: 每次重试的最长等待时间（秒）
+            max_retry_after: 最多按 Retry-After 等待多久（秒）
+            max_idle_per_host: 每个主机最多保留的空闲连接数
+            retry_statuses: 需要重试的状态码
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_retry_after = max_retry_after
+        self.max_idle_per_host = max_idle_per_host
+        self.retry_statuses = set(retry_statuses)
+        # (协议, 主机, 端口) -> 空闲连接的列表
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.ssl_context = None
+        # 统计：请求次数、新建连接次数、复用连接次数、重试次数
+        self.stats = {"requests": 0, "connections": 0, "reused": 0, "retries": 0}
+        # 等待重试使用的函数，测试时可以替换
+        self.sleep = time.sleep
+
+    def count(self, name):
+        """增加一项统计"""
+        with self.lock:
+            self.stats[name] += 1
+
+    def get_connection(self, key):
+        """从连接池取出一个空闲连接，没有时新建
+
+        Returns:
+            (连接, 是否是复用的连接)
+        """
+        with self.lock:
+            connections = self.idle.get(key)
+            if connections:
+                self.stats["reused"] += 1
+                return connections.pop(), True
+            self.stats["connections"] += 1
+        import http.client  # http.client 会连带导入较多模块，第一次请求时再导入
+        scheme, host, port = key
+        if scheme == 'https':
+            if self.ssl_context is None:
+                import ssl
+                self.ssl_context = ssl.create_default_context()
+            connection = http.client.HTTPSConnection(host, port, timeout=self.connect_timeout, context=self.ssl_context)
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=self.connect_timeout)
+        return connection, False
+
+    def put_connection(self, key, connection):
+        """把读完响应的连接放回连接池，空闲连接太多时关闭"""
+        with self.lock:
+            connections = self.idle.setdefault(key, [])
+            if len(connections) < self.max_idle_per_host:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def backoff(self, attempt, retry_after=None):
+        """计算第 attempt 次重试前的等待时间（秒）"""
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        # 完全随机的抖动，避免多个请求在同一时刻一起重试
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def request(self, method, url, body=None, headers=None):
+        """发送请求，必要时重试
+
+        Args:
+            method: 请求方法
+            url: 完整的URL
+            body: 请求体（字节串）
+            headers: 请求头
+
+        Returns:
+            状态码为2xx的PooledResponse，需要用 with 语句或调用 close 释放
+
+        Raises:
+            HTTPError: 重试用完后仍然失败
+        """
+        import http.client
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        key = (scheme, parts.hostname, parts.port or (443 if scheme == 'https' else 80))
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        headers = dict(headers or {})
+        headers.setdefault("Connection", "keep-alive")
+
+        attempt = 0
+        while True:
+            self.count("requests")
+            connection, reused = self.get_connection(key)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                # 连接建立后改用读取超时
+                if connection.sock is not None:
+                    connection.sock.settimeout(self.read_timeout)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                if reused and isinstance(e, STALE_CONNECTION_ERRORS):
+                    # 空闲的连接可能已经被服务器关闭，还没有收到任何响应时换一个新连接立即重试，不计入重试次数；
+                    # 超时等其它错误时服务器可能已经在处理请求，按正常的重试计数和退避
+                    continue
+                if attempt >= self.max_retries:
+                    raise HTTPError(f"连接失败: {e}") from e
+                self.count("retries")
+                self.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+
+            if 200 <= response.status < 300:
+                return PooledResponse(self, key, connection, response)
+
+            # 错误响应的内容很短，读完后连接可以继续使用
+            detail = response.read()[:200].decode('utf-8', 'replace')
+            if response.will_close:
+                connection.close()
+            else:
+                self.put_connection(key, connection)
+            if response.status not in self.retry_statuses or attempt >= self.max_retries:
+                raise HTTPError(f"HTTP {response.status}: {detail}", response.status)
+            self.count("retries")
+            self.sleep(self.backoff(attempt, parse_retry_after(response.headers.get("Retry-After"))))
+            attempt += 1
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
@@ -0,0 +1,306 @@
+# 导入必要的库
+import json  # 导入json模块用于编码日志记录
+import os  # 导入os模块用于fsync和读取环境变量
+import queue  # 导入队列模块用于把写入交给后台线程
+import sqlite3  # 导入sqlite3用于捕获数据库错误
+import sys  # 导入sys模块用于报告写入失败
+import threading  # 导入线程模块用于在后台写入日志和数据库
+import time  # 导入时间模块用于记录时间戳和合并fsync
+from messages import Message  # 导入紧凑的消息类型
+from storage import ConversationStore  # 导入SQLite对话存储
+from unwritten import UnwrittenMessages  # 导入后台写入的存储共用的还没有写入的消息记录
+
+# 默认每隔多久把日志同步到磁盘一次（毫秒）
+DEFAULT_INTERVAL_MS = 200
+# 日志超过这个大小（字节）时，确认数据库已经落盘后清空日志
+COMPACT_BYTES = 4 * 1024 * 1024
+
+# 日志中的事件，每行一个JSON数组：
+#     ["create", 对话ID, 标题, 时间戳]
+#     ["append", 对话ID, 角色, 内容, token数量, 时间戳, 写入ID]
+#     ["rename", 对话ID, 标题]
+#     ["touch", 对话ID, 时间戳]
+#     ["delete", 对话ID]
+
+
+def read_journal(path):
+    """读取日志中的事件，文件不存在时为空
+
+    崩溃时最后一行可能只写了一半，读不出的行直接跳过。
+    """
+    if not os.path.exists(path):
+        return []
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return events
+
+
+def apply_event(store, event):
+    """把一个日志事件写入数据库
+
+    已经写入过的消息（按写入ID判断，例如重放时）不会重复写入。
+
+    Args:
+        store: 对话存储（ConversationStore）
+        event: 日志事件
+
+    Returns:
+        追加消息时为新消息的ID，其它事件为None
+    """
+    kind = event[0]
+    if kind == "create":
+        store.create_conversation(*event[1:])
+    elif kind == "append":
+        conversation_id, role, content, tokens, created_at, write_id = event[1:]
+        if store.has_message(write_id):
+            return None
+        return store.append_message(conversation_id, role, content, tokens, created_at, write_id=write_id)
+    elif kind == "rename":
+        store.rename_conversation(*event[1:])
+    elif kind == "touch":
+        store.touch_conversation(*event[1:])
+    elif kind == "delete":
+        store.delete_conversation(event[1])
+    return None
+
+
+def compact(store, journal):
+    """确认数据库已经落盘后清空日志
+
+    WAL模式的NORMAL同步级别下，提交不会等待fsync；FULL检查点会把WAL同步到磁盘并写回数据库，
+    之后日志中的事件都已经在数据库中，可以丢弃。
+
+    Args:
+        store: 对话存储
+        journal: 已打开的日志文件
+
+    Returns:
+        是否清空了日志（有读取者占用WAL时检查点不完整，保留日志）
+    """
+    busy, log_frames, checkpointed = store.connection.execute("PRAGMA wal_checkpoint(FULL)").fetchone()
+    if busy or log_frames != checkpointed:
+        return False
+    journal.seek(0)
+    journal.truncate()
+    journal.flush()
+    os.fsync(journal.fileno())
+    return True
+
+
+def recover(store):
+    """把上次没有确认写入数据库的日志事件重放到数据库中，然后清空日志
+
+    日志只在 JournaledStore 运行时写入，但打开数据库的每个地方（界面、工作进程、导出和导入）
+    都要先恢复它，否则日志中的消息会被跳过，或者在更新的写入之后才被重放。
+
+    Args:
+        store: 对话存储（ConversationStore）
+    """
+    path = store.path + ".journal"
+    events = read_journal(path)
+    if not events:
+        return
+    for event in events:
+        apply_event(store, event)
+    with open(path, 'a', encoding='utf-8') as journal:
+        compact(store, journal)
+
+
+def open_store(path=None, **kwargs):
+    """打开对话存储，先恢复上次留下的日志
+
+    Args:
+        path: 数据库路径，为None时使用默认路径
+        **kwargs: 传给 ConversationStore 的其它参数
+    """
+    store = ConversationStore(path, **kwargs)
+    recover(store)
+    return store
+
+
+
+
+class JournaledStore(UnwrittenMessages):
+    """先写日志、后台写数据库的对话存储
+
+    界面线程的每次写入只是把事件放进队列。后台线程把一段时间内的事件追加到日志，
+    一次fsync之后再写入数据库，所以多条消息只需要同步一次磁盘，界面线程从不等待。
+    同步到日志的事件即使程序崩溃也不会丢失：下次打开数据库时先重放日志，再清空它。
+    还在队列中、没有同步到日志的消息在崩溃时会丢失（最多一个同步间隔内的写入），
+    所以消息只有在 on_saved 回调之后才算保存。
+    还没有写入数据库的消息记在内存中，读取对话时补在后面，读到的内容总是完整的。
+    """
+
+    def __init__(self, path=None, interval_ms=DEFAULT_INTERVAL_MS, on_message=None, on_error=None):
+        """重放上次留下的日志，并启动后台写入线程
+
+        Args:
+            path: 数据库路径，为None时使用默认路径
+            interval_ms: 日志同步到磁盘的间隔（毫秒），崩溃时最多丢失这段时间内还没有确认的写入
+            on_message: 消息写入数据库后在后台线程中调用，参数为消息ID和内容（例如加入搜索索引）
+            on_error: 写入日志或数据库失败时在 pump 中调用，参数为错误信息；为None时打印到标准错误
+        """
+        # 界面线程使用的连接，只用于读取
+        self.reader = open_store(path)
+        self.path = self.reader.path
+        self.journal_path = self.path + ".journal"
+        self.interval = interval_ms / 1000
+        self.on_message = on_message
+        self.on_error = on_error
+        # 还没有写入数据库的消息，后台线程写入后移除
+        self.init_unwritten()
+        # (事件, 确认保存的回调) 的队列，None 表示停止
+        self.events = queue.Queue()
+        # 后台线程的结果：("saved", 回调, 是否保存) 或 ("error", 错误信息)，由 pump 在界面线程中处理
+        self.results = queue.Queue()
+        # 有事件没能写入时不再清空日志，下次打开数据库时重放
+        self.failed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """后台线程：合并一段时间内的事件，写日志、同步、确认保存、写数据库"""
+        # SQLite连接只能在创建它的线程中使用
+        store = ConversationStore(self.path)
+        stopping = False
+        with open(self.journal_path, 'a', encoding='utf-8') as journal:
+            while not stopping:
+                batch = [self.events.get()]
+                deadline = time.monotonic() + self.interval
+                while batch[-1] is not None:
+                    try:
+                        batch.append(self.events.get(timeout=max(0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                if batch[-1] is None:
+                    stopping = True
+                    batch.pop()
+                if not batch:
+                    continue
+                try:
+                    for event, on_saved in batch:
+                        journal.write(json.dumps(event, ensure_ascii=False))
+                        journal.write("\n")
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                    synced = True
+                except OSError as e:
+                    self.failed = True
+                    synced = False
+                    self.results.put(("error", f"写入日志失败: {e}"))
+                if synced:
+                    for event, on_saved in batch:
+                        if on_saved is not None:
+                            self.results.put(("saved", on_saved, True))
+                for event, on_saved in batch:
+                    applied = self.apply(store, event, synced)
+                    # 没有同步到日志的消息写入数据库之后才确认，两边都失败时报告没有保存
+                    if not synced and on_saved is not None:
+                        self.results.put(("saved", on_saved, applied))
+                if journal.tell() >= COMPACT_BYTES and not self.failed:
+                    compact(store, journal)
+            if not self.failed:
+                compact(store, journal)
+        store.close()
+
+    def apply(self, store, event, synced=True):
+        """在后台线程中把一个事件写入数据库
+
+        失败时消息留在 unwritten 中，这次运行中读取对话时仍然可以读到；
+        已经同步到日志的事件下次打开数据库时重新写入。
+
+        Args:
+            store: 后台线程的对话存储
+            event: 日志事件
+            synced: 事件是否已经同步到日志
+
+        Returns:
+            是否写入成功
+        """
+        try:
+            message_id = apply_event(store, event)
+        except sqlite3.Error as e:
+            self.failed = True
+            if synced:
+                self.results.put(("error", f"写入数据库失败，消息保存在日志中，下次启动时会重新写入: {e}"))
+            else:
+                self.results.put(("error", f"写入数据库失败，消息没有保存: {e}"))
+            return False
+        if event[0] == "append":
+            self.mark_written(event[1], event[6])
+            if self.on_message is not None and message_id is not None:
+                self.on_message(message_id, event[3])
+        return True
+
+    def pump(self):
+        """在界面线程中调用 on_saved 回调，并报告写入失败"""
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if result[0] == "saved":
+                result[1](result[2])
+            elif self.on_error is not None:
+                self.on_error(result[1])
+            else:
+                print(result[1], file=sys.stderr)
+
+    def create_conversation(self, conversation_id, title, timestamp=None):
+        """把新建对话交给后台线程写入"""
+        self.events.put((["create", conversation_id, title, timestamp or time.time()], None))
+
+    def append_message(self, conversation_id, role, content, tokens=None, created_at=None, on_saved=None):
+        """把一条消息交给后台线程写入
+
+        Args:
+            on_saved: 在 pump 中调用，参数为是否保存：同步到日志之后为True，之后即使崩溃也不会丢失；
+                写入日志失败时在写入数据库之后调用，两边都失败时为False
+
+        Returns:
+            None，消息ID在写入数据库时才分配，之后通过 on_message 通知
+        """
+        created_at = created_at or time.time()
+        write_id = self.add_unwritten(conversation_id, Message(role, content, created_at, tokens))
+        self.events.put((["append", conversation_id, role, content, tokens, created_at, write_id], on_saved))
+
+    def rename_conversation(self, conversation_id, title):
+        """把修改对话标题交给后台线程写入"""
+        self.events.put((["rename", conversation_id, title], None))
+
+    def touch_conversation(self, conversation_id, timestamp=None):
+        """把更新对话的最近活动时间交给后台线程写入"""
+        self.events.put((["touch", conversation_id, timestamp or time.time()], None))
+
+    def delete_conversation(self, conversation_id):
+        """把删除对话交给后台线程写入，丢弃它还没有写入的消息"""
+        self.discard_unwritten(conversation_id)
+        self.events.put((["delete", conversation_id], None))
+
+    def close(self):
+        """等待后台线程把已经提交的事件写完，处理剩下的确认和错误，然后关闭"""
+        self.events.put(None)
+        self.thread.join()
+        self.pump()
+        self.reader.close()
+
+
+def create_store_from_env(on_message=None, on_error=None):
+    """根据环境变量创建对话存储，两种存储都会先恢复上次留下的日志
+
+    DEEPSEEK_JOURNAL_INTERVAL_MS 设置日志同步到磁盘的间隔（默认200毫秒），
+    设置为0时不使用日志，每次写入直接提交到数据库。
+
+    Args:
+        on_message: 见 JournaledStore，直接写入时不调用
+        on_error: 见 JournaledStore，直接写入时失败会抛出异常
+    """
+    interval_ms = int(os.environ.get("DEEPSEEK_JOURNAL_INTERVAL_MS", DEFAULT_INTERVAL_MS))
+    if interval_ms <= 0:
+        return open_store()
+    return JournaledStore(interval_ms=interval_ms, on_message=on_message, on_error=on_error)
@@ -0,0 +1,65 @@
+# 导入必要的库
+from collections import OrderedDict  # 导入有序字典用于按注册顺序处理需要重新布局的区域
+
+
+class LayoutScheduler:
+    """合并布局更新的调度器
+
+    窗口拖动大小、批量修改对话列表时，同一个区域会在一次事件循环中被要求重新布局很多次。
+    各处只把区域标记为需要更新，调度器在空闲时对每个区域只执行一次布局，
+    使用最后一次标记时的参数（例如最新的窗口尺寸），中间的尺寸直接跳过。
+    """
+
+    def __init__(self, widget):
+        """初始化调度器
+
+        Args:
+            widget: 用于安排空闲任务的控件
+        """
+        self.widget = widget
+        # 区域名称 -> 布局函数，按注册顺序执行（外层的区域先注册）
+        self.regions = OrderedDict()
+        # 需要更新的区域名称 -> 最后一次标记时的参数
+        self.dirty = {}
+        self.job = None
+
+    def add(self, region, callback):
+        """注册一个区域
+
+        Args:
+            region: 区域名称
+            callback: 布局函数，参数为最后一次 invalidate 时传入的参数
+        """
+        self.regions[region] = callback
+
+    def invalidate(self, region, *args):
+        """标记区域需要重新布局，在下一次空闲时执行
+
+        Args:
+            region: 区域名称
+            *args: 传给布局函数的参数，只保留最后一次的
+        """
+        self.dirty[region] = args
+        if self.job is None:
+            self.job = self.widget.after_idle(self.flush)
+
+    def discard(self, region):
+        """取消区域还没有执行的布局，例如调用者已经立即布局过了
+
+        Args:
+            region: 区域名称
+        """
+        self.dirty.pop(region, None)
+        if not self.dirty and self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+
+    def flush(self):
+        """立即对所有需要更新的区域执行一次布局"""
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+        dirty, self.dirty = self.dirty, {}
+        for region, callback in self.regions.items():
+            if region in dirty:
+                callback(*dirty[region])
@@ -1,31 +1,115 @@
 # 导入必要的库
-from tkinter import *  # 导入tkinter GUI库的所有组件
-from tkinter import ttk  # 导入ttk模块用于更现代的UI控件
-import random  # 导入随机数生成模块
-import time  # 导入时间模块用于模拟思考延迟
-from PIL import Image, ImageTk  # 导入PIL库用于处理图片
-import os  # 导入os模块用于处理文件路径
-import json  # 导入json模块用于处理聊天历史
-import uuid  # 导入uuid模块用于生成唯一ID
-import tkinter.messagebox as messagebox  # 导入消息框模块用于确认删除
+from startup import StartupProfiler  # 导入启动耗时统计
+# 从这里开始统计启动耗时（--profile-startup）
+startup_profiler = StartupProfiler()
+import argparse  # noqa: E402 导入命令行参数解析模块
+import os  # noqa: E402 导入os模块用于读取可选功能的环境变量
+import queue  # noqa: E402 导入队列模块用于接收后台读取的对话
+import threading  # noqa: E402 导入线程模块用于在后台读取大的对话
+from tkinter import *  # noqa: E402 导入tkinter GUI库的所有组件
+import tkinter.messagebox as messagebox  # noqa: E402 导入消息框模块用于确认删除
+startup_profiler.mark("导入tkinter")
+from backend import BUSY_REPLY, create_backend_from_env  # noqa: E402 导入流式模型后端和繁忙提示
+from transcript import TranscriptRenderer  # noqa: E402 导入按帧合并写入的对话渲染器
+from journal import create_store_from_env, open_store  # noqa: E402 导入先写日志、后台写数据库的对话存储
+from sidebar import VirtualHistoryList  # noqa: E402 导入虚拟化的历史对话列表
+from search_index import SearchIndex  # noqa: E402 导入全文搜索索引
+from assets import AssetManager, prepare_cache_in_background  # noqa: E402 导入图片资源管理器
+from session import ConversationManager  # noqa: E402 导入不依赖界面的对话管理器
+from scheduler import ReplyScheduler  # noqa: E402 导入按对话排队的回复调度器
+from context import create_context_builder_from_env  # noqa: E402 导入聊天历史组装器
+from layout import LayoutScheduler  # noqa: E402 导入合并布局更新的调度器
+from metrics import Metrics, LagProbe, metrics_path_from_env  # noqa: E402 导入性能指标的收集和导出
+startup_profiler.mark("导入程序模块")
+
+
+def env_enabled(name):
+    """环境变量是否设置为开启（1、true 或 yes），用于在导入可选模块之前判断"""
+    return os.environ.get(name, "").lower() in ("1", "true", "yes")
+
+
+def create_chat_backend():
+    """创建模型后端，设置了 DEEPSEEK_RESPONSE_CACHE 时才导入回复缓存并包装后端"""
+    backend = create_backend_from_env()
+    if not env_enabled("DEEPSEEK_RESPONSE_CACHE"):
+        return backend
+    from response_cache import wrap_backend_from_env
+    return wrap_backend_from_env(backend)
+
 
 class ChatWindow:
     """问答对话窗口的主类，模仿DeepSeek Chat网站的设计"""
-    def __init__(self, master):
+    # 轮询后台回复的间隔（毫秒），约等于一帧
+    STREAM_POLL_MS = 16
+    # 轮询日志写入确认的间隔（毫秒），只影响"正在保存"提示消失的时间
+    SAVE_POLL_MS = 100
+    # 打开对话时显示的消息条数，以及每次向上翻页补充的条数
+    TRANSCRIPT_PAGE_SIZE = 50
+    # 对话区域最多保留的消息条数
+    TRANSCRIPT_MAX_MESSAGES = 200
+    # 输入搜索内容后等待多久再搜索（毫秒）
+    SEARCH_DELAY_MS = 150
+    # 最多显示的搜索结果数量
+    SEARCH_LIMIT = 20
+    # 所有对话最多同时生成的回复数量
+    MAX_CONCURRENT_REPLIES = 4
+    # 窗口一直没有显示时，最多等待多久再加载延后的资源（毫秒）
+    DEFERRED_STARTUP_MS = 1000
+    # 消息数量达到它的对话在后台线程中读取和解压，界面不会卡住
+    BACKGROUND_LOAD_MESSAGES = 500
+
+    def __init__(self, master, profiler=None):
         """初始化聊天窗口
         
         Args:
             master: tkinter根窗口对象
+            profiler: 启动耗时统计（StartupProfiler），为None时不统计
         """
         self.master = master  # 保存主窗口引用
+        self.profiler = profiler
+        # 性能指标，设置了 DEEPSEEK_METRICS 时开启；没有开启时不包装任何函数，没有额外开销
+        self.metrics_path = metrics_path_from_env()
+        self.metrics = Metrics() if self.metrics_path else None
+        # 处理函数要在绑定为回调之前包装
+        self.instrument(self, {
+            "send_message": "send",
+            "load_conversation": "load",
+            "display_message": "display",
+            "run_search": "search",
+            "on_window_resize": "resize",
+            "layout_window": "layout",
+            "poll_replies": "poll_replies"
+        })
+        # 图片资源管理器，每张图片只解码一次，缩放结果有缓存
+        self.assets = AssetManager(master)
         master.title("DeepSeek Chat")  # 修改窗口标题
         master.geometry('1400x800')  # 设置更大的窗口尺寸
         master.configure(bg='#111827')  # 使用深色背景，与DeepSeek相似
         master.minsize(800, 600)  # 设置最小窗口大小
         
-        # 初始化保存的对话列表
-        self.saved_conversations = {}
-        self.current_conversation_id = str(uuid.uuid4())
+        # 窗口大小改变和对话列表的修改都只标记需要重新布局，每次空闲时统一处理一次
+        self.layout = LayoutScheduler(master)
+        self.layout.add("window", self.layout_window)
+        # 底部框架当前的高度和背景图片当前的尺寸，没有变化时不重新设置
+        self.bottom_height = 150
+        self.background_size = None
+        
+        # 设置了 DEEPSEEK_WORKER_PROCESS 时，模型调用、回复缓存、写入存储和搜索索引都在工作进程中进行；
+        # 工作进程需要multiprocessing，只在开启时导入，默认的启动不付出导入的时间
+        self.worker = None
+        if env_enabled("DEEPSEEK_WORKER_PROCESS"):
+            from worker import RemoteSearchIndex, RemoteStore, WorkerClient
+            self.worker = WorkerClient()
+        # 创建不依赖界面的对话管理器，负责对话状态、存储和搜索索引
+        if self.worker is not None:
+            self.worker.handlers["failed"] = self.show_background_error
+            self.manager = ConversationManager(RemoteStore(self.worker), RemoteSearchIndex(self.worker))
+        else:
+            # 消息先写入日志，后台线程合并同步后再写数据库，写入后加入搜索索引
+            search_index = SearchIndex()
+            self.manager = ConversationManager(create_store_from_env(search_index.add, self.show_background_error), search_index)
+        # 重命名和删除只统计对话管理器中的处理，不包括等待用户确认的时间
+        self.instrument(self.manager, {"rename_conversation": "rename", "delete_conversation": "delete"})
         
         # 创建左侧边栏框架
         self.sidebar_frame = Frame(master, bg='#1F2937', width=250)
@@ -74,21 +158,58 @@ class ChatWindow:
         )
         self.history_title.pack(side=TOP, fill=X)
         
+        # 创建搜索框，搜索所有对话中的消息
+        self.search_frame = Frame(self.sidebar_frame, bg='#1F2937')
+        self.search_frame.pack(side=TOP, fill=X, padx=15, pady=(0, 10))
+        self.search_var = StringVar()
+        self.search_entry = Entry(
+            self.search_frame,
+            textvariable=self.search_var,
+            font=('Segoe UI', 11),
+            bg='#374151',
+            fg='#FFFFFF',
+            insertbackground='#FFFFFF',
+            relief=FLAT
+        )
+        self.search_entry.pack(side=TOP, fill=X, ipady=4)
+        self.search_entry.bind('<KeyRelease>', self.on_search_changed)
+        self.search_entry.bind('<Escape>', self.clear_search)
+        
+        # 搜索结果列表，有结果时才显示
+        self.search_results = Listbox(
+            self.search_frame,
+            font=('Segoe UI', 10),
+            bg='#111827',
+            fg='#D1D5DB',
+            selectbackground='#374151',
+            selectforeground='#FFFFFF',
+            borderwidth=0,
+            highlightthickness=0,
+            activestyle='none',
+            height=8
+        )
+        self.search_results.bind('<<ListboxSelect>>', self.open_search_result)
+        # 搜索结果对应的对话ID
+        self.search_result_ids = []
+        self.search_job = None
+        
         # 创建历史对话的滚动区域
         self.history_canvas = Canvas(self.sidebar_frame, bg='#1F2937', highlightthickness=0)
         self.history_canvas.pack(side=LEFT, fill=BOTH, expand=True)
         
         # 添加滚动条
-        self.history_scrollbar = Scrollbar(self.sidebar_frame, orient=VERTICAL, command=self.history_canvas.yview)
+        self.history_scrollbar = Scrollbar(self.sidebar_frame, orient=VERTICAL)
         self.history_scrollbar.pack(side=RIGHT, fill=Y)
         
-        # 配置画布
-        self.history_canvas.configure(yscrollcommand=self.history_scrollbar.set)
-        self.history_canvas.bind('<Configure>', lambda e: self.history_canvas.configure(scrollregion=self.history_canvas.bbox("all")))
-        
-        # 创建框架放置历史记录
-        self.history_frame = Frame(self.history_canvas, bg='#1F2937')
-        self.history_canvas.create_window((0, 0), window=self.history_frame, anchor="nw", width=230)
+        # 在画布上创建虚拟化列表，只为可见的行创建控件
+        self.history_list = VirtualHistoryList(
+            self.history_canvas,
+            self.history_scrollbar,
+            on_select=self.load_conversation,
+            on_menu=self.show_conversation_menu,
+            layout=self.layout
+        )
+        self.instrument(self.history_list, {"refresh": "sidebar_refresh"})
         
         # 创建主聊天区域框架
         self.chat_frame = Frame(master, bg='#111827')
@@ -139,13 +260,26 @@ class ChatWindow:
         # 添加滚动条
         self.scrollbar = Scrollbar(self.conversation_frame, command=self.conversation.yview)
         self.scrollbar.pack(side=RIGHT, fill=Y)
-        self.conversation.config(yscrollcommand=self.scrollbar.set)
+        self.conversation.config(yscrollcommand=self.on_transcript_scroll)
+        
+        # 创建对话渲染器，所有消息都通过它写入对话区域
+        self.renderer = TranscriptRenderer(self.master, self.conversation, max_messages=self.TRANSCRIPT_MAX_MESSAGES)
+        self.instrument(self.renderer, {"flush": "render_flush"})
+        # 已经安排的翻页任务，避免连续的滚动事件重复翻页
+        self.paging_job = None
         
         # 创建底部输入区域框架 - 固定在底部
-        self.bottom_frame = Frame(self.chat_frame, bg='#111827', height=150)
+        self.bottom_frame = Frame(self.chat_frame, bg='#111827', height=self.bottom_height)
         self.bottom_frame.pack(side=BOTTOM, fill=X)
         self.bottom_frame.pack_propagate(False)  # 防止框架大小变化
         
+        # 输入区域后面的背景图片，按窗口大小在后台缩放，只露出底部的一截
+        self.background_label = Label(self.bottom_frame, bg='#111827', borderwidth=0)
+        self.background_label.place(relx=0, rely=1, anchor='sw')
+        self.background_label.lower()
+        # 正在显示的背景图片，需要保留引用
+        self.background_photo = None
+        
         # 创建输入区域
         self.input_frame = Frame(self.bottom_frame, bg='#1F2937', height=120)
         self.input_frame.pack(fill=X, padx=20, pady=20)
@@ -183,6 +317,26 @@ class ChatWindow:
         )
         self.send_button.pack(side=RIGHT, padx=(10, 0))
         
+        # 创建停止按钮，当前对话有回复在生成或排队时可用
+        self.stop_button = Button(
+            self.input_frame,
+            text="停止",
+            command=self.stop_reply,
+            font=('Segoe UI', 12),
+            bg='#374151',
+            fg='#FFFFFF',
+            activebackground='#4B5563',
+            activeforeground='#FFFFFF',
+            disabledforeground='#6B7280',
+            borderwidth=0,
+            relief=FLAT,
+            padx=15,
+            pady=10,
+            cursor="hand2",
+            state='disabled'
+        )
+        self.stop_button.pack(side=RIGHT, padx=(10, 0))
+        
         # 绑定Enter键到send_message方法，但允许Shift+Enter换行
         self.user_input.bind('<Return>', self.handle_return)
         
@@ -192,147 +346,401 @@ class ChatWindow:
         # 显示初始问候消息
         self.display_message("DeepSeek", "欢迎使用 DeepSeek Chat。我是您的AI助手，可以回答问题、提供信息、帮助解决问题或进行创意讨论。请问有什么我可以帮您的吗？")
         
+        # 创建模型后端，设置了 DEEPSEEK_RESPONSE_CACHE 时相同的问题直接使用缓存的回复；
+        # 使用工作进程时后端在工作进程中创建
+        self.backend = create_chat_backend() if self.worker is None else None
+        # 最近一次回复的延迟统计
+        self.last_latency = None
+        # 回复调度器：同一对话的发送依次排队，所有对话同时生成的回复数量有上限
+        self.scheduler = ReplyScheduler(
+            self.manager,
+            self.backend,
+            self.MAX_CONCURRENT_REPLIES,
+            create_context_builder_from_env(),
+            self.worker.stream_worker if self.worker is not None else None
+        )
+        # 已经安排的回复轮询任务
+        self.reply_job = None
+        # 正在后台读取的对话ID、读取结果和轮询任务
+        self.loading_conversation_id = None
+        self.load_results = queue.Queue()
+        self.load_job = None
+        # 最近一次发出的搜索内容，结果返回时用来丢弃过时的搜索
+        self.search_query = None
+        # 窗口图标，需要保留引用，否则图片会被回收
+        self.icon_photos = []
+        
+        # 接收对话管理器的事件
+        self.manager.subscribe(self.on_manager_event)
+        
+        # 图标、对话列表和搜索索引在窗口第一次显示之后再加载，先让窗口尽快出现
+        self.startup_finished = False
+        self.master.bind('<Map>', self.on_first_map, add='+')
+        self.startup_job = self.master.after(self.DEFERRED_STARTUP_MS, self.finish_startup)
+        
+        if self.metrics is not None:
+            # 用心跳定时器测量事件循环的延迟，按F12导出指标，关闭窗口时也会导出
+            self.lag_probe = LagProbe(master, self.metrics)
+            self.lag_probe.start()
+            self.master.bind('<F12>', self.export_metrics)
+        if self.worker is not None:
+            # 定期非阻塞地取出工作进程的结果（写入确认、搜索结果等），每次最多用时一帧
+            self.worker_job = self.master.after(self.STREAM_POLL_MS, self.poll_worker)
+        # 日志由后台线程同步，定期取出写入确认和写入失败；直接写入数据库时没有需要轮询的
+        self.store_job = None
+        if hasattr(self.manager.store, "pump"):
+            self.store_job = self.master.after(self.SAVE_POLL_MS, self.poll_store)
+        self.master.protocol("WM_DELETE_WINDOW", self.close_window)
+    
+    def instrument(self, obj, methods):
+        """开启性能指标时为对象的方法计时
+
+        Args:
+            obj: 对象
+            methods: 方法名 -> 处理函数名称
+        """
+        if self.metrics is not None:
+            self.metrics.instrument(obj, methods)
+    
+    def export_metrics(self, event=None):
+        """把性能指标导出到 DEEPSEEK_METRICS 设置的文件"""
+        try:
+            self.metrics.export(self.metrics_path)
+        except OSError as e:
+            print(f"导出性能指标失败: {e}")
+            return
+        print(f"性能指标已导出到 {self.metrics_path}")
+    
+    def close_window(self):
+        """导出性能指标、等待工作进程或后台线程写完消息后关闭窗口"""
+        if self.metrics is not None:
+            self.lag_probe.stop()
+            self.export_metrics()
+        if self.worker is not None:
+            self.master.after_cancel(self.worker_job)
+            self.worker.close()
+        if self.store_job is not None:
+            self.master.after_cancel(self.store_job)
+        # 等待后台线程把日志中的消息写入数据库
+        self.manager.store.close()
+        self.master.destroy()
+    
+    def poll_worker(self):
+        """取出工作进程已经返回的结果，回复片段由 poll_replies 取出"""
+        self.worker.pump()
+        self.worker.check_alive()
+        self.worker_job = self.master.after(self.STREAM_POLL_MS, self.poll_worker)
+    
+    def poll_store(self):
+        """处理后台线程已经同步到日志的消息的确认和写入失败"""
+        self.manager.store.pump()
+        self.store_job = self.master.after(self.SAVE_POLL_MS, self.poll_store)
+    
+    def show_background_error(self, message):
+        """报告后台写入日志或数据库、工作进程中的搜索等操作失败"""
+        messagebox.showerror("后台操作失败", message)
+    
+    def on_first_map(self, event):
+        """窗口第一次显示后，在空闲时加载延后的资源"""
+        if event.widget != self.master or self.startup_finished:
+            return
+        if self.profiler is not None and self.profiler.first_paint_ms is None:
+            self.profiler.mark_first_paint()
+        self.master.after_idle(self.finish_startup)
+    
+    def finish_startup(self):
+        """加载启动时延后的资源：窗口图标、已保存的对话列表和搜索索引，只执行一次"""
+        if self.startup_finished:
+            return
+        self.startup_finished = True
+        self.master.after_cancel(self.startup_job)
+        
         # 设置窗口图标
         self.set_window_icon()
+        self.profile("加载图标")
+        
+        # 把已保存的对话加入侧边栏
+        self.manager.load_saved()
+        self.profile("加载对话列表")
         
-        # 初始化聊天历史
-        self.chat_history = []
+        # 在后台建立搜索索引，之后新消息在追加时加入
+        self.manager.build_search_index()
+        self.profile("开始建立搜索索引")
+        
+        # 缓存中没有预处理的图片时，在后台生成，下次启动直接使用
+        prepare_cache_in_background()
     
-    def on_window_resize(self, event):
-        """处理窗口大小改变事件"""
-        if event.widget == self.master:
-            # 确保输入框始终可见
-            window_height = event.height
-            # 如果窗口高度小于特定值，调整底部框架高度
-            if window_height < 500:  # 你可以调整这个阈值
-                self.bottom_frame.configure(height=100)
+    def profile(self, phase):
+        """启用了启动耗时统计时，记录一个阶段"""
+        if self.profiler is not None:
+            self.profiler.mark(phase)
+    
+    @property
+    def chat_history(self):
+        """当前对话的聊天历史"""
+        return self.manager.current.history
+    
+    @property
+    def current_conversation_id(self):
+        """当前对话的ID"""
+        return self.manager.current.conversation_id
+    
+    @property
+    def saved_conversations(self):
+        """已保存的对话列表"""
+        return self.manager.saved_conversations
+    
+    def on_manager_event(self, event, *args):
+        """根据对话管理器的事件更新界面
+        
+        Args:
+            event: 事件名称
+            args: 事件参数
+        """
+        if event == "conversation_saved":
+            self.add_conversation_to_sidebar(*args)
+        elif event == "conversation_renamed":
+            conversation_id, title = args
+            self.history_list.rename(conversation_id, title)
+            if conversation_id == self.current_conversation_id:
+                self.chat_title.config(text=title)
+        elif event == "conversation_touched":
+            self.history_list.move(*args)
+        elif event == "conversation_deleted":
+            self.history_list.remove(args[0])
+        elif event == "conversation_started":
+            # 清空聊天区域并显示欢迎消息
+            self.renderer.clear()
+            self.chat_title.config(text="新对话")
+            self.display_message("DeepSeek", "欢迎开始新的对话！请问有什么我可以帮您的吗？")
+            self.update_stop_button()
+        elif event == "save_state_changed":
+            # 消息同步到磁盘之前崩溃会丢失，保存确认之前在标题栏提示；有消息没能保存时一直提示
+            saving, failed = args
+            if failed:
+                self.master.title(f"DeepSeek Chat（{failed} 条消息没有保存）")
             else:
-                self.bottom_frame.configure(height=150)
+                self.master.title("DeepSeek Chat（正在保存...）" if saving else "DeepSeek Chat")
+        elif event == "conversation_opened":
+            self.chat_title.config(text=args[0].title)
+            # 只显示最近的一页消息，更早的消息在滚动到顶部时再补充
+            self.show_latest_messages()
+            # 这个对话还有回复在生成或排队时，接着显示它们
+            self.show_pending_replies(args[0].conversation_id)
+            self.update_stop_button()
+    
+    def on_search_changed(self, event=None):
+        """搜索内容改变后，稍等片刻再搜索，避免每次按键都搜索"""
+        if self.search_job is not None:
+            self.master.after_cancel(self.search_job)
+        self.search_job = self.master.after(self.SEARCH_DELAY_MS, self.run_search)
+    
+    def run_search(self):
+        """搜索所有对话并显示结果"""
+        self.search_job = None
+        query = self.search_var.get().strip()
+        self.search_query = query
+        if not query:
+            self.search_results.delete(0, END)
+            self.search_result_ids = []
+            self.search_results.pack_forget()
+            return
+        # 使用工作进程时结果稍后才到达，界面不等待
+        self.manager.search_async(query, lambda results: self.show_search_results(query, results), self.SEARCH_LIMIT)
+    
+    def show_search_results(self, query, results):
+        """显示搜索结果，搜索内容已经改变时丢弃
+
+        Args:
+            query: 这次搜索的内容
+            results: (对话ID, 对话标题, 摘要) 的列表
+        """
+        if query != self.search_query:
+            return
+        self.search_results.delete(0, END)
+        self.search_result_ids = []
+        for conversation_id, title, snippet in results:
+            self.search_results.insert(END, f"{title}：{snippet}")
+            self.search_result_ids.append(conversation_id)
+        
+        if not self.search_result_ids:
+            self.search_results.insert(END, "没有找到相关对话")
+        self.search_results.pack(side=TOP, fill=X, pady=(5, 0))
+    
+    def open_search_result(self, event=None):
+        """打开选中的搜索结果所在的对话"""
+        selection = self.search_results.curselection()
+        if not selection or selection[0] >= len(self.search_result_ids):
+            return
+        conversation_id = self.search_result_ids[selection[0]]
+        if conversation_id != self.current_conversation_id:
+            self.load_conversation(conversation_id)
+    
+    def clear_search(self, event=None):
+        """清空搜索框并隐藏结果"""
+        self.search_var.set("")
+        self.run_search()
+    
+    def on_window_resize(self, event):
+        """处理窗口大小改变事件
+        
+        绑定在主窗口上的<Configure>对每个子控件的大小改变都会触发，这里只处理主窗口自己的，
+        并且只标记需要重新布局，拖动窗口时连续的多次改变在空闲时只处理最新的尺寸。
+        """
+        if event.widget is self.master:
+            self.layout.invalidate("window", event.width, event.height)
+    
+    def layout_window(self, width, height):
+        """按窗口的最新尺寸调整底部框架和背景图片"""
+        # 确保输入框始终可见：如果窗口高度小于特定值，调整底部框架高度
+        bottom_height = 100 if height < 500 else 150  # 你可以调整这个阈值
+        if bottom_height != self.bottom_height:
+            self.bottom_height = bottom_height
+            self.bottom_frame.configure(height=bottom_height)
+        # 在后台按新的大小缩放背景
+        size = (max(1, width - self.sidebar_frame.winfo_width()), max(1, height))
+        if size != self.background_size:
+            self.background_size = size
+            self.assets.request('背景1.png', size, self.show_background, scale=1, cover=True)
+    
+    def show_background(self, photo):
+        """显示缩放好的背景图片"""
+        self.background_photo = photo
+        self.background_label.configure(image=photo)
     
     def start_new_conversation(self):
         """开始新的对话，保存当前对话到侧边栏"""
-        # 检查当前对话是否有消息
-        if len(self.chat_history) > 0 and self.current_conversation_id not in self.saved_conversations:
-            # 生成对话标题（使用第一条用户消息）
-            title = "新对话"
-            for msg in self.chat_history:
-                if msg["role"] == "user":
-                    # 截取前20个字符作为标题
-                    title = msg["content"][:20] + ("..." if len(msg["content"]) > 20 else "")
-                    break
-            
-            # 保存当前对话
-            self.saved_conversations[self.current_conversation_id] = {
-                "title": title,
-                "history": self.chat_history.copy(),
-                "timestamp": time.time()
-            }
-            
-            # 添加到侧边栏
-            self.add_conversation_to_sidebar(self.current_conversation_id, title)
-        
-        # 清空聊天区域
-        self.conversation.configure(state='normal')
-        self.conversation.delete("1.0", END)
-        self.conversation.configure(state='disabled')
-        
-        # 重置聊天历史
-        self.chat_history = []
-        
-        # 生成新的对话ID
-        self.current_conversation_id = str(uuid.uuid4())
-        
-        # 更新标题
-        self.chat_title.config(text="新对话")
-        
-        # 显示欢迎消息
-        self.display_message("DeepSeek", "欢迎开始新的对话！请问有什么我可以帮您的吗？")
+        self.loading_conversation_id = None
+        self.manager.new_conversation()
     
-    def add_conversation_to_sidebar(self, conversation_id, title):
-        """将对话添加到侧边栏
+    def add_conversation_to_sidebar(self, conversation_id, title, timestamp):
+        """将对话添加到侧边栏，按最近活动时间放到对应的分组中
         
         Args:
             conversation_id: 对话ID
             title: 对话标题
+            timestamp: 最近活动的时间戳
         """
-        # 创建对话项目
-        conversation_item = Label(
-            self.history_frame,
-            text=title,
-            font=('Segoe UI', 11),
-            bg='#1F2937',
-            fg='#D1D5DB',
-            anchor='w',
-            padx=10,
-            pady=8,
-            cursor="hand2"
-        )
-        # 为标签添加conversation_id属性，方便查找
-        conversation_item.conversation_id = conversation_id
-        conversation_item.pack(side=TOP, fill=X, pady=2)
-        
-        # 添加鼠标悬停效果
-        conversation_item.bind("<Enter>", lambda e: e.widget.config(bg='#374151'))
-        conversation_item.bind("<Leave>", lambda e: e.widget.config(bg='#1F2937'))
+        self.history_list.add(conversation_id, title, timestamp)
+    
+    def load_conversation(self, conversation_id):
+        """加载历史对话，当前对话有内容时先保存到侧边栏
         
-        # 绑定点击事件以加载对话
-        conversation_item.bind("<Button-1>", lambda e, cid=conversation_id: self.load_conversation(cid))
+        大的对话在后台线程中读取和解压，读取完成后再打开。
         
-        # 添加右键菜单功能
-        conversation_item.bind("<Button-3>", lambda e, cid=conversation_id, item=conversation_item: self.show_conversation_menu(e, cid, item))
+        Args:
+            conversation_id: 要加载的对话ID
+        """
+        if self.manager.needs_loading(conversation_id) and \
+                self.manager.store.conversation_size(conversation_id) >= self.BACKGROUND_LOAD_MESSAGES:
+            self.load_in_background(conversation_id)
+            return
+        self.loading_conversation_id = None
+        self.manager.open_conversation(conversation_id)
+    
+    def load_in_background(self, conversation_id):
+        """在后台线程中读取对话的消息，只有最后一次请求的对话会被打开"""
+        self.loading_conversation_id = conversation_id
+        self.chat_title.config(text="加载中...")
+        
+        def read():
+            try:
+                self.load_results.put((conversation_id, self.manager.store.read_messages(conversation_id)))
+            except Exception as e:
+                self.load_results.put((conversation_id, e))
+        threading.Thread(target=read, daemon=True).start()
+        if self.load_job is None:
+            self.load_job = self.master.after(self.STREAM_POLL_MS, self.poll_loaded_conversations)
+    
+    def poll_loaded_conversations(self):
+        """打开后台读取完成的对话，之后又选择了其它对话时丢弃结果"""
+        self.load_job = None
+        while True:
+            try:
+                conversation_id, messages = self.load_results.get_nowait()
+            except queue.Empty:
+                break
+            if conversation_id != self.loading_conversation_id:
+                continue
+            self.loading_conversation_id = None
+            if isinstance(messages, Exception):
+                print(f"读取对话失败: {messages}")
+            elif self.manager.open_conversation(conversation_id, messages) is not None:
+                continue
+            # 读取失败或者对话在读取期间被删除，恢复原来的标题
+            self.chat_title.config(text=self.manager.current.title)
+        if self.loading_conversation_id is not None:
+            self.load_job = self.master.after(self.STREAM_POLL_MS, self.poll_loaded_conversations)
+    
+    def transcript_entries(self, start, end):
+        """把聊天历史中的一段转换成渲染器需要的消息元组
         
-        # 更新滚动区域
-        self.history_frame.update_idletasks()
-        self.history_canvas.configure(scrollregion=self.history_canvas.bbox("all"))
+        Args:
+            start: 开始下标
+            end: 结束下标（不包含）
+        """
+        entries = []
+        for index in range(start, end):
+            msg = self.chat_history[index]
+            sender = "你" if msg.role == "user" else "DeepSeek"
+            sender_display, name_tag, msg_tag = self.message_style(sender)
+            entries.append((sender_display, msg.content, name_tag, msg_tag, index))
+        return entries
     
-    def load_conversation(self, conversation_id):
-        """加载历史对话
+    def show_latest_messages(self):
+        """清空对话区域，一次性显示最近的一页消息"""
+        start = max(0, len(self.chat_history) - self.TRANSCRIPT_PAGE_SIZE)
+        self.renderer.show_messages(self.transcript_entries(start, len(self.chat_history)))
+    
+    def on_transcript_scroll(self, first, last):
+        """对话区域滚动时更新滚动条，并在到达顶部或底部时补充消息
         
         Args:
-            conversation_id: 要加载的对话ID
+            first: 可见区域顶部的位置（0到1）
+            last: 可见区域底部的位置（0到1）
         """
-        # 如果当前对话有内容，先保存当前对话
-        if len(self.chat_history) > 0 and self.current_conversation_id not in self.saved_conversations:
-            # 生成对话标题
-            title = "新对话"
-            for msg in self.chat_history:
-                if msg["role"] == "user":
-                    title = msg["content"][:20] + ("..." if len(msg["content"]) > 20 else "")
-                    break
-            
-            # 保存当前对话
-            self.saved_conversations[self.current_conversation_id] = {
-                "title": title,
-                "history": self.chat_history.copy(),
-                "timestamp": time.time()
-            }
-            
-            # 添加到侧边栏
-            self.add_conversation_to_sidebar(self.current_conversation_id, title)
-        
-        # 获取要加载的对话
-        conversation = self.saved_conversations.get(conversation_id)
-        if conversation:
-            # 更新当前对话ID
-            self.current_conversation_id = conversation_id
-            
-            # 更新标题
-            self.chat_title.config(text=conversation["title"])
-            
-            # 清空聊天区域
-            self.conversation.configure(state='normal')
-            self.conversation.delete("1.0", END)
-            self.conversation.configure(state='disabled')
-            
-            # 加载聊天历史
-            self.chat_history = conversation["history"].copy()
-            
-            # 显示消息
-            for msg in self.chat_history:
-                if msg["role"] == "user":
-                    self.display_message("你", msg["content"], no_history=True)
-                else:
-                    self.display_message("DeepSeek", msg["content"], no_history=True)
+        self.scrollbar.set(first, last)
+        if self.paging_job is not None:
+            return
+        if float(first) <= 0.0:
+            if self.renderer.first_key():
+                self.paging_job = self.master.after_idle(self.load_older_messages)
+        elif float(last) >= 1.0:
+            if not self.is_showing_latest():
+                self.paging_job = self.master.after_idle(self.load_newer_messages)
+    
+    def load_older_messages(self):
+        """在对话区域顶部补充一页更早的消息"""
+        self.paging_job = None
+        first_key = self.renderer.first_key()
+        if not first_key:
+            return
+        start = max(0, first_key - self.TRANSCRIPT_PAGE_SIZE)
+        self.renderer.prepend_messages(self.transcript_entries(start, first_key))
+        
+        # 超出上限时从底部移除消息，正在显示回复时保留
+        excess = len(self.renderer.messages) - self.TRANSCRIPT_MAX_MESSAGES
+        if excess > 0 and not self.has_pending_replies():
+            self.renderer.trim_bottom(excess)
+    
+    def load_newer_messages(self):
+        """向上翻页后再滚动到底部时，补充一页之后的消息"""
+        self.paging_job = None
+        last_key = self.renderer.last_key()
+        if last_key is None:
+            return
+        end = min(len(self.chat_history), last_key + 1 + self.TRANSCRIPT_PAGE_SIZE)
+        self.renderer.append_messages(self.transcript_entries(last_key + 1, end))
+        
+        # 超出上限时从顶部移除消息
+        excess = len(self.renderer.messages) - self.TRANSCRIPT_MAX_MESSAGES
+        if excess > 0:
+            self.renderer.trim_top(excess)
+    
+    def is_showing_latest(self):
+        """对话区域是否显示到了最新的消息"""
+        last_key = self.renderer.last_key()
+        return last_key is None or last_key >= len(self.chat_history) - 1
         
     def handle_return(self, event):
         """处理按下回车键事件"""
@@ -342,101 +750,221 @@ class ChatWindow:
             self.send_message()
             return "break"  # 防止默认行为
     
-    def add_history_item(self, title):
-        """添加一个聊天历史项目"""
-        history_item = Label(
-            self.history_frame,
-            text=title,
-            font=('Segoe UI', 11),
-            bg='#1F2937',
-            fg='#D1D5DB',
-            anchor='w',
-            padx=10,
-            pady=8,
-            cursor="hand2"
-        )
-        history_item.pack(side=TOP, fill=X, pady=2)
-        # 添加鼠标悬停效果
-        history_item.bind("<Enter>", lambda e: e.widget.config(bg='#374151'))
-        history_item.bind("<Leave>", lambda e: e.widget.config(bg='#1F2937'))
-    
     def set_window_icon(self):
-        """设置窗口图标"""
-        try:
-            # 假设图标文件在 photos 目录下
-            icon_path = os.path.join(os.path.dirname(__file__), 'photos', 'icon.png')
-            if os.path.exists(icon_path):
-                icon = Image.open(icon_path)
-                photo = ImageTk.PhotoImage(icon)
-                self.master.iconphoto(True, photo)
-        except Exception as e:
-            print(f"无法加载图标: {e}")
+        """设置窗口图标
+        
+        优先使用Tk直接读取预处理好的各个尺寸的PNG；没有预处理也没有PIL时使用原始图片。
+        """
+        photos = [self.assets.photo('icon.png', size, scale=1) for size in ((16, 16), (32, 32), (64, 64))]
+        photos = [photo for photo in photos if photo is not None]
+        if not photos:
+            photo = self.assets.photo('icon.png')
+            if photo is None:
+                print("无法加载图标")
+                return
+            photos = [photo]
+        # 保留引用，否则图片会被回收
+        self.icon_photos = photos
+        self.master.iconphoto(True, *photos)
     
     def send_message(self):
         """处理发送消息逻辑"""
         message = self.user_input.get("1.0", END).strip()
         if message:
-            self.display_message("你", message)
+            # 向上翻页查看旧消息时，先回到最新的消息
+            if not self.is_showing_latest():
+                self.show_latest_messages()
+            user_tag = self.display_message("你", message)
             self.user_input.delete("1.0", END)
-            # 保存到聊天历史
-            self.chat_history.append({"role": "user", "content": message})
-            
-            # 如果是第一条消息，更新对话标题
-            if len(self.chat_history) == 1:
-                title = message[:20] + ("..." if len(message) > 20 else "")
-                self.chat_title.config(text=title)
             
             # 生成并显示系统响应
-            self.respond_to_message(message)
+            self.respond_to_message(message, user_tag)
     
-    def respond_to_message(self, message):
-        """生成并显示系统响应
+    def respond_to_message(self, message, user_tag=None):
+        """把消息交给调度器，轮到它时写入聊天历史并请求模型
         
         Args:
             message: 用户发送的消息内容
+            user_tag: 显示这条用户消息的标签
+        """
+        request = self.scheduler.submit(self.manager.current, message)
+        self.attach_request(request, user_tag)
+        self.schedule_reply_poll()
+        self.update_stop_button()
+    
+    def attach_request(self, request, user_tag):
+        """为请求显示占位消息，并记下它在对话区域中的标签
+        
+        Args:
+            request: 回复请求
+            user_tag: 显示用户消息的标签
+        """
+        request.user_tag = user_tag
+        # 立即显示思考中（排队时显示排队中），回复写入到这条占位消息里
+        request.queued_display = request.state == "queued"
+        request.placeholder = self.start_typing_animation(request.queued_display)
+        request.replying = False
+    
+    def show_pending_replies(self, conversation_id):
+        """重新打开对话时，显示这个对话中还在生成或排队的回复
+        
+        Args:
+            conversation_id: 对话ID
+        """
+        for request in self.scheduler.requests_for(conversation_id):
+            # 排队中的用户消息还没有写入聊天历史，需要单独显示
+            user_tag = self.display_message("你", request.message) if request.state == "queued" else None
+            self.attach_request(request, user_tag)
+            if request.text:
+                self.finish_typing_and_respond(request.placeholder)
+                self.append_to_message(request.placeholder, request.text)
+                request.replying = True
+    
+    def schedule_reply_poll(self):
+        """安排下一次取出回复片段"""
+        if self.reply_job is None:
+            self.reply_job = self.master.after(self.STREAM_POLL_MS, self.poll_replies)
+    
+    def poll_replies(self):
+        """取出所有对话的回复片段，只显示当前对话的"""
+        self.reply_job = None
+        for kind, request, data in self.scheduler.poll():
+            self.handle_reply_event(kind, request, data)
+        self.update_stop_button()
+        # 还有回复没有完成时继续等待
+        if self.scheduler.busy:
+            self.schedule_reply_poll()
+    
+    def handle_reply_event(self, kind, request, data):
+        """根据调度器的事件更新对话区域
+        
+        Args:
+            kind: 事件名称
+            request: 回复请求
+            data: 事件数据
+        """
+        if kind == "error":
+            print(f"模型请求失败: {data}")
+        elif kind == "done":
+            self.last_latency = request.meter
+            print(request.meter.summary())
+            if self.metrics is not None:
+                self.metrics.observe_reply(request.meter)
+            if hasattr(self.backend, 'cache'):
+                print(self.backend.cache.summary())
+        # 其它对话的回复已经由调度器保存到它自己的对话中，这里只更新显示中的对话
+        if request.conversation_id != self.current_conversation_id or not hasattr(request, 'placeholder'):
+            return
+        
+        if kind == "started":
+            # 用户消息已经写入聊天历史，记录它的位置供翻页使用
+            self.renderer.set_key(request.user_tag, request.user_index)
+            if request.user_index == 0:
+                self.chat_title.config(text=request.session.title)
+            if request.queued_display:
+                request.queued_display = False
+                self.renderer.replace_content(request.placeholder, [
+                    ("DeepSeek: ", 'ai_name'),
+                    ("思考中...", 'ai_message')
+                ])
+        elif kind == "token":
+            # 收到首个片段时替换思考中的提示
+            if not request.replying:
+                self.finish_typing_and_respond(request.placeholder)
+                request.replying = True
+            self.append_to_message(request.placeholder, data)
+        elif kind == "error":
+            # 繁忙提示只显示在对话区域中，不保存到聊天历史
+            if request.replying:
+                self.append_to_message(request.placeholder, "\n\n")
+                self.renderer.append(BUSY_REPLY, 'ai_complete', request.placeholder)
+            else:
+                self.renderer.replace_content(request.placeholder, [
+                    ("DeepSeek: ", 'ai_name'),
+                    (BUSY_REPLY, 'ai_complete')
+                ])
+        elif kind == "done":
+            if request.error is None and not request.replying:
+                self.finish_typing_and_respond(request.placeholder)
+                request.replying = True
+            self.show_final_response(request.placeholder, request.reply_index)
+        elif kind == "cancelled":
+            if request.user_index is not None:
+                self.renderer.set_key(request.user_tag, request.user_index)
+            if request.replying:
+                self.show_final_response(request.placeholder, request.reply_index)
+            else:
+                self.renderer.replace_content(request.placeholder, [
+                    ("DeepSeek: ", 'ai_name'),
+                    ("已停止", 'ai_complete')
+                ])
+    
+    def has_pending_replies(self):
+        """当前对话是否有回复在生成或排队"""
+        return bool(self.scheduler.requests_for(self.current_conversation_id))
+    
+    def update_stop_button(self):
+        """当前对话有回复在生成或排队时才能点击停止"""
+        self.stop_button.configure(state='normal' if self.has_pending_replies() else 'disabled')
+    
+    def stop_reply(self):
+        """停止当前对话中正在生成和排队的回复，已经收到的内容会保存"""
+        self.scheduler.cancel_conversation(self.current_conversation_id)
+        self.schedule_reply_poll()
+    
+    def start_typing_animation(self, queued=False):
+        """开始显示打字动画
+        
+        Args:
+            queued: 是否还在排队
+            
+        Returns:
+            占位消息的标签，每个等待中的回复都有自己的占位消息
+        """
+        return self.display_message("DeepSeek", "排队中..." if queued else "思考中...", is_typing=True)
+    
+    def finish_typing_and_respond(self, placeholder):
+        """完成打字动画，并开始显示回复
+        
+        Args:
+            placeholder: 占位消息的标签
+        """
+        # 直接通过标签定位占位消息，把"思考中"替换成"思考完成"，回复接在它后面
+        self.renderer.replace_content(placeholder, [
+            ("DeepSeek: 思考完成\n", 'ai_complete'),
+            ("\n\n", None),
+            ("DeepSeek: ", 'ai_name')
+        ])
+    
+    def append_to_message(self, placeholder, text):
+        """把回复片段追加到对应的回复消息
+        
+        Args:
+            placeholder: 回复消息的标签
+            text: 回复片段
         """
-        # 模拟思考延迟
-        self.master.after(1000, lambda: self.start_typing_animation())
-        
-        # 模拟生成回复的时间
-        response_time = 2000  # 2秒后回复
-        
-        # 设置固定回复
-        response = "服务器繁忙，请稍后重试。"
-        
-        # 延迟后显示回复
-        self.master.after(response_time, lambda: self.finish_typing_and_respond(response))
-    
-    def start_typing_animation(self):
-        """开始显示打字动画"""
-        self.display_message("DeepSeek", "思考中...", is_typing=True)
-    
-    def finish_typing_and_respond(self, response):
-        """完成打字动画并显示回复"""
-        # 移除打字动画
-        self.conversation.configure(state='normal')
-        # 查找最后一条消息的开始位置
-        last_msg_pos = self.conversation.search("DeepSeek: 思考中...", "1.0", END)
-        if last_msg_pos:
-            # 获取行号
-            line_num = last_msg_pos.split('.')[0]
-            # 删除该行到下一行
-            self.conversation.delete(f"{line_num}.0", f"{int(line_num)+1}.0")
-            # 在同一位置添加"思考完成"
-            self.conversation.insert(f"{line_num}.0", "DeepSeek: 思考完成\n", 'ai_complete')
-        self.conversation.configure(state='disabled')
-        
-        # 稍微延迟显示实际回复
-        self.master.after(500, lambda: self.show_final_response(response))
-    
-    def show_final_response(self, response):
-        """显示最终回复"""
-        # 显示实际回复
-        self.display_message("DeepSeek", response)
-        # 保存到聊天历史
-        self.chat_history.append({"role": "assistant", "content": response})
-    
-    def display_message(self, sender, message, is_typing=False, no_history=False):
+        self.renderer.append(text, 'ai_message', placeholder)
+    
+    def show_final_response(self, placeholder, index):
+        """回复已经由调度器保存到聊天历史，记录它在聊天历史中的位置，供翻页使用
+        
+        Args:
+            placeholder: 显示这条回复的消息标签
+            index: 回复在聊天历史中的下标，没有保存时为None
+        """
+        self.renderer.set_key(placeholder, index)
+    
+    def message_style(self, sender):
+        """返回发送者的显示名称和样式标签
+        
+        Args:
+            sender: 发送者名称
+        """
+        if sender == "你":
+            return "你", 'user_name', 'user_message'
+        return "DeepSeek", 'ai_name', 'ai_message'
+    
+    def display_message(self, sender, message, is_typing=False, no_history=False, key=None):
         """在对话区域显示消息
         
         Args:
@@ -444,46 +972,23 @@ class ChatWindow:
             message: 要显示的消息内容
             is_typing: 是否是打字动画
             no_history: 是否不添加到历史记录
+            key: 消息在聊天历史中的下标，不属于聊天历史的消息为None
+            
+        Returns:
+            这条消息在对话区域中的标签
         """
-        self.conversation.configure(state='normal')
-        
-        # 添加分隔符
-        if self.conversation.get("1.0", END).strip():
-            self.conversation.insert(END, "\n\n")
-        
         # 设置样式标签
-        if sender == "你":
-            name_tag = 'user_name'
-            msg_tag = 'user_message'
-            sender_display = "你"
-        else:
-            name_tag = 'ai_name'
-            msg_tag = 'ai_message'
-            sender_display = "DeepSeek"
-        
-        # 插入发送者名称
-        self.conversation.insert(END, f"{sender_display}: ", name_tag)
-        
-        # 插入消息内容
-        self.conversation.insert(END, message, msg_tag)
-        
-        # 配置标签样式
-        self.conversation.tag_configure('user_name', foreground='#60A5FA', font=('Segoe UI', 12, 'bold'))
-        self.conversation.tag_configure('user_message', foreground='#E5E7EB', font=('Segoe UI', 12))
-        self.conversation.tag_configure('ai_name', foreground='#34D399', font=('Segoe UI', 12, 'bold'))
-        self.conversation.tag_configure('ai_message', foreground='#E5E7EB', font=('Segoe UI', 12))
-        self.conversation.tag_configure('ai_complete', foreground='#34D399', font=('Segoe UI', 12))
+        sender_display, name_tag, msg_tag = self.message_style(sender)
         
-        self.conversation.configure(state='disabled')
-        self.conversation.see(END)
+        # 交给渲染器在下一帧统一写入，返回的标签可以用来继续修改这条消息
+        return self.renderer.add_message(sender_display, message, name_tag, msg_tag, key=key)
     
-    def show_conversation_menu(self, event, conversation_id, item):
+    def show_conversation_menu(self, event, conversation_id):
         """显示对话右键菜单
         
         Args:
             event: 鼠标事件
             conversation_id: 对话ID
-            item: 对话标签控件
         """
         # 创建右键菜单
         context_menu = Menu(self.master, tearoff=0, bg='#1F2937', fg='#D1D5DB', 
@@ -492,24 +997,23 @@ class ChatWindow:
         
         # 添加重命名选项
         context_menu.add_command(label="重命名", 
-                               command=lambda: self.rename_conversation(conversation_id, item))
+                               command=lambda: self.rename_conversation(conversation_id))
         
         # 添加删除选项
         context_menu.add_command(label="删除对话", 
-                               command=lambda: self.delete_conversation(conversation_id, item))
+                               command=lambda: self.delete_conversation(conversation_id))
         
         # 在鼠标位置显示菜单
         context_menu.tk_popup(event.x_root, event.y_root)
     
-    def rename_conversation(self, conversation_id, item):
+    def rename_conversation(self, conversation_id):
         """重命名对话
         
         Args:
             conversation_id: 要重命名的对话ID
-            item: 对话的标签控件
         """
         # 获取当前标题
-        current_title = item.cget("text")
+        current_title = self.manager.get_title(conversation_id)
         
         # 创建顶层窗口用于重命名
         rename_window = Toplevel(self.master)
@@ -566,16 +1070,8 @@ class ChatWindow:
                 # 如果为空，则恢复原名称
                 new_title = current_title
             
-            # 更新界面显示
-            item.config(text=new_title)
-            
-            # 更新保存的对话信息
-            if conversation_id in self.saved_conversations:
-                self.saved_conversations[conversation_id]["title"] = new_title
-            
-            # 如果是当前对话，更新标题
-            if conversation_id == self.current_conversation_id:
-                self.chat_title.config(text=new_title)
+            # 更新保存的对话信息，界面在收到事件后更新
+            self.manager.rename_conversation(conversation_id, new_title)
             
             # 关闭窗口
             rename_window.destroy()
@@ -611,32 +1107,21 @@ class ChatWindow:
         # 等待窗口关闭
         self.master.wait_window(rename_window)
     
-    def delete_conversation(self, conversation_id, item):
+    def delete_conversation(self, conversation_id):
         """删除对话
         
         Args:
             conversation_id: 要删除的对话ID
-            item: 对话的标签控件
         """
         # 显示确认对话框
         confirm = messagebox.askyesno("确认删除", "确定要删除这个对话吗？", 
                                     parent=self.master)
         
         if confirm:
-            # 从保存的对话字典中删除
-            if conversation_id in self.saved_conversations:
-                del self.saved_conversations[conversation_id]
-            
-            # 从UI中移除对话项
-            item.destroy()
-            
-            # 如果删除的是当前对话，则开始新对话
-            if conversation_id == self.current_conversation_id:
-                self.start_new_conversation()
-            
-            # 更新滚动区域
-            self.history_frame.update_idletasks()
-            self.history_canvas.configure(scrollregion=self.history_canvas.bbox("all"))
+            # 删除对话，删除的是当前对话时会开始新对话
+            self.manager.delete_conversation(conversation_id)
+            # 调度器会丢弃这个对话的回复，取出取消事件
+            self.schedule_reply_poll()
     
     def rename_current_conversation(self, event=None):
         """重命名当前对话的标题
@@ -647,115 +1132,61 @@ class ChatWindow:
         # 如果当前没有对话或是新对话且没有消息，则不允许重命名
         if len(self.chat_history) == 0:
             return
-            
-        # 获取当前标题
-        current_title = self.chat_title.cget("text")
-        
-        # 创建顶层窗口用于重命名
-        rename_window = Toplevel(self.master)
-        rename_window.title("重命名对话")
-        rename_window.configure(bg='#1F2937')
-        rename_window.resizable(False, False)
-        
-        # 设置模态窗口
-        rename_window.transient(self.master)
-        rename_window.grab_set()
-        
-        # 居中显示
-        window_width = 300
-        window_height = 120
-        screen_width = self.master.winfo_screenwidth()
-        screen_height = self.master.winfo_screenheight()
-        x = (screen_width - window_width) // 2
-        y = (screen_height - window_height) // 2
-        rename_window.geometry(f"{window_width}x{window_height}+{x}+{y}")
-        
-        # 添加标签
-        Label(
-            rename_window,
-            text="请输入新名称：",
-            font=('Segoe UI', 11),
-            bg='#1F2937',
-            fg='#FFFFFF',
-            pady=10
-        ).pack(padx=20)
-        
-        # 添加输入框
-        entry = Entry(
-            rename_window,
-            font=('Segoe UI', 11),
-            bg='#374151',
-            fg='#FFFFFF',
-            insertbackground='#FFFFFF',
-            width=30
-        )
-        entry.pack(padx=20, pady=5)
-        entry.insert(0, current_title)
-        entry.select_range(0, END)  # 选中所有文本
-        entry.focus_set()  # 设置焦点
-        
-        # 创建按钮框架
-        button_frame = Frame(rename_window, bg='#1F2937')
-        button_frame.pack(pady=10)
         
-        # 定义确认重命名的函数
-        def confirm_rename():
-            new_title = entry.get().strip()
-            # 检查是否为空
-            if not new_title:
-                # 如果为空，则恢复原名称
-                new_title = current_title
-            
-            # 更新标题显示
-            self.chat_title.config(text=new_title)
-            
-            # 更新保存的对话信息
-            if self.current_conversation_id in self.saved_conversations:
-                self.saved_conversations[self.current_conversation_id]["title"] = new_title
-                
-                # 同时更新侧边栏中的对话标题
-                for child in self.history_frame.winfo_children():
-                    if isinstance(child, Label) and hasattr(child, 'conversation_id') and child.conversation_id == self.current_conversation_id:
-                        child.config(text=new_title)
-                        break
-            
-            # 关闭窗口
-            rename_window.destroy()
-        
-        # 添加确认和取消按钮
-        Button(
-            button_frame,
-            text="确认",
-            font=('Segoe UI', 11),
-            bg='#2563EB',
-            fg='#FFFFFF',
-            activebackground='#1D4ED8',
-            activeforeground='#FFFFFF',
-            padx=10,
-            command=confirm_rename
-        ).pack(side=LEFT, padx=5)
-        
-        Button(
-            button_frame,
-            text="取消",
-            font=('Segoe UI', 11),
-            bg='#4B5563',
-            fg='#FFFFFF',
-            activebackground='#374151',
-            activeforeground='#FFFFFF',
-            padx=10,
-            command=rename_window.destroy
-        ).pack(side=LEFT, padx=5)
-        
-        # 绑定回车键
-        entry.bind("<Return>", lambda e: confirm_rename())
-        
-        # 等待窗口关闭
-        self.master.wait_window(rename_window)
+        self.rename_conversation(self.current_conversation_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DeepSeek Chat")
+    parser.add_argument('--profile-startup', action='store_true', help="打印启动各阶段的耗时后退出")
+    parser.add_argument('--export', metavar='PATH', help="把所有对话导出为JSONL文件（- 表示标准输出）后退出")
+    parser.add_argument('--import', dest='import_path', metavar='PATH',
+                        help="从JSONL文件导入对话（- 表示标准输入，已存在的对话会被跳过）后退出")
+    parser.add_argument('--batch', metavar='PATH',
+                        help="不启动界面，批量运行JSONL文件中的提示（每行 {\"prompt\": ...} 或 {\"turns\": [...]}）")
+    parser.add_argument('--batch-output', metavar='PATH', help="批处理的结果文件，默认为输入文件名加上 .results.jsonl")
+    parser.add_argument('--concurrency', type=int, default=4, help="批处理时最多同时进行的任务数量")
+    parser.add_argument('--rate', type=float, default=0, help="批处理时每秒最多发送的请求数，0表示不限速")
+    parser.add_argument('--burst', type=int, default=1, help="限速时允许的突发请求数")
+    args = parser.parse_args()
+    
+    if args.export is not None or args.import_path is not None:
+        # 导出和导入不需要界面，直接读写数据库；先恢复上次留下的日志，导出的内容才完整
+        from archive import run_archive_command
+        store = open_store()
+        try:
+            raise SystemExit(run_archive_command(store, args.export, args.import_path))
+        finally:
+            store.close()
+    if args.batch is not None:
+        # 批处理使用和界面相同的对话管理器和回复调度器，但不创建窗口
+        from batch import run_batch_command
+        backend = create_chat_backend()
+        raise SystemExit(run_batch_command(
+            backend, args.batch, args.batch_output, max(1, args.concurrency), args.rate, args.burst
+        ))
+    profiler = startup_profiler if args.profile_startup else None
+    
+    # 创建tkinter根窗口
+    root = Tk()
+    startup_profiler.mark("创建根窗口")
+    # 创建聊天窗口实例
+    chat_app = ChatWindow(root, profiler)
+    startup_profiler.mark("创建界面")
+    
+    if profiler is not None:
+        # 延后的资源加载完成后打印报告并退出
+        def report():
+            if not chat_app.startup_finished:
+                root.after(10, report)
+                return
+            print(profiler.report())
+            root.destroy()
+        root.after_idle(report)
+    
+    # 进入主事件循环
+    root.mainloop()
+
 
-# 创建tkinter根窗口
-root = Tk()
-# 创建聊天窗口实例
-chat_app = ChatWindow(root)
-# 进入主事件循环
-root.mainloop()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# 导入必要的库
+import re  # 导入正则表达式模块用于识别Markdown语法
+
+# Markdown元素使用的文本样式，需要在消息内容的样式之后配置，才能覆盖它的字体
+MARKDOWN_TAGS = {
+    'md_h1': {'font': ('Segoe UI', 18, 'bold')},
+    'md_h2': {'font': ('Segoe UI', 15, 'bold')},
+    'md_h3': {'font': ('Segoe UI', 13, 'bold')},
+    'md_bold': {'font': ('Segoe UI', 12, 'bold')},
+    'md_inline_code': {'font': ('Consolas', 11), 'background': '#374151'},
+    'md_code': {'font': ('Consolas', 11), 'background': '#1F2937', 'lmargin1': 16, 'lmargin2': 16},
+    'md_fence': {'font': ('Consolas', 9), 'foreground': '#9CA3AF', 'background': '#1F2937',
+                 'lmargin1': 16, 'lmargin2': 16},
+    'md_list': {'lmargin1': 12, 'lmargin2': 28},
+    'md_quote': {'foreground': '#9CA3AF', 'lmargin1': 16, 'lmargin2': 16},
+}
+
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+BULLET_RE = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+NUMBERED_RE = re.compile(r"^(\s*\d{1,9}[.)])\s+(.*)$")
+QUOTE_RE = re.compile(r"^>\s?(.*)$")
+# 行内的粗体和代码
+INLINE_RE = re.compile(r"\*\*(.+?)\*\*|__(.+?)__|`([^`]+)`")
+
+
+def inline_segments(text, tags):
+    """把一行中的粗体和行内代码拆成不同样式的片段，去掉标记符号
+
+    Args:
+        text: 一行文本（不含换行）
+        tags: 整行使用的样式元组
+
+    Returns:
+        (文本, 样式元组) 片段的列表
+    """
+    segments = []
+    position = 0
+    for match in INLINE_RE.finditer(text):
+        if match.start() > position:
+            segments.append((text[position:match.start()], tags))
+        if match.group(3) is not None:
+            segments.append((match.group(3), tags + ('md_inline_code',)))
+        else:
+            segments.append((match.group(1) or match.group(2), tags + ('md_bold',)))
+        position = match.end()
+    if position < len(text):
+        segments.append((text[position:], tags))
+    return segments
+
+
+class MarkdownStream:
+    """增量的Markdown解析器，把文本逐行转换成Text控件的样式片段
+
+    只有代码块是跨行的状态，其它元素都在一行之内，所以完整的行解析一次后就不会再变。
+    流式回复时只有最后一行（还没有收到换行的尾部）可能改变，每次只需要重新解析这一行，
+    开销只和新内容的长度有关，与回复已经有多长无关。
+    """
+
+    def __init__(self, base_tag):
+        """初始化解析器
+
+        Args:
+            base_tag: 消息内容的基本样式
+        """
+        self.base = (base_tag,)
+        # 是否在代码块之中
+        self.in_code = False
+        # 还没有换行的最后一行
+        self.tail = ""
+        # 还没有处理的新文本
+        self.pending = ""
+
+    def feed(self, text):
+        """加入新文本，在 update 时处理"""
+        self.pending += text
+
+    def update(self):
+        """处理新加入的文本
+
+        Returns:
+            (新完成的行的片段, 最后一行的片段)：前者只会产生一次，后者每次都会重新生成
+        """
+        text = self.tail + self.pending
+        self.pending = ""
+        lines = text.split("\n")
+        self.tail = lines.pop()
+        committed = []
+        for line in lines:
+            committed.extend(self.render_line(line, "\n"))
+        return committed, self.render_line(self.tail, "", commit=False)
+
+    def render_line(self, line, newline, commit=True):
+        """把一行转换成片段
+
+        Args:
+            line: 一行文本（不含换行）
+            newline: 行末的换行符，最后一行没有
+            commit: 是否更新代码块状态，最后一行还可能改变，不更新
+        """
+        base = self.base
+        if FENCE_RE.match(line):
+            if commit:
+                self.in_code = not self.in_code
+            return [(line + newline, base + ('md_fence',))]
+        if self.in_code:
+            return [(line + newline, base + ('md_code',))] if line or newline else []
+
+        match = HEADING_RE.match(line)
+        if match:
+            tags = base + (f"md_h{min(len(match.group(1)), 3)}",)
+            return inline_segments(match.group(2), tags) + [(newline, tags)]
+        match = BULLET_RE.match(line)
+        if match:
+            tags = base + ('md_list',)
+            return [(match.group(1) + "• ", tags)] + inline_segments(match.group(2), tags) + [(newline, tags)]
+        match = NUMBERED_RE.match(line)
+        if match:
+            tags = base + ('md_list',)
+            return [(match.group(1) + " ", tags)] + inline_segments(match.group(2), tags) + [(newline, tags)]
+        match = QUOTE_RE.match(line)
+        if match:
+            tags = base + ('md_quote',)
+            return inline_segments(match.group(1), tags) + [(newline, tags)]
+        return inline_segments(line, base) + [(newline, base)]
+
+
+def render_markdown(text, base_tag):
+    """一次性把完整的消息转换成片段
+
+    Args:
+        text: 消息内容
+        base_tag: 消息内容的基本样式
+
+    Returns:
+        (文本, 样式元组) 片段的列表，空文本的片段已去掉
+    """
+    stream = MarkdownStream(base_tag)
+    stream.feed(text)
+    committed, tail = stream.update()
+    return [segment for segment in committed + tail if segment[0]]
@@ -0,0 +1,75 @@
+# 导入必要的库
+import sys  # 导入sys模块用于驻留角色字符串
+import time  # 导入时间模块用于记录时间戳
+
+
+def intern_role(role):
+    """返回驻留的角色字符串，所有消息共用同一个 "user" 和 "assistant" 对象"""
+    return sys.intern(role)
+
+
+class Message:
+    """一条聊天消息
+
+    使用 __slots__，没有每个对象的字典，比 {"role": ..., "content": ...} 字典小得多；
+    角色字符串是驻留的，从数据库读取的大量消息不会各自保存一份 "user"。
+    """
+
+    __slots__ = ("role", "content", "created_at", "tokens")
+
+    def __init__(self, role, content, created_at=None, tokens=None):
+        """初始化消息
+
+        Args:
+            role: 消息角色（user 或 assistant）
+            content: 消息内容
+            created_at: 时间戳，默认为当前时间
+            tokens: token数量，未知时为None（第一次需要时计算并缓存）
+        """
+        self.role = intern_role(role)
+        self.content = content
+        self.created_at = created_at if created_at is not None else time.time()
+        self.tokens = tokens
+
+    def to_api(self):
+        """转换为接口使用的 {"role": ..., "content": ...} 格式"""
+        return {"role": self.role, "content": self.content}
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content[:20]!r})"
+
+
+class MessageLog:
+    """一个对话的聊天历史，只能追加
+
+    已经追加的消息不会被修改或删除，所以同一个对话的多个使用者（界面、回复调度器、
+    对话管理器的缓存）可以共用同一个对象，切换对话时不需要复制。
+    """
+
+    __slots__ = ("messages",)
+
+    def __init__(self, messages=None):
+        """初始化聊天历史
+
+        Args:
+            messages: 已有的Message列表，直接使用而不复制
+        """
+        self.messages = messages if messages is not None else []
+
+    def append(self, message):
+        """追加一条消息
+
+        Returns:
+            消息的下标
+        """
+        self.messages.append(message)
+        return len(self.messages) - 1
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
+
+    def __iter__(self):
+        return iter(self.messages)
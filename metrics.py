@@ -0,0 +1,238 @@
+# 导入必要的库
+import functools  # 导入functools用于包装被计时的函数
+import json  # 导入json模块用于导出JSON行
+import os  # 导入os模块用于处理路径和环境变量
+import threading  # 导入线程模块用于保护统计数据
+import time  # 导入时间模块用于计时
+from bisect import bisect_left  # 导入二分查找用于定位直方图的桶
+
+# 耗时类指标的桶上限（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 渲染速度的桶上限（片段/秒）
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# 指标名称 -> (说明, 桶上限)
+METRICS = {
+    "deepseek_handler_seconds": ("界面事件处理函数的耗时", LATENCY_BUCKETS),
+    "deepseek_event_loop_lag_seconds": ("Tk事件循环的延迟（心跳定时器实际触发时间与预定时间之差）", LATENCY_BUCKETS),
+    "deepseek_time_to_first_token_seconds": ("从开始请求到收到首个回复片段的时间", LATENCY_BUCKETS),
+    "deepseek_render_tokens_per_second": ("回复的渲染速度", THROUGHPUT_BUCKETS),
+}
+
+
+class Histogram:
+    """固定桶的直方图，记录次数、总和、最大值和每个桶的次数"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # 最后一个是超出所有桶上限的次数
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """记录一个值"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """按桶估计分位数，返回所在桶的上限（不超过最大值）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    """界面性能指标的收集和导出
+
+    只有开启时才会创建；没有开启时界面不包装任何函数，没有额外开销。
+    """
+
+    def __init__(self):
+        # (指标名称, 标签元组) -> Histogram
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        """记录一个指标的值
+
+        Args:
+            name: 指标名称，必须在 METRICS 中
+            value: 值
+            labels: 标签
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(METRICS[name][1])
+            histogram.observe(value)
+
+    def timed(self, func, handler):
+        """返回一个记录 func 耗时的包装函数
+
+        Args:
+            func: 被计时的函数
+            handler: 记录时使用的处理函数名称
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe("deepseek_handler_seconds", time.perf_counter() - start, handler=handler)
+        return wrapper
+
+    def instrument(self, obj, methods):
+        """为对象的方法计时，必须在方法被绑定为回调之前调用
+
+        Args:
+            obj: 对象
+            methods: 方法名 -> 处理函数名称
+        """
+        for attr, handler in methods.items():
+            setattr(obj, attr, self.timed(getattr(obj, attr), handler))
+
+    def observe_reply(self, meter):
+        """记录一次回复的首字延迟和渲染速度
+
+        Args:
+            meter: 回复的LatencyMeter
+        """
+        ttft = meter.time_to_first_token
+        if ttft is not None:
+            self.observe("deepseek_time_to_first_token_seconds", ttft)
+        tps = meter.tokens_per_second
+        if tps is not None:
+            self.observe("deepseek_render_tokens_per_second", tps)
+
+    def snapshot(self):
+        """复制当前的统计数据，导出时不长时间持有锁"""
+        with self.lock:
+            return sorted(
+                (key, list(h.counts), h.count, h.sum, h.max, h)
+                for key, h in self.histograms.items()
+            )
+
+    def to_prometheus(self):
+        """导出为Prometheus文本格式"""
+        lines = []
+        described = set()
+        for (name, labels), counts, count, total, _, histogram in self.snapshot():
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRICS[name][0]}")
+                lines.append(f"# TYPE {name} histogram")
+            label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{name}_sum{suffix} {total}")
+            lines.append(f"{name}_count{suffix} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self):
+        """导出为JSON行，每个指标一行，包含次数、平均值、分位数和最大值"""
+        now = time.time()
+        lines = []
+        for (name, labels), _, count, total, maximum, histogram in self.snapshot():
+            with self.lock:
+                p50, p95, p99 = (histogram.quantile(q) for q in (0.5, 0.95, 0.99))
+            lines.append(json.dumps({
+                "time": now,
+                "name": name,
+                "labels": dict(labels),
+                "count": count,
+                "mean": total / count if count else None,
+                "p50": p50,
+                "p95": p95,
+                "p99": p99,
+                "max": maximum
+            }, ensure_ascii=False))
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """导出到文件
+
+        扩展名为 .jsonl 或 .json 时追加一批JSON行（可以保留历史），
+        否则以Prometheus文本格式覆盖写入（适合node_exporter的textfile收集）。
+
+        Args:
+            path: 文件路径
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if path.endswith((".jsonl", ".json")):
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(self.to_json_lines())
+        else:
+            temp_path = path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(temp_path, path)
+
+
+class LagProbe:
+    """用心跳定时器测量Tk事件循环的延迟
+
+    每隔 interval_ms 安排一次定时器，定时器实际触发的时间比预定时间晚多少，
+    事件循环就被阻塞了多久。
+    """
+
+    def __init__(self, master, metrics, interval_ms=100):
+        """初始化探针
+
+        Args:
+            master: tkinter根窗口对象
+            metrics: Metrics对象
+            interval_ms: 心跳间隔（毫秒）
+        """
+        self.master = master
+        self.metrics = metrics
+        self.interval_ms = interval_ms
+        self.expected = None
+        self.job = None
+
+    def start(self):
+        """开始心跳"""
+        self.expected = time.perf_counter() + self.interval_ms / 1000
+        self.job = self.master.after(self.interval_ms, self.tick)
+
+    def tick(self):
+        """记录这次心跳的延迟并安排下一次"""
+        now = time.perf_counter()
+        self.metrics.observe("deepseek_event_loop_lag_seconds", max(0.0, now - self.expected))
+        self.expected = now + self.interval_ms / 1000
+        self.job = self.master.after(self.interval_ms, self.tick)
+
+    def stop(self):
+        """停止心跳"""
+        if self.job is not None:
+            self.master.after_cancel(self.job)
+            self.job = None
+
+
+def metrics_path_from_env():
+    """返回环境变量 DEEPSEEK_METRICS 设置的导出路径，没有设置时返回None（不开启指标）
+
+    DEEPSEEK_METRICS=1 时使用默认路径 ~/.deepseek_chat/metrics.prom。
+    """
+    value = os.environ.get("DEEPSEEK_METRICS")
+    if not value or value == "0":
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return os.path.join(os.path.expanduser("~"), ".deepseek_chat", "metrics.prom")
+    return value
@@ -0,0 +1,99 @@
+# 导入必要的库
+import time  # 导入时间模块用于计算分组的起始时间
+from bisect import bisect_left, insort  # 导入二分查找用于维护有序列表
+
+# 侧边栏的分组，按时间从近到远排列
+GROUPS = ("今天", "昨天", "7天内", "更早")
+
+
+def group_starts(now=None):
+    """返回各分组的起始时间戳（本地时间的零点），最后一组没有起始时间
+
+    Args:
+        now: 当前时间戳，默认为当前时间
+
+    Returns:
+        与 GROUPS 对应的列表，最后一项为None
+    """
+    year, month, day = time.localtime(now)[:3]
+    # mktime会把第0天、负数的日期换算到上个月
+    today = time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))
+    yesterday = time.mktime((year, month, day - 1, 0, 0, 0, 0, 0, -1))
+    week = time.mktime((year, month, day - 6, 0, 0, 0, 0, 0, -1))
+    return [today, yesterday, week, None]
+
+
+class RecencyIndex:
+    """按最近活动时间排列的对话索引，最近的在前
+
+    用二分查找维护有序列表：加入、删除和移动一个对话只需要 O(log n) 次比较，
+    按位置取对话和统计某个时间之后的对话数量也是 O(log n)，不需要重新排序整个列表。
+    """
+
+    def __init__(self):
+        # 按 (-时间戳, 对话ID) 升序排列，时间相同时顺序固定
+        self.keys = []
+        # 对话ID -> 时间戳
+        self.timestamps = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, conversation_id):
+        return conversation_id in self.timestamps
+
+    def __getitem__(self, position):
+        """返回某个位置的对话ID"""
+        return self.keys[position][1]
+
+    def add(self, conversation_id, timestamp):
+        """加入一个对话，已经存在时按新的时间戳移动
+
+        Returns:
+            对话的新位置
+        """
+        if conversation_id in self.timestamps:
+            self.remove(conversation_id)
+        self.timestamps[conversation_id] = timestamp
+        key = (-timestamp, conversation_id)
+        insort(self.keys, key)
+        return bisect_left(self.keys, key)
+
+    def remove(self, conversation_id):
+        """删除一个对话
+
+        Returns:
+            对话原来的位置，不存在时返回None
+        """
+        timestamp = self.timestamps.pop(conversation_id, None)
+        if timestamp is None:
+            return None
+        position = bisect_left(self.keys, (-timestamp, conversation_id))
+        del self.keys[position]
+        return position
+
+    def position(self, conversation_id):
+        """返回对话的位置，不存在时返回None"""
+        timestamp = self.timestamps.get(conversation_id)
+        if timestamp is None:
+            return None
+        return bisect_left(self.keys, (-timestamp, conversation_id))
+
+    def count_after(self, timestamp):
+        """返回最近活动时间晚于 timestamp 的对话数量，它们都排在最前面"""
+        return bisect_left(self.keys, (-timestamp, ""))
+
+    def groups(self, now=None):
+        """把对话分成 今天/昨天/7天内/更早 几组
+
+        Returns:
+            (分组名称, 第一个对话的位置, 最后一个对话之后的位置) 的列表，不包括空的分组
+        """
+        groups = []
+        start = 0
+        for name, boundary in zip(GROUPS, group_starts(now)):
+            end = len(self.keys) if boundary is None else self.count_after(boundary)
+            if end > start:
+                groups.append((name, start, end))
+            start = end
+        return groups
@@ -0,0 +1,302 @@
+# 导入必要的库
+import hashlib  # 导入hashlib用于计算缓存键
+import json  # 导入json模块用于序列化缓存键的内容
+import os  # 导入os模块用于处理路径和环境变量
+import sqlite3  # 导入sqlite3模块用于保存磁盘缓存
+import threading  # 导入线程模块用于保护缓存
+import time  # 导入时间模块用于过期判断和统计延迟
+import unicodedata  # 导入unicodedata用于统一全角半角等写法
+from collections import OrderedDict  # 导入有序字典用于实现LRU缓存
+from backend import ChatBackend  # 导入模型后端的基类
+
+
+def default_cache_path():
+    """返回默认的回复缓存路径，可用环境变量 DEEPSEEK_CACHE_PATH 修改"""
+    path = os.environ.get("DEEPSEEK_CACHE_PATH")
+    if path:
+        return path
+    return os.path.join(os.path.expanduser("~"), ".deepseek_chat", "responses.db")
+
+
+def normalize_text(text):
+    """统一文本的写法：全角转半角、合并空白、英文转小写"""
+    return " ".join(unicodedata.normalize("NFKC", text).split()).lower()
+
+
+def cache_key(model, system_prompt, history, context_messages=4):
+    """计算一次请求的缓存键
+
+    键由模型、系统提示词、最后一条用户消息之前的最近几条消息和用户消息组成，
+    文本先统一写法再计算哈希，空白、全角半角和大小写的差异不影响命中。
+
+    Args:
+        model: 模型名称
+        system_prompt: 系统提示词
+        history: 发送给模型的聊天历史，最后一条是用户消息
+        context_messages: 参与计算的之前的消息条数
+
+    Returns:
+        十六进制的哈希字符串
+    """
+    context = history[:-1][-context_messages:] if context_messages > 0 else []
+    payload = {
+        "model": model,
+        "system": normalize_text(system_prompt or ""),
+        "context": [[msg["role"], normalize_text(msg["content"])] for msg in context],
+        "message": normalize_text(history[-1]["content"]) if history else ""
+    }
+    data = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResponseCache:
+    """两级的回复缓存：内存中的LRU缓存和磁盘上的SQLite缓存
+
+    磁盘缓存的条目超过有效期后失效，总大小超过上限时删除最久没有使用的条目。
+    可以在多个后台线程中同时使用。
+    """
+
+    def __init__(self, path=None, memory_items=256, ttl=7 * 24 * 3600, max_bytes=50 * 1024 * 1024):
+        """打开（必要时创建）缓存
+
+        Args:
+            path: 磁盘缓存的路径，为None时使用默认路径，":memory:" 表示不写磁盘
+            memory_items: 内存中最多缓存的回复数量
+            ttl: 缓存的有效期（秒）
+            max_bytes: 磁盘缓存的总大小上限（字节）
+        """
+        self.path = path or default_cache_path()
+        self.memory_items = memory_items
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # 缓存键 -> (回复, 写入时间)，按最近使用的顺序排列
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        # 命中、未命中的次数和每次回复的总耗时（秒）
+        self.hits = 0
+        self.misses = 0
+        self.hit_latencies = []
+        self.miss_latencies = []
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # 在后台线程中使用，由self.lock保证同一时间只有一个线程访问
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    reply TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_by_use ON responses (used_at)")
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        """读取缓存的回复
+
+        Returns:
+            缓存的回复，没有或已经过期时返回None
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self.memory.move_to_end(key)
+                    return entry[0]
+                del self.memory[key]
+            row = self.connection.execute(
+                "SELECT reply, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            reply, created_at = row
+            if now - created_at > self.ttl:
+                self.delete_locked(key)
+                return None
+            with self.connection:
+                self.connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+            self.remember_locked(key, reply, created_at)
+            return reply
+
+    def put(self, key, reply):
+        """保存一条回复，必要时清理过期和超出大小上限的条目"""
+        now = time.time()
+        size = len(reply.encode('utf-8'))
+        with self.lock:
+            self.remember_locked(key, reply, now)
+            with self.connection:
+                old = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, reply, created_at, used_at, size) VALUES (?, ?, ?, ?, ?)",
+                    (key, reply, now, now, size)
+                )
+            self.total_bytes += size - (old[0] if old else 0)
+            self.evict_locked(now)
+
+    def remember_locked(self, key, reply, created_at):
+        """把回复放入内存缓存，超出数量上限时丢弃最久没有使用的"""
+        self.memory[key] = (reply, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def delete_locked(self, key):
+        """从两级缓存中删除一个条目"""
+        self.memory.pop(key, None)
+        with self.connection:
+            row = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= row[0]
+
+    def evict_locked(self, now):
+        """删除过期的条目；总大小仍然超出上限时，从最久没有使用的开始删除"""
+        with self.connection:
+            expired = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses WHERE created_at < ?", (now - self.ttl,)
+            ).fetchone()[0]
+            if expired:
+                self.connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+                self.total_bytes -= expired
+            while self.total_bytes > self.max_bytes:
+                rows = self.connection.execute(
+                    "SELECT key, size FROM responses ORDER BY used_at LIMIT 100"
+                ).fetchall()
+                if not rows:
+                    break
+                for key, size in rows:
+                    self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.memory.pop(key, None)
+                    self.total_bytes -= size
+                    if self.total_bytes <= self.max_bytes:
+                        break
+
+    def record(self, hit, latency):
+        """记录一次请求是否命中和回复的总耗时（秒）"""
+        with self.lock:
+            if hit:
+                self.hits += 1
+                self.hit_latencies.append(latency)
+            else:
+                self.misses += 1
+                self.miss_latencies.append(latency)
+
+    def stats(self):
+        """返回命中率和延迟的统计
+
+        Returns:
+            包含 hits、misses、hit_rate、hit_p50_ms、miss_p50_ms、disk_bytes 的字典
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else None,
+                "hit_p50_ms": median_ms(self.hit_latencies),
+                "miss_p50_ms": median_ms(self.miss_latencies),
+                "disk_bytes": self.total_bytes
+            }
+
+    def summary(self):
+        """生成一行便于阅读的统计"""
+        stats = self.stats()
+        rate = f"{stats['hit_rate'] * 100:.0f}%" if stats["hit_rate"] is not None else "-"
+        hit_ms = f"{stats['hit_p50_ms']:.0f} ms" if stats["hit_p50_ms"] is not None else "-"
+        miss_ms = f"{stats['miss_p50_ms']:.0f} ms" if stats["miss_p50_ms"] is not None else "-"
+        return f"回复缓存：命中 {stats['hits']} 次，未命中 {stats['misses']} 次（命中率 {rate}），" \
+               f"命中耗时 {hit_ms}，未命中耗时 {miss_ms}"
+
+    def close(self):
+        """关闭磁盘缓存"""
+        with self.lock:
+            self.connection.close()
+
+
+def median_ms(latencies):
+    """返回一组耗时（秒）的中位数（毫秒），没有数据时返回None"""
+    if not latencies:
+        return None
+    values = sorted(latencies)
+    return values[len(values) // 2] * 1000
+
+
+class CachedBackend(ChatBackend):
+    """为另一个后端加上回复缓存
+
+    命中时把缓存的回复分段返回，和模型的流式回复走同样的显示流程；
+    未命中时转发给原来的后端，完整收到回复后才写入缓存，中途取消或出错的回复不会被缓存；
+    固定回复的后端（cacheable 为False，例如没有配置接口时的繁忙提示）既不读取也不写入缓存。
+    """
+
+    # 命中时每段返回的字符数
+    CHUNK_SIZE = 16
+
+    def __init__(self, backend, cache, context_messages=4):
+        """初始化缓存后端
+
+        Args:
+            backend: 原来的模型后端
+            cache: ResponseCache对象
+            context_messages: 计算缓存键时使用的之前的消息条数
+        """
+        self.backend = backend
+        self.cache = cache
+        self.context_messages = context_messages
+
+    def key_for(self, history):
+        """计算聊天历史对应的缓存键"""
+        return cache_key(
+            getattr(self.backend, "model", type(self.backend).__name__),
+            getattr(self.backend, "system_prompt", None),
+            history,
+            self.context_messages
+        )
+
+    def stream_reply(self, history):
+        """命中缓存时直接返回缓存的回复，否则请求原来的后端"""
+        if not getattr(self.backend, "cacheable", True):
+            yield from self.backend.stream_reply(history)
+            return
+        start = time.perf_counter()
+        key = self.key_for(history)
+        reply = self.cache.get(key)
+        if reply is not None:
+            for i in range(0, len(reply), self.CHUNK_SIZE):
+                yield reply[i:i + self.CHUNK_SIZE]
+            self.cache.record(True, time.perf_counter() - start)
+            return
+
+        parts = []
+        for text in self.backend.stream_reply(history):
+            parts.append(text)
+            yield text
+        # 只有完整收到的回复才会执行到这里
+        reply = "".join(parts)
+        if reply:
+            self.cache.put(key, reply)
+        self.cache.record(False, time.perf_counter() - start)
+
+
+def wrap_backend_from_env(backend):
+    """按环境变量为后端加上回复缓存（默认关闭）
+
+    DEEPSEEK_RESPONSE_CACHE=1 开启缓存，DEEPSEEK_CACHE_PATH 设置磁盘缓存的路径，
+    DEEPSEEK_CACHE_TTL 设置有效期（秒，默认7天），DEEPSEEK_CACHE_MB 设置磁盘缓存的大小上限（默认50MB）。
+
+    Returns:
+        开启缓存时返回CachedBackend，否则返回原来的后端
+    """
+    if os.environ.get("DEEPSEEK_RESPONSE_CACHE", "").lower() not in ("1", "true", "yes"):
+        return backend
+    cache = ResponseCache(
+        ttl=float(os.environ.get("DEEPSEEK_CACHE_TTL", 7 * 24 * 3600)),
+        max_bytes=int(float(os.environ.get("DEEPSEEK_CACHE_MB", 50)) * 1024 * 1024)
+    )
+    return CachedBackend(backend, cache)
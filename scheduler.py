@@ -0,0 +1,214 @@
+# 导入必要的库
+from collections import deque  # 导入双端队列用于每个对话的请求队列
+from backend import StreamWorker  # 导入后台回复任务
+from context import ContextBuilder  # 导入按token预算组装聊天历史的组装器
+
+
+class ReplyRequest:
+    """一次发送：一条用户消息和它的回复
+
+    用户消息在轮到这个请求时才写入聊天历史，同一个对话中的消息和回复因此总是交替保存。
+    """
+
+    def __init__(self, session, message):
+        """初始化请求
+
+        Args:
+            session: 发送消息的对话（ChatSession）
+            message: 用户消息
+        """
+        self.session = session
+        self.conversation_id = session.conversation_id
+        self.message = message
+        # queued（排队中）、running（生成中）、done（完成）、cancelled（已取消）
+        self.state = "queued"
+        self.worker = None
+        # 已经收到的回复内容
+        self.text = ""
+        # 请求失败时的错误信息，失败的回复不保存
+        self.error = None
+        # 用户消息和回复在聊天历史中的下标，还没有写入时为None
+        self.user_index = None
+        self.reply_index = None
+
+    @property
+    def meter(self):
+        """回复的延迟统计，还没有开始时为None"""
+        return self.worker.meter if self.worker is not None else None
+
+    @property
+    def finished(self):
+        """请求是否已经结束"""
+        return self.state in ("done", "cancelled")
+
+
+class ReplyScheduler:
+    """按对话排队的回复调度器
+
+    每个对话同一时间只有一个回复在生成，后面的发送在这个对话的队列中等待；
+    所有对话同时生成的回复不超过 max_concurrent 个，其余的按发送顺序排队。
+    每个请求都记着自己的对话，切换或删除对话不会让回复写到别的对话中。
+    不依赖界面：界面（或批处理）定期调用 poll 取出事件并显示。
+
+    poll 返回的事件为 (事件名称, 请求, 数据)：
+        started：开始生成，用户消息已经写入聊天历史
+        token：收到一段回复，数据为文本
+        error：请求失败，数据为错误信息
+        done：回复完成并已保存；请求失败时不保存（reply_index 为None），界面只显示繁忙提示
+        cancelled：请求被取消（已经收到的内容按需要保存）
+    """
+
+    def __init__(self, manager, backend, max_concurrent=4, context=None, worker_factory=None):
+        """初始化调度器
+
+        Args:
+            manager: 对话管理器（ConversationManager）
+            backend: 模型后端
+            max_concurrent: 最多同时生成的回复数量
+            context: 组装发送给模型的聊天历史的ContextBuilder，默认使用默认预算
+            worker_factory: 用聊天历史创建回复任务的函数，默认在本进程的线程中运行 backend
+                （见StreamWorker）；模型调用在工作进程中时使用 WorkerClient.stream_worker
+        """
+        self.manager = manager
+        self.backend = backend
+        self.max_concurrent = max_concurrent
+        self.context = context or ContextBuilder()
+        self.worker_factory = worker_factory or (lambda history: StreamWorker(backend, history))
+        # 对话ID -> 这个对话还没有结束的请求，队首可能正在生成
+        self.queues = {}
+        # 队首在排队、等待空闲名额的对话ID，按发送顺序排列
+        self.waiting = deque()
+        # 正在生成的请求
+        self.running = []
+        # 还没有被 poll 取走的事件
+        self.events = []
+        # 删除对话时取消它的所有请求
+        manager.subscribe(self.on_manager_event)
+
+    @property
+    def busy(self):
+        """是否还有没结束的请求或没取走的事件"""
+        return bool(self.queues or self.events)
+
+    def on_manager_event(self, event, *args):
+        """对话被删除时丢弃它的请求"""
+        if event == "conversation_deleted":
+            self.cancel_conversation(args[0], keep=False)
+
+    def requests_for(self, conversation_id):
+        """返回一个对话中还没有结束的请求，按发送顺序排列"""
+        return list(self.queues.get(conversation_id, ()))
+
+    def submit(self, session, message):
+        """发送一条消息，有空闲名额且这个对话没有正在生成的回复时立即开始
+
+        Args:
+            session: 发送消息的对话
+            message: 用户消息
+
+        Returns:
+            ReplyRequest对象
+        """
+        request = ReplyRequest(session, message)
+        queue = self.queues.get(request.conversation_id)
+        if queue is None:
+            queue = self.queues[request.conversation_id] = deque()
+            self.waiting.append(request.conversation_id)
+            self.manager.hold(session)
+        queue.append(request)
+        self.pump()
+        return request
+
+    def pump(self):
+        """在名额允许时启动排队的请求"""
+        while self.waiting and len(self.running) < self.max_concurrent:
+            self.start(self.queues[self.waiting.popleft()][0])
+
+    def start(self, request):
+        """开始生成一个请求的回复"""
+        session = request.session
+        request.user_index = self.manager.append_message("user", request.message, session)
+        request.state = "running"
+        # 只发送预算内的最近消息，长对话不会超出模型的上下文长度
+        request.worker = self.worker_factory(self.context.build(session))
+        request.worker.start()
+        self.running.append(request)
+        self.events.append(("started", request, None))
+
+    def poll(self):
+        """取出所有正在生成的回复的新片段，不会阻塞
+
+        Returns:
+            (事件名称, 请求, 数据) 的列表
+        """
+        for request in list(self.running):
+            for kind, data in request.worker.drain():
+                if kind == "token":
+                    request.text += data
+                    request.meter.record(data)
+                    self.events.append(("token", request, data))
+                elif kind == "error":
+                    request.error = data
+                    self.events.append(("error", request, data))
+                elif kind == "done":
+                    # 失败的回复不写入聊天历史：不会在之后的轮次中发给模型，也不会被搜索到
+                    if request.error is None:
+                        request.reply_index = self.manager.append_message("assistant", request.text, request.session)
+                    self.finish(request, "done")
+        events, self.events = self.events, []
+        return events
+
+    def finish(self, request, state, pump=True):
+        """结束一个请求，并启动这个对话或其它对话中排队的请求
+
+        Args:
+            request: 结束的请求
+            state: 结束时的状态（done 或 cancelled）
+            pump: 是否立即启动排队的请求
+        """
+        request.state = state
+        if request in self.running:
+            self.running.remove(request)
+        queue = self.queues.get(request.conversation_id)
+        if queue is not None and request in queue:
+            was_head = queue[0] is request
+            queue.remove(request)
+            if not queue:
+                del self.queues[request.conversation_id]
+                if request.conversation_id in self.waiting:
+                    self.waiting.remove(request.conversation_id)
+                self.manager.release(request.session)
+            elif was_head and request.conversation_id not in self.waiting:
+                self.waiting.append(request.conversation_id)
+        self.events.append((state, request, None))
+        if pump:
+            self.pump()
+
+    def cancel(self, request, keep=True, pump=True):
+        """取消一个请求
+
+        Args:
+            request: 要取消的请求
+            keep: 是否保存已经发送的用户消息和收到的部分回复（停止按钮）；
+                删除对话时为False
+            pump: 是否立即启动排队的请求
+        """
+        if request.finished:
+            return
+        if request.state == "running":
+            request.worker.cancel()
+            if keep and request.text and request.error is None:
+                request.reply_index = self.manager.append_message("assistant", request.text, request.session)
+        elif keep:
+            # 排队中的消息已经显示出来了，保存它但不再请求回复
+            request.user_index = self.manager.append_message("user", request.message, request.session)
+        self.finish(request, "cancelled", pump)
+
+    def cancel_conversation(self, conversation_id, keep=True):
+        """按发送顺序取消一个对话中所有还没有结束的请求
+
+        全部取消之后才启动其它对话排队的请求，这个对话排队的请求不会在中途被启动。
+        """
+        for request in self.requests_for(conversation_id):
+            self.cancel(request, keep, pump=False)
+        self.pump()
@@ -0,0 +1,269 @@
+# 导入必要的库
+import heapq  # 导入heapq用于合并多个倒排列表
+import math  # 导入数学模块用于计算词的权重
+import re  # 导入正则表达式模块用于分词
+import threading  # 导入线程模块用于保护索引
+from array import array  # 导入array用于紧凑地保存倒排列表
+from bisect import bisect_left  # 导入二分查找用于判断消息是否在倒排列表中
+
+# 中日韩文字的范围，这些文字按相邻两个字切分
+CJK_PATTERN = r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]'
+TOKEN_RE = re.compile(rf'({CJK_PATTERN}+)|([0-9a-z]+)')
+CJK_RE = re.compile(CJK_PATTERN)
+
+
+def tokenize(text):
+    """把文本切分成索引用的词
+
+    中文等连续的中日韩文字切成相邻两个字的组合（bigram），只有一个字时保留单字；
+    英文和数字按单词切分，统一转成小写。
+
+    Args:
+        text: 要切分的文本
+
+    Returns:
+        词的列表（可能有重复）
+    """
+    tokens = []
+    for cjk, word in TOKEN_RE.findall(text.lower()):
+        if word:
+            tokens.append(word)
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return tokens
+
+
+def make_snippet(content, query, width=40):
+    """截取消息中与搜索内容相关的一段文字
+
+    Args:
+        content: 消息内容
+        query: 搜索内容
+        width: 摘要的最大长度
+
+    Returns:
+        摘要文本，截断处用"..."表示
+    """
+    text = " ".join(content.split())
+    lowered = text.lower()
+    # 优先定位整个搜索内容，找不到时定位第一个命中的词
+    position = lowered.find(query.strip().lower())
+    if position < 0:
+        positions = [lowered.find(token) for token in tokenize(query)]
+        positions = [p for p in positions if p >= 0]
+        position = min(positions) if positions else 0
+    start = max(0, position - width // 4)
+    end = start + width
+    snippet = text[start:end]
+    if start > 0:
+        snippet = "..." + snippet
+    if end < len(text):
+        snippet += "..."
+    return snippet
+
+
+class SearchIndex:
+    """增量更新的倒排索引
+
+    每个词对应一个按消息ID升序排列的数组。消息ID使用存储中的自增ID，
+    新消息的ID总是更大，所以追加消息只需要在数组末尾追加，查询时可以用二分查找求交集。
+    """
+
+    # 部分命中时，最多扫描的倒排列表长度，过于常见的词不参与部分命中的打分
+    PARTIAL_SCAN_LIMIT = 50000
+
+    def __init__(self):
+        # 词 -> 消息ID数组
+        self.postings = {}
+        # 单个汉字 -> 包含它的bigram，用于搜索单个汉字
+        self.char_tokens = {}
+        # 已经索引的消息数量
+        self.document_count = 0
+        # 索引中最大的消息ID
+        self.last_id = 0
+        # 正在建立索引时新追加的消息，建立完成后再加入；第一次建立之前也是如此，
+        # 否则先加入的新消息会让 last_id 跳过还没有建立索引的已保存消息
+        self.building = True
+        self.backlog = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.document_count
+
+    def add(self, message_id, text):
+        """把一条消息加入索引，第一次 build 完成之前先暂存
+
+        Args:
+            message_id: 消息ID，必须大于已经索引的所有消息ID
+            text: 消息内容
+        """
+        with self.lock:
+            if self.building:
+                self.backlog.append((message_id, text))
+                return
+            self.add_locked(message_id, text)
+
+    def add_locked(self, message_id, text):
+        """在已经持有锁的情况下加入一条消息"""
+        if message_id <= self.last_id:
+            return
+        for token in set(tokenize(text)):
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = array('Q')
+                if len(token) == 2 and CJK_RE.match(token):
+                    self.char_tokens.setdefault(token[0], set()).add(token)
+                    self.char_tokens.setdefault(token[1], set()).add(token)
+            posting.append(message_id)
+        self.last_id = message_id
+        self.document_count += 1
+
+    def build(self, rows, batch_size=5000):
+        """从已保存的消息建立索引，可以在后台线程中调用
+
+        建立期间通过 add 追加的消息会先暂存，建立完成后按顺序加入；
+        每批消息之间会释放锁，建立期间的搜索返回已经索引的部分。
+
+        Args:
+            rows: 按消息ID升序排列的 (消息ID, 消息内容) 可迭代对象
+            batch_size: 每次持有锁时加入的消息数量
+        """
+        with self.lock:
+            self.building = True
+        try:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    with self.lock:
+                        for message_id, text in batch:
+                            self.add_locked(message_id, text)
+                    batch = []
+            with self.lock:
+                for message_id, text in batch:
+                    self.add_locked(message_id, text)
+        finally:
+            with self.lock:
+                self.building = False
+                for message_id, text in sorted(self.backlog):
+                    self.add_locked(message_id, text)
+                self.backlog = []
+
+    def build_in_background(self, rows):
+        """在后台线程中建立索引
+
+        调用后立即进入建立状态，之后追加的消息都会暂存，不会和已保存的消息顺序错乱。
+
+        Args:
+            rows: 按消息ID升序排列的 (消息ID, 消息内容) 可迭代对象，在后台线程中读取
+
+        Returns:
+            后台线程对象
+        """
+        with self.lock:
+            self.building = True
+        thread = threading.Thread(target=self.build, args=(rows,), daemon=True)
+        thread.start()
+        return thread
+
+    def idf(self, group):
+        """计算一个词的权重，越少见的词权重越高"""
+        return math.log(1 + self.document_count / (1 + group_size(group)))
+
+    def query_groups(self, query):
+        """把搜索内容转换成若干组倒排列表
+
+        每一组对应一个必须命中的词，命中组内任意一个倒排列表即算命中。
+        普通的词每组只有一个倒排列表；单个汉字的组包含所有含有这个字的bigram。
+        """
+        tokens = set(tokenize(query))
+        single_chars = {token for token in tokens if len(token) == 1 and CJK_RE.match(token)}
+        # 有其它词时忽略被标点隔开的单个汉字，它们区分度低，展开后代价又很高
+        if single_chars and len(single_chars) < len(tokens):
+            tokens -= single_chars
+            single_chars = set()
+
+        groups = []
+        for token in tokens:
+            group = [self.postings[token]] if token in self.postings else []
+            if token in single_chars:
+                group.extend(self.postings[bigram] for bigram in self.char_tokens.get(token, ()))
+            groups.append(group)
+        return groups
+
+    def search_async(self, query, limit, callback):
+        """和 search 相同，结果通过 callback 返回，接口与工作进程中的索引一致"""
+        callback(self.search(query, limit))
+
+    def search(self, query, limit=20):
+        """搜索消息
+
+        所有词都命中的消息排在前面（同样命中时较新的消息在前），
+        不足 limit 条时再按命中词的权重补充部分命中的消息。
+
+        Args:
+            query: 搜索内容
+            limit: 最多返回的结果数量
+
+        Returns:
+            按相关程度排列的 (消息ID, 分数) 列表
+        """
+        with self.lock:
+            groups = sorted(self.query_groups(query), key=group_size)
+            if not groups:
+                return []
+            weights = [self.idf(group) for group in groups]
+            full_score = sum(weights)
+
+            # 从最短的一组开始，从新到旧检查其它词是否也命中
+            results = []
+            found = set()
+            for message_id in newest_first(groups[0]):
+                if all(group_contains(group, message_id) for group in groups[1:]):
+                    results.append((message_id, full_score))
+                    found.add(message_id)
+                    if len(results) >= limit:
+                        return results
+
+            # 部分命中：按命中词的权重累加
+            if len(groups) > 1:
+                scores = {}
+                for group, weight in zip(groups, weights):
+                    if group_size(group) > self.PARTIAL_SCAN_LIMIT:
+                        continue
+                    for message_id in set().union(*group):
+                        if message_id not in found:
+                            scores[message_id] = scores.get(message_id, 0.0) + weight
+                partial = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+                results.extend(partial[:limit - len(results)])
+            return results
+
+
+def group_size(group):
+    """一组倒排列表的总长度"""
+    return sum(len(posting) for posting in group)
+
+
+def group_contains(group, message_id):
+    """判断消息是否命中一组倒排列表中的任意一个"""
+    return any(contains(posting, message_id) for posting in group)
+
+
+def newest_first(group):
+    """按消息ID从大到小遍历一组倒排列表，重复的ID只返回一次"""
+    if len(group) == 1:
+        yield from reversed(group[0])
+        return
+    previous = None
+    for message_id in heapq.merge(*(reversed(posting) for posting in group), reverse=True):
+        if message_id != previous:
+            yield message_id
+            previous = message_id
+
+
+def contains(posting, message_id):
+    """用二分查找判断消息ID是否在升序的倒排列表中"""
+    position = bisect_left(posting, message_id)
+    return position < len(posting) and posting[position] == message_id
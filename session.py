@@ -0,0 +1,340 @@
+# 导入必要的库
+import time  # 导入时间模块用于记录时间戳
+import uuid  # 导入uuid模块用于生成唯一ID
+from search_index import make_snippet  # 导入搜索摘要生成函数
+from context import message_tokens  # 导入消息token数量的计算
+from collections import OrderedDict  # 导入有序字典用于缓存最近打开的聊天历史
+from messages import Message, MessageLog  # 导入紧凑的消息类型和只能追加的聊天历史
+
+# 新对话的默认标题
+DEFAULT_TITLE = "新对话"
+# 标题最多保留的字符数
+TITLE_LENGTH = 20
+# 缓存最近打开的对话的聊天历史的数量，再次打开时直接共用，不需要重新读取
+LOG_CACHE_SIZE = 16
+
+
+def make_title(message):
+    """用消息内容生成对话标题，截取前20个字符
+
+    Args:
+        message: 第一条用户消息
+    """
+    return message[:TITLE_LENGTH] + ("..." if len(message) > TITLE_LENGTH else "")
+
+
+class ChatSession:
+    """一个对话的状态：ID、标题和聊天历史"""
+
+    def __init__(self, conversation_id=None, title=DEFAULT_TITLE, history=None):
+        """初始化对话
+
+        Args:
+            conversation_id: 对话ID，为None时生成新的ID
+            title: 对话标题
+            history: 聊天历史（MessageLog），直接共用而不复制
+        """
+        self.conversation_id = conversation_id or str(uuid.uuid4())
+        self.title = title
+        self.history = history if history is not None else MessageLog()
+        # 较早消息的摘要缓存：(窗口起点, 摘要文本)，由ContextBuilder维护
+        self.summary = None
+
+    def derive_title(self):
+        """使用第一条用户消息生成标题，没有用户消息时使用默认标题"""
+        for msg in self.history:
+            if msg.role == "user":
+                return make_title(msg.content)
+        return DEFAULT_TITLE
+
+
+class ConversationManager:
+    """不依赖界面的对话管理器
+
+    负责当前对话、已保存对话的列表、持久化和搜索索引。界面通过调用它的方法来操作对话，
+    并通过 subscribe 注册的回调接收事件来更新显示，因此没有Tk窗口也可以运行、批处理和做性能测试。
+
+    事件名称和参数：
+        conversation_saved(conversation_id, title, timestamp)：对话加入已保存列表（侧边栏），
+            timestamp 为最近活动的时间
+        conversation_touched(conversation_id, timestamp)：已保存的对话被打开或收到新消息
+        conversation_renamed(conversation_id, title)：对话标题改变
+        conversation_deleted(conversation_id)：对话被删除
+        conversation_started(session)：开始了一个新对话
+        conversation_opened(session)：打开了一个已保存的对话
+        save_state_changed(saving, failed)：保存状态改变，saving 为是否有消息还没有被存储确认保存，
+            failed 为这次运行中没能保存的消息数量
+    """
+
+    def __init__(self, store, search_index=None):
+        """初始化管理器
+
+        Args:
+            store: 对话存储（ConversationStore）
+            search_index: 搜索索引（SearchIndex），为None时不建立索引
+        """
+        self.store = store
+        self.search_index = search_index
+        # 已保存的对话：对话ID -> {"title": ..., "timestamp": 最近活动的时间}，不包含消息内容
+        self.saved_conversations = {}
+        self.current = ChatSession()
+        self.listeners = []
+        # 已经交给存储、还没有确认保存的消息数量，以及没能保存的消息数量
+        self.unsaved = 0
+        self.failed_saves = 0
+        # 还有未完成的回复请求的对话：对话ID -> [对话, 引用次数]，重新打开时复用同一个对象
+        self.live_sessions = {}
+        # 最近打开的对话的聊天历史：对话ID -> MessageLog，按最近使用的顺序排列
+        self.logs = OrderedDict()
+
+    def subscribe(self, listener):
+        """注册事件回调，回调的参数为事件名称和事件参数"""
+        self.listeners.append(listener)
+
+    def emit(self, event, *args):
+        """通知所有回调"""
+        for listener in self.listeners:
+            listener(event, *args)
+
+    def load_saved(self):
+        """从存储中读取对话列表，只读取标题和时间戳，不读取消息内容
+
+        按从新到旧的顺序通知，侧边栏的有序索引每次都加在末尾，不需要移动已有的对话。
+        """
+        for conversation_id, title, timestamp in reversed(self.store.list_conversations()):
+            self.saved_conversations[conversation_id] = {
+                "title": title,
+                "timestamp": timestamp
+            }
+            self.emit("conversation_saved", conversation_id, title, timestamp)
+
+    def build_search_index(self):
+        """在后台线程中为已保存的消息建立搜索索引"""
+        if self.search_index is not None:
+            self.search_index.build_in_background(self.store.iter_messages(self.store.last_message_id()))
+
+    def hold(self, session):
+        """在回复完成前保留对话对象，期间打开这个对话时使用同一个对象，回复不会写到旧的副本中"""
+        entry = self.live_sessions.setdefault(session.conversation_id, [session, 0])
+        entry[1] += 1
+
+    def release(self, session):
+        """回复完成后释放 hold 保留的对话对象"""
+        entry = self.live_sessions.get(session.conversation_id)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.live_sessions[session.conversation_id]
+
+    def save_current(self):
+        """把有消息的当前对话加入已保存列表"""
+        self.save(self.current)
+
+    def save(self, session):
+        """把有消息的对话加入已保存列表"""
+        if len(session.history) > 0 and session.conversation_id not in self.saved_conversations:
+            timestamp = session.history[len(session.history) - 1].created_at
+            self.saved_conversations[session.conversation_id] = {
+                "title": session.title,
+                "timestamp": timestamp
+            }
+            self.emit("conversation_saved", session.conversation_id, session.title, timestamp)
+
+    def touch(self, conversation_id, timestamp=None):
+        """记录已保存对话的最近活动时间，侧边栏按这个时间排列
+
+        Args:
+            conversation_id: 对话ID
+            timestamp: 活动的时间戳，默认为当前时间
+        """
+        conversation = self.saved_conversations.get(conversation_id)
+        if conversation is None:
+            return
+        conversation["timestamp"] = timestamp = timestamp or time.time()
+        self.emit("conversation_touched", conversation_id, timestamp)
+
+    def new_conversation(self):
+        """保存当前对话并开始一个新对话"""
+        self.save_current()
+        self.current = ChatSession()
+        self.emit("conversation_started", self.current)
+        return self.current
+
+    def open_conversation(self, conversation_id, messages=None):
+        """保存当前对话并打开一个已保存的对话，消息内容在这时才从存储中读取
+
+        Args:
+            conversation_id: 对话ID
+            messages: 已经在后台读取好的Message列表，为None时从存储中读取
+
+        Returns:
+            打开的对话，对话不存在时返回None
+        """
+        self.save_current()
+        conversation = self.saved_conversations.get(conversation_id)
+        if not conversation:
+            return None
+        if conversation_id in self.live_sessions:
+            self.current = self.live_sessions[conversation_id][0]
+        else:
+            self.current = ChatSession(conversation_id, conversation["title"], self.log_for(conversation_id, messages))
+        # 打开也算一次活动，对话移到侧边栏最前面
+        self.touch(conversation_id)
+        self.store.touch_conversation(conversation_id, conversation["timestamp"])
+        self.emit("conversation_opened", self.current)
+        return self.current
+
+    def needs_loading(self, conversation_id):
+        """打开对话时是否需要从存储中读取消息（没有在进行中的回复，也不在缓存中）"""
+        return conversation_id not in self.live_sessions and conversation_id not in self.logs
+
+    def log_for(self, conversation_id, messages=None):
+        """返回对话的聊天历史，最近打开过的直接共用，否则使用 messages 或从存储中读取"""
+        log = self.logs.get(conversation_id)
+        if log is None:
+            if messages is None:
+                messages = self.store.load_messages(conversation_id)
+            log = self.logs[conversation_id] = MessageLog(messages)
+            while len(self.logs) > LOG_CACHE_SIZE:
+                self.logs.popitem(last=False)
+        else:
+            self.logs.move_to_end(conversation_id)
+        return log
+
+    def append_message(self, role, content, session=None):
+        """向对话追加一条消息，交给存储写入并加入搜索索引
+
+        后台写入的存储（日志或工作进程）返回时消息可能还没有保存，存储确认之后才算保存，
+        见 save_state_changed 事件。
+
+        Args:
+            role: 消息角色（user 或 assistant）
+            content: 消息内容
+            session: 目标对话，默认为当前对话
+
+        Returns:
+            消息在聊天历史中的下标
+        """
+        session = session or self.current
+        message = Message(role, content)
+        # 追加时计算token数量并缓存，组装上下文时不需要再计算
+        tokens = message_tokens(message)
+        index = session.history.append(message)
+        # 第一条用户消息决定标题，并在存储中创建这个对话
+        if len(session.history) == 1:
+            if role == "user":
+                session.title = make_title(content)
+            self.store.create_conversation(session.conversation_id, session.title)
+        self.unsaved += 1
+        if self.unsaved == 1:
+            self.emit("save_state_changed", True, self.failed_saves)
+        try:
+            message_id = self.store.append_message(
+                session.conversation_id, message.role, content, tokens, message.created_at, self.message_saved
+            )
+        except Exception:
+            self.message_saved(False)
+            raise
+        # 写入在后台进行时（日志或工作进程）还没有消息ID，由存储写入后再加入索引
+        if self.search_index is not None and message_id is not None:
+            self.search_index.add(message_id, content)
+        # 存储在追加消息时已经更新了对话的时间戳，这里只更新内存中的
+        self.touch(session.conversation_id, message.created_at)
+        # 不在显示中的对话（例如切换走以后才收到回复）直接加入已保存列表
+        if session is not self.current:
+            self.save(session)
+        return index
+
+    def message_saved(self, saved):
+        """存储处理完了一条消息
+
+        Args:
+            saved: 是否保存成功，失败的消息只留在这次运行的内存中
+        """
+        self.unsaved -= 1
+        if not saved:
+            self.failed_saves += 1
+        if self.unsaved == 0 or not saved:
+            self.emit("save_state_changed", self.unsaved > 0, self.failed_saves)
+
+    def get_title(self, conversation_id):
+        """返回对话标题，对话不存在时返回None"""
+        if conversation_id == self.current.conversation_id:
+            return self.current.title
+        conversation = self.saved_conversations.get(conversation_id)
+        return conversation["title"] if conversation else None
+
+    def rename_conversation(self, conversation_id, title):
+        """修改对话标题
+
+        Args:
+            conversation_id: 对话ID
+            title: 新标题
+        """
+        if conversation_id in self.saved_conversations:
+            self.saved_conversations[conversation_id]["title"] = title
+        if conversation_id == self.current.conversation_id:
+            self.current.title = title
+        if conversation_id in self.live_sessions:
+            self.live_sessions[conversation_id][0].title = title
+        self.store.rename_conversation(conversation_id, title)
+        self.emit("conversation_renamed", conversation_id, title)
+
+    def delete_conversation(self, conversation_id):
+        """删除对话，删除的是当前对话时开始一个新对话（不再保存已删除的对话）"""
+        self.saved_conversations.pop(conversation_id, None)
+        self.logs.pop(conversation_id, None)
+        self.store.delete_conversation(conversation_id)
+        self.emit("conversation_deleted", conversation_id)
+        if conversation_id == self.current.conversation_id:
+            self.current.history = MessageLog()
+            self.new_conversation()
+
+    def search(self, query, limit=20):
+        """搜索所有对话中的消息
+
+        Args:
+            query: 搜索内容
+            limit: 最多返回的结果数量
+
+        Returns:
+            (对话ID, 对话标题, 摘要) 的列表
+        """
+        if self.search_index is None or not query.strip():
+            return []
+        # 多取一些结果，已经删除的消息会被去掉
+        return self.search_results(query, self.search_index.search(query, limit=limit * 2), limit)
+
+    def search_async(self, query, callback, limit=20):
+        """搜索所有对话中的消息，结果通过 callback 返回
+
+        搜索索引在工作进程中时不等待结果，结果到达后才调用 callback。
+
+        Args:
+            query: 搜索内容
+            callback: 接收 (对话ID, 对话标题, 摘要) 列表的函数
+            limit: 最多返回的结果数量
+        """
+        if self.search_index is None or not query.strip():
+            callback([])
+            return
+        self.search_index.search_async(
+            query, limit * 2, lambda hits: callback(self.search_results(query, hits, limit))
+        )
+
+    def search_results(self, query, hits, limit):
+        """把搜索索引返回的消息转换成搜索结果，去掉已经删除的消息和对话"""
+        messages = self.store.get_messages(message_id for message_id, score in hits)
+        results = []
+        for message_id, score in hits:
+            row = messages.get(message_id)
+            if row is None:
+                continue
+            conversation_id, role, content = row
+            title = self.get_title(conversation_id)
+            if title is None:
+                continue
+            results.append((conversation_id, title, make_snippet(content, query)))
+            if len(results) >= limit:
+                break
+        return results
@@ -0,0 +1,198 @@
+# 导入必要的库
+from tkinter import Label  # 导入标签控件用于显示对话行
+from layout import LayoutScheduler  # 导入合并布局更新的调度器
+from recency import RecencyIndex  # 导入按最近活动时间排列的对话索引
+
+
+class VirtualHistoryList:
+    """虚拟化的历史对话列表
+
+    所有对话只以数据的形式保存，画布上只创建可见行数量的标签控件，
+    滚动时重复使用这些控件并修改文字和位置，因此对话再多，滚动和重绘的开销也只和可见行数有关。
+    对话按最近活动时间排列，分成 今天/昨天/7天内/更早 几组，每组前面有一行分组标题。
+    对话有新的活动时只在有序索引中移动一行，不需要重建整个列表。
+    """
+
+    # 每一行的高度（像素）
+    ROW_HEIGHT = 40
+    # 行的左右留白（像素）
+    ROW_MARGIN = 10
+    # 对话行和分组标题行的样式
+    ROW_STYLE = {'font': ('Segoe UI', 11), 'fg': '#D1D5DB', 'cursor': 'hand2'}
+    HEADER_STYLE = {'font': ('Segoe UI', 9, 'bold'), 'fg': '#9CA3AF', 'cursor': ''}
+
+    def __init__(self, canvas, scrollbar, on_select, on_menu, layout=None):
+        """初始化列表
+
+        Args:
+            canvas: 显示列表的画布
+            scrollbar: 画布的滚动条
+            on_select: 点击某一行时调用，参数为对话ID
+            on_menu: 右键某一行时调用，参数为鼠标事件和对话ID
+            layout: 窗口共用的布局调度器（LayoutScheduler），为None时单独创建
+        """
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.on_select = on_select
+        self.on_menu = on_menu
+        # 按最近活动时间排列的对话
+        self.order = RecencyIndex()
+        # 对话ID -> 标题
+        self.titles = {}
+        # 可重复使用的标签控件，以及它们在画布上的窗口项
+        self.pool = []
+        # 增删对话和画布大小改变时只标记需要刷新，空闲时和窗口的其它布局一起刷新一次
+        self.layout = layout or LayoutScheduler(canvas)
+        self.layout.add("sidebar", lambda: self.refresh())
+
+        # 滚动条和画布的视图都经过这里，滚动后重新分配可见行
+        self.scrollbar.configure(command=self.yview)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.bind('<Configure>', lambda e: self.schedule_refresh())
+        self.bind_mousewheel(self.canvas)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, conversation_id):
+        return conversation_id in self.order
+
+    def add(self, conversation_id, title, timestamp):
+        """添加一个对话，按最近活动时间放到对应的位置
+
+        Args:
+            conversation_id: 对话ID
+            title: 对话标题
+            timestamp: 最近活动的时间戳
+        """
+        if conversation_id in self.order:
+            self.rename(conversation_id, title)
+            self.move(conversation_id, timestamp)
+            return
+        self.order.add(conversation_id, timestamp)
+        self.titles[conversation_id] = title
+        self.schedule_refresh()
+
+    def move(self, conversation_id, timestamp):
+        """对话有了新的活动（打开或收到新消息），按新的时间移动这一行"""
+        if conversation_id not in self.order:
+            return
+        self.order.add(conversation_id, timestamp)
+        self.schedule_refresh()
+
+    def rename(self, conversation_id, title):
+        """修改对话标题，只有该行可见时才需要更新控件"""
+        if conversation_id not in self.order:
+            return
+        self.titles[conversation_id] = title
+        for label, item in self.pool:
+            if label.conversation_id == conversation_id:
+                label.config(text=title)
+                break
+
+    def remove(self, conversation_id):
+        """从列表中删除一个对话"""
+        if self.order.remove(conversation_id) is None:
+            return
+        del self.titles[conversation_id]
+        self.schedule_refresh()
+
+    def yview(self, *args):
+        """滚动条回调，滚动画布后刷新可见行"""
+        self.canvas.yview(*args)
+        self.refresh()
+
+    def bind_mousewheel(self, widget):
+        """让鼠标滚轮可以滚动列表"""
+        widget.bind('<MouseWheel>', lambda e: self.yview('scroll', -1 if e.delta > 0 else 1, 'units'))
+        widget.bind('<Button-4>', lambda e: self.yview('scroll', -1, 'units'))
+        widget.bind('<Button-5>', lambda e: self.yview('scroll', 1, 'units'))
+
+    def schedule_refresh(self):
+        """在空闲时刷新，连续的多次修改只刷新一次"""
+        self.layout.invalidate("sidebar")
+
+    def refresh(self):
+        """重新计算滚动区域，并把控件分配给当前可见的行"""
+        # 已经立即刷新了，空闲时不需要再刷新
+        self.layout.discard("sidebar")
+
+        width = max(self.canvas.winfo_width(), 1)
+        height = max(self.canvas.winfo_height(), 1)
+        # 每个分组占一行标题加上它的对话行；分组的边界用二分查找得到
+        groups = self.order.groups()
+        total_rows = len(self.order) + len(groups)
+        # 滚动区域直接由行数计算，不需要bbox("all")
+        total_height = total_rows * self.ROW_HEIGHT
+        self.canvas.configure(
+            scrollregion=(0, 0, width, max(total_height, height)),
+            yscrollincrement=self.ROW_HEIGHT
+        )
+
+        # 控件数量只需要覆盖一屏再多一行
+        visible = height // self.ROW_HEIGHT + 2
+        while len(self.pool) < visible:
+            self.pool.append(self.create_row())
+
+        first = int(self.canvas.canvasy(0)) // self.ROW_HEIGHT
+        for offset, (label, item) in enumerate(self.pool):
+            row = first + offset
+            if offset < visible and row < total_rows:
+                conversation_id, text = self.row_at(groups, row)
+                label.conversation_id = conversation_id
+                label.config(text=text, **(self.ROW_STYLE if conversation_id else self.HEADER_STYLE))
+                self.canvas.coords(item, self.ROW_MARGIN, row * self.ROW_HEIGHT)
+                self.canvas.itemconfigure(item, width=width - 2 * self.ROW_MARGIN, state='normal')
+            else:
+                label.conversation_id = None
+                self.canvas.itemconfigure(item, state='hidden')
+
+    def row_at(self, groups, row):
+        """返回某一显示行的内容
+
+        Args:
+            groups: RecencyIndex.groups 返回的分组
+            row: 显示行号（包括分组标题行）
+
+        Returns:
+            (对话ID, 文字)，分组标题行的对话ID为None
+        """
+        for name, start, end in groups:
+            if row == 0:
+                return None, name
+            row -= 1
+            if row < end - start:
+                conversation_id = self.order[start + row]
+                return conversation_id, self.titles[conversation_id]
+            row -= end - start
+        raise IndexError(row)
+
+    def create_row(self):
+        """创建一个可重复使用的行控件"""
+        label = Label(
+            self.canvas,
+            bg='#1F2937',
+            anchor='w',
+            padx=10,
+            pady=8,
+            **self.ROW_STYLE
+        )
+        label.conversation_id = None
+
+        # 添加鼠标悬停效果，分组标题行没有
+        label.bind("<Enter>", lambda e: label.conversation_id and e.widget.config(bg='#374151'))
+        label.bind("<Leave>", lambda e: e.widget.config(bg='#1F2937'))
+
+        # 事件处理时再读取控件当前对应的对话
+        label.bind("<Button-1>", lambda e: label.conversation_id and self.on_select(label.conversation_id))
+        label.bind("<Button-3>", lambda e: label.conversation_id and self.on_menu(e, label.conversation_id))
+        self.bind_mousewheel(label)
+
+        item = self.canvas.create_window(
+            (self.ROW_MARGIN, 0),
+            window=label,
+            anchor="nw",
+            height=self.ROW_HEIGHT - 4,
+            state='hidden'
+        )
+        return label, item
@@ -0,0 +1,47 @@
+# 导入必要的库
+import time  # 导入时间模块用于统计启动耗时
+
+
+class StartupProfiler:
+    """记录启动过程中每个阶段的耗时，用于 main.py --profile-startup
+
+    每次调用 mark 记录从上一次标记到现在的耗时，阶段按调用顺序排列。
+    """
+
+    # 启动到第一次绘制的目标时间（毫秒）
+    TARGET_MS = 150
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        # (阶段名称, 耗时毫秒) 的列表
+        self.phases = []
+        # 启动到第一次绘制的时间（毫秒），还没有绘制时为None
+        self.first_paint_ms = None
+
+    def mark(self, phase):
+        """结束一个阶段并记录它的耗时
+
+        Args:
+            phase: 阶段名称
+        """
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def mark_first_paint(self):
+        """记录窗口第一次显示的时间"""
+        self.mark("首次绘制")
+        self.first_paint_ms = (self.last - self.start) * 1000
+
+    def report(self):
+        """生成各阶段耗时的报告文本"""
+        width = max((len(phase) for phase, _ in self.phases), default=0)
+        lines = ["启动耗时："]
+        for phase, elapsed in self.phases:
+            lines.append(f"  {phase.ljust(width, '　')}  {elapsed:8.1f} ms")
+        lines.append(f"  总计{'　' * max(0, width - 2)}  {(self.last - self.start) * 1000:8.1f} ms")
+        if self.first_paint_ms is not None:
+            verdict = "达到" if self.first_paint_ms <= self.TARGET_MS else "未达到"
+            lines.append(f"首次绘制：{self.first_paint_ms:.1f} ms（{verdict}目标 {self.TARGET_MS} ms）")
+        return "\n".join(lines)
@@ -0,0 +1,475 @@
+# 导入必要的库
+import os  # 导入os模块用于处理文件路径
+import sqlite3  # 导入sqlite3模块用于持久化保存对话
+import time  # 导入时间模块用于记录时间戳
+from messages import Message  # 导入紧凑的消息类型
+from compressor import BodyCodec, compress_level_from_env, train_dictionary  # 导入消息内容的压缩
+
+# 消息数量达到它时用已有的消息训练压缩字典
+TRAIN_MIN_MESSAGES = 500
+# 训练字典时使用的最近消息数量
+TRAIN_SAMPLE_MESSAGES = 2000
+
+
+def default_database_path():
+    """返回默认的数据库路径，可用环境变量 DEEPSEEK_CHAT_DB 修改"""
+    path = os.environ.get("DEEPSEEK_CHAT_DB")
+    if path:
+        return path
+    return os.path.join(os.path.expanduser("~"), ".deepseek_chat", "conversations.db")
+
+
+class ConversationStore:
+    """基于SQLite（WAL模式）的对话存储
+
+    对话的标题和时间戳与消息内容分开保存：启动时只读取侧边栏需要的元数据，
+    消息内容在打开对话时才读取；每条消息追加时单独写入，不会重写整段对话。
+    较长的消息内容压缩后保存（见BodyCodec），读取时自动解压。
+    """
+
+    def __init__(self, path=None, compress_level=None):
+        """打开（必要时创建）数据库
+
+        Args:
+            path: 数据库文件路径，为None时使用默认路径，":memory:" 表示内存数据库
+            compress_level: 新消息的压缩级别，0表示不压缩，为None时读取环境变量 DEEPSEEK_COMPRESS_LEVEL
+        """
+        self.path = path or default_database_path()
+        self.codec = BodyCodec(compress_level_from_env() if compress_level is None else compress_level)
+        self.codec.loader = self.read_dictionary
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        # WAL模式下写入不阻塞读取，NORMAL同步级别避免每次提交都等待fsync
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.create_tables()
+        for dictionary_id, data in self.connection.execute("SELECT id, data FROM dictionaries"):
+            self.codec.add_dictionary(dictionary_id, data)
+        self.maybe_train_dictionary()
+
+    def create_tables(self):
+        """创建数据表"""
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    timestamp REAL NOT NULL
+                )
+            """)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    tokens INTEGER,
+                    body BLOB,
+                    dictionary_id INTEGER,
+                    write_id TEXT
+                )
+            """)
+            # 压缩字典，消息的 dictionary_id 引用这里的 id
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS dictionaries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    data BLOB NOT NULL
+                )
+            """)
+            # 旧版本的数据库没有token数量和压缩内容这几列
+            columns = {row[1] for row in self.connection.execute("PRAGMA table_info(messages)")}
+            if "tokens" not in columns:
+                self.connection.execute("ALTER TABLE messages ADD COLUMN tokens INTEGER")
+            if "body" not in columns:
+                self.connection.execute("ALTER TABLE messages ADD COLUMN body BLOB")
+                self.connection.execute("ALTER TABLE messages ADD COLUMN dictionary_id INTEGER")
+            if "write_id" not in columns:
+                self.connection.execute("ALTER TABLE messages ADD COLUMN write_id TEXT")
+            self.connection.execute("""
+                CREATE INDEX IF NOT EXISTS messages_by_conversation
+                ON messages (conversation_id, id)
+            """)
+            # 后台写入的消息的唯一写入ID，直接写入的消息没有
+            self.connection.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS messages_by_write_id
+                ON messages (write_id) WHERE write_id IS NOT NULL
+            """)
+
+    def read_dictionary(self, dictionary_id):
+        """读取一个字典，使用单独的连接，可以在后台线程中调用
+
+        Raises:
+            KeyError: 字典不存在
+        """
+        connection = sqlite3.connect(self.path) if self.path != ":memory:" else self.connection
+        try:
+            row = connection.execute("SELECT data FROM dictionaries WHERE id = ?", (dictionary_id,)).fetchone()
+        finally:
+            if connection is not self.connection:
+                connection.close()
+        if row is None:
+            raise KeyError(dictionary_id)
+        return row[0]
+
+    def maybe_train_dictionary(self):
+        """开启压缩、还没有字典并且消息足够多时训练一个字典
+
+        Returns:
+            是否训练了新字典
+        """
+        if self.codec.level <= 0 or self.codec.dictionary_id is not None:
+            return False
+        count = self.connection.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM messages LIMIT ?)", (TRAIN_MIN_MESSAGES,)
+        ).fetchone()[0]
+        if count < TRAIN_MIN_MESSAGES:
+            return False
+        return self.train_dictionary()
+
+    def train_dictionary(self):
+        """用最近的消息训练新的压缩字典，之后的消息使用它压缩
+
+        Returns:
+            是否训练了新字典（消息中没有重复的片段时不会生成字典）
+        """
+        rows = self.connection.execute(
+            "SELECT content, body, dictionary_id FROM messages ORDER BY id DESC LIMIT ?",
+            (TRAIN_SAMPLE_MESSAGES,)
+        )
+        data = train_dictionary(self.codec.decode(*row) for row in rows)
+        if not data:
+            return False
+        with self.connection:
+            cursor = self.connection.execute("INSERT INTO dictionaries (data) VALUES (?)", (data,))
+        self.codec.add_dictionary(cursor.lastrowid, data)
+        return True
+
+    def list_conversations(self):
+        """读取所有对话的元数据，不读取消息内容
+
+        Returns:
+            按时间先后排列的 (对话ID, 标题, 时间戳) 列表
+        """
+        return self.connection.execute(
+            "SELECT id, title, timestamp FROM conversations ORDER BY timestamp, rowid"
+        ).fetchall()
+
+    def create_conversation(self, conversation_id, title, timestamp=None):
+        """新建一个对话
+
+        Args:
+            conversation_id: 对话ID
+            title: 对话标题
+            timestamp: 时间戳，默认为当前时间
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO conversations (id, title, timestamp) VALUES (?, ?, ?)",
+                (conversation_id, title, timestamp or time.time())
+            )
+
+    def append_message(self, conversation_id, role, content, tokens=None, created_at=None, on_saved=None,
+                       write_id=None):
+        """向对话追加一条消息，同时更新对话的时间戳
+
+        Args:
+            conversation_id: 对话ID
+            role: 消息角色（user 或 assistant）
+            content: 消息内容
+            tokens: 消息的token数量，未知时为None
+            created_at: 消息的时间戳，默认为当前时间
+            on_saved: 提交之后立即调用，参数为True，和后台写入的存储接口相同
+            write_id: 后台写入时消息的唯一写入ID，用来判断消息是否已经写入
+
+        Returns:
+            新消息的ID
+        """
+        now = created_at or time.time()
+        stored, body, dictionary_id = self.codec.encode(content)
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO messages (conversation_id, role, content, created_at, tokens, body, dictionary_id, write_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (conversation_id, role, stored, now, tokens, body, dictionary_id, write_id)
+            )
+            self.connection.execute(
+                "UPDATE conversations SET timestamp = ? WHERE id = ?",
+                (now, conversation_id)
+            )
+        if on_saved is not None:
+            on_saved(True)
+        return cursor.lastrowid
+
+    def load_messages(self, conversation_id, connection=None):
+        """读取一个对话的全部消息并解压
+
+        Args:
+            conversation_id: 对话ID
+            connection: 使用的数据库连接，默认为主连接
+
+        Returns:
+            Message的列表，旧数据库中消息的tokens可能为None
+        """
+        rows = (connection or self.connection).execute(
+            "SELECT role, content, body, dictionary_id, created_at, tokens FROM messages "
+            "WHERE conversation_id = ? ORDER BY id",
+            (conversation_id,)
+        )
+        decode = self.codec.decode
+        return [
+            Message(role, decode(content, body, dictionary_id), created_at, tokens)
+            for role, content, body, dictionary_id, created_at, tokens in rows
+        ]
+
+    def load_messages_with_written(self, conversation_id, write_ids, connection=None):
+        """读取一个对话的全部消息，同时检查哪些写入ID已经写入
+
+        消息和写入ID在同一次查询中读取，后台线程同时写入时两者也是一致的。
+
+        Args:
+            conversation_id: 对话ID
+            write_ids: 要检查的写入ID
+            connection: 使用的数据库连接，默认为主连接
+
+        Returns:
+            (Message的列表, write_ids 中已经写入的写入ID的集合)
+        """
+        rows = (connection or self.connection).execute(
+            "SELECT role, content, body, dictionary_id, created_at, tokens, write_id FROM messages "
+            "WHERE conversation_id = ? ORDER BY id",
+            (conversation_id,)
+        )
+        write_ids = set(write_ids)
+        decode = self.codec.decode
+        messages = []
+        written = set()
+        for role, content, body, dictionary_id, created_at, tokens, write_id in rows:
+            messages.append(Message(role, decode(content, body, dictionary_id), created_at, tokens))
+            if write_id in write_ids:
+                written.add(write_id)
+        return messages, written
+
+    def read_messages(self, conversation_id):
+        """和 load_messages 相同，但使用单独的数据库连接，可以在后台线程中调用"""
+        if self.path == ":memory:":
+            # 内存数据库无法从另一个连接访问
+            return self.load_messages(conversation_id)
+        connection = sqlite3.connect(self.path)
+        try:
+            return self.load_messages(conversation_id, connection)
+        finally:
+            connection.close()
+
+    def conversation_size(self, conversation_id):
+        """返回对话的消息条数，不读取消息内容"""
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()[0]
+
+    def get_messages(self, message_ids):
+        """按消息ID读取消息，用于显示搜索结果
+
+        Returns:
+            消息ID -> (对话ID, 角色, 内容) 的字典，已经删除的消息不在其中
+        """
+        message_ids = list(message_ids)
+        if not message_ids:
+            return {}
+        placeholders = ",".join("?" * len(message_ids))
+        rows = self.connection.execute(
+            f"SELECT id, conversation_id, role, content, body, dictionary_id FROM messages WHERE id IN ({placeholders})",
+            message_ids
+        )
+        return {
+            message_id: (conversation_id, role, self.codec.decode(content, body, dictionary_id))
+            for message_id, conversation_id, role, content, body, dictionary_id in rows
+        }
+
+    def iter_messages(self, max_id=None, batch_size=10000):
+        """按ID顺序读取所有消息，用于建立搜索索引
+
+        使用单独的数据库连接，可以在后台线程中调用。
+
+        Args:
+            max_id: 只读取ID不大于它的消息，None表示全部
+            batch_size: 每次从数据库读取的行数
+
+        Returns:
+            逐个产生 (消息ID, 内容) 的迭代器
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            cursor = connection.execute(
+                "SELECT id, content, body, dictionary_id FROM messages WHERE id <= ? ORDER BY id",
+                (max_id if max_id is not None else 2 ** 63 - 1,)
+            )
+            decode = self.codec.decode
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for message_id, content, body, dictionary_id in rows:
+                    yield message_id, decode(content, body, dictionary_id)
+        finally:
+            connection.close()
+
+    def last_message_id(self):
+        """返回当前最大的消息ID，没有消息时为0"""
+        return self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+
+    def iter_archive(self, batch_size=1000):
+        """按时间先后逐条产生所有对话和消息，用于导出
+
+        每个对话先产生一条对话记录，随后是它的消息记录。
+        对话和消息都分批从数据库读取，内存占用与数据量无关。
+
+        Args:
+            batch_size: 每次从数据库读取的行数
+
+        Returns:
+            逐个产生记录字典的迭代器
+        """
+        # 读取对话列表使用单独的连接，遍历期间可以在主连接上读取消息
+        connection = sqlite3.connect(self.path) if self.path != ":memory:" else self.connection
+        try:
+            conversations = connection.execute(
+                "SELECT id, title, timestamp FROM conversations ORDER BY timestamp, rowid"
+            )
+            while True:
+                rows = conversations.fetchmany(batch_size)
+                if not rows:
+                    break
+                for conversation_id, title, timestamp in rows:
+                    yield {"type": "conversation", "id": conversation_id, "title": title, "timestamp": timestamp}
+                    messages = self.connection.execute(
+                        "SELECT role, content, body, dictionary_id, created_at, tokens FROM messages "
+                        "WHERE conversation_id = ? ORDER BY id",
+                        (conversation_id,)
+                    )
+                    while True:
+                        message_rows = messages.fetchmany(batch_size)
+                        if not message_rows:
+                            break
+                        for role, content, body, dictionary_id, created_at, tokens in message_rows:
+                            yield {
+                                "type": "message",
+                                "conversation_id": conversation_id,
+                                "role": role,
+                                "content": self.codec.decode(content, body, dictionary_id),
+                                "created_at": created_at,
+                                "tokens": tokens
+                            }
+        finally:
+            if connection is not self.connection:
+                connection.close()
+
+    def import_archive(self, records, batch_size=5000):
+        """批量写入导出的记录，已经存在的对话（按对话ID判断）连同它的消息一起跳过
+
+        每 batch_size 行提交一次事务，记录可以是任意长的迭代器。
+
+        Args:
+            records: iter_archive 格式的记录迭代器，对话记录必须在它的消息之前
+            batch_size: 每个事务写入的行数
+
+        Returns:
+            {"conversations": 导入的对话数, "messages": 导入的消息数, "skipped": 跳过的对话数}
+
+        Raises:
+            ValueError: 记录格式不正确
+        """
+        stats = {"conversations": 0, "messages": 0, "skipped": 0}
+        pending_conversations = []
+        pending_messages = []
+        # 还没有提交的对话ID，同一个文件中重复的对话也要跳过
+        pending_ids = set()
+        # 正在导入的对话ID，为None时跳过后面的消息
+        current = None
+
+        def flush():
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO conversations (id, title, timestamp) VALUES (?, ?, ?)",
+                    pending_conversations
+                )
+                self.connection.executemany(
+                    "INSERT INTO messages (conversation_id, role, content, created_at, tokens, body, dictionary_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    pending_messages
+                )
+            pending_conversations.clear()
+            pending_messages.clear()
+            pending_ids.clear()
+
+        for record in records:
+            kind = record.get("type")
+            if kind == "conversation":
+                conversation_id = record["id"]
+                exists = conversation_id in pending_ids or self.connection.execute(
+                    "SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)
+                ).fetchone() is not None
+                if exists:
+                    stats["skipped"] += 1
+                    current = None
+                    continue
+                current = conversation_id
+                pending_ids.add(conversation_id)
+                pending_conversations.append((conversation_id, record["title"], record.get("timestamp") or time.time()))
+                stats["conversations"] += 1
+            elif kind == "message":
+                if record["conversation_id"] != current:
+                    continue
+                stored, body, dictionary_id = self.codec.encode(record["content"])
+                pending_messages.append((
+                    current,
+                    record["role"],
+                    stored,
+                    record.get("created_at") or time.time(),
+                    record.get("tokens"),
+                    body,
+                    dictionary_id
+                ))
+                stats["messages"] += 1
+            else:
+                raise ValueError(f"未知的记录类型: {kind!r}")
+            if len(pending_conversations) + len(pending_messages) >= batch_size:
+                flush()
+                # 导入足够多的消息后训练字典，之后的消息压缩得更好
+                self.maybe_train_dictionary()
+        flush()
+        self.maybe_train_dictionary()
+        return stats
+
+    def rename_conversation(self, conversation_id, title):
+        """修改对话标题"""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE conversations SET title = ? WHERE id = ?",
+                (title, conversation_id)
+            )
+
+    def has_message(self, write_id):
+        """是否已经写入过这个写入ID的消息，重放日志时用来避免重复写入"""
+        return self.connection.execute(
+            "SELECT 1 FROM messages WHERE write_id = ?", (write_id,)
+        ).fetchone() is not None
+
+    def touch_conversation(self, conversation_id, timestamp=None):
+        """更新对话的最近活动时间（例如打开了这个对话），追加消息时会自动更新"""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE conversations SET timestamp = ? WHERE id = ?",
+                (timestamp or time.time(), conversation_id)
+            )
+
+    def delete_conversation(self, conversation_id):
+        """删除对话及其全部消息"""
+        with self.connection:
+            self.connection.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    def close(self):
+        """关闭数据库连接"""
+        self.connection.close()
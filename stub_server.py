@@ -0,0 +1,171 @@
+# 本地SSE测试服务器，模拟OpenAI/DeepSeek的chat-completions流式接口
+# 用法：python stub_server.py --port 8000 --delay 0.03
+# 然后设置 DEEPSEEK_BASE_URL=http://127.0.0.1:8000 再运行 main.py
+# 可以注入故障：--rate-limit-every 3 每3个请求返回一次429，--error-rate 0.2 按概率返回503，
+# --drop-rate 0.1 按概率在发送 --drop-after 个片段后断开连接
+import argparse  # 导入命令行参数解析模块
+import json  # 导入json模块用于编码数据块
+import random  # 导入随机数模块用于按概率注入故障
+import socket  # 导入socket模块用于模拟连接中断
+import threading  # 导入线程模块用于保护请求计数
+import time  # 导入时间模块用于模拟生成延迟
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # 导入HTTP服务器
+
+# 默认的模拟回复
+DEFAULT_REPLY = "你好！这是来自本地测试服务器的流式回复，用于在离线环境下检查逐字显示和首字延迟。"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """处理chat-completions请求并以SSE格式逐字返回
+
+    使用HTTP/1.1和分块传输，同一个连接可以连续处理多个请求（keep-alive）。
+    """
+
+    protocol_version = "HTTP/1.1"
+    # 关闭Nagle算法，小的数据块立即发出，否则首字延迟会多出几十毫秒
+    disable_nagle_algorithm = True
+
+    # 由服务器设置的参数
+    reply = DEFAULT_REPLY
+    delay = 0.03
+    first_delay = 0.2
+    # 故障注入：每隔几个请求返回一次429（0表示不返回）、429的Retry-After（秒）、
+    # 返回503的概率、中途断开连接的概率和断开前发送的片段数
+    rate_limit_every = 0
+    retry_after = 1
+    error_rate = 0.0
+    drop_rate = 0.0
+    drop_after = 5
+    # 所有连接共用的统计
+    stats = None
+    lock = threading.Lock()
+
+    def count(self, name):
+        """增加一项统计"""
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+            return self.stats[name]
+
+    def do_POST(self):
+        """处理流式对话请求"""
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        request = json.loads(body or b'{}')
+        model = request.get("model", "stub")
+
+        number = self.count("requests")
+        if self.rate_limit_every and number % self.rate_limit_every == 0:
+            self.count("rate_limited")
+            self.send_error_response(429, {"Retry-After": str(self.retry_after)})
+            return
+        if random.random() < self.error_rate:
+            self.count("errors")
+            self.send_error_response(503)
+            return
+        drop = random.random() < self.drop_rate
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        # 模拟首字之前的等待
+        time.sleep(self.first_delay)
+        for index, char in enumerate(self.reply):
+            if drop and index >= self.drop_after:
+                # 不发送结束块就断开连接，模拟流式响应中途中断
+                self.count("dropped")
+                self.close_connection = True
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            if index:
+                time.sleep(self.delay)
+            self.send_chunk({"model": model, "choices": [{"index": 0, "delta": {"content": char}}]})
+        self.send_chunk({"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        self.write_chunk(b"data: [DONE]\n\n")
+        # 结束分块传输
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def send_error_response(self, status, headers=None):
+        """返回一个带JSON内容的错误响应，连接保持可用"""
+        body = json.dumps({"error": {"message": "服务器繁忙，请稍后重试。"}}, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def send_chunk(self, chunk):
+        """写出一个SSE数据块"""
+        self.write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+    def write_chunk(self, data):
+        """按分块传输的格式写出数据"""
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        """关闭默认的访问日志"""
+        pass
+
+
+def make_server(host="127.0.0.1", port=8000, reply=DEFAULT_REPLY, delay=0.03, first_delay=0.2, **faults):
+    """创建测试服务器，port为0时自动选择端口
+
+    Args:
+        faults: 故障注入参数：rate_limit_every、retry_after、error_rate、drop_rate、drop_after
+
+    Returns:
+        ThreadingHTTPServer对象，可用 server.server_address 获取实际端口，
+        server.stats 是请求、429、503和中途断开的次数统计
+    """
+    stats = {}
+    handler = type('ConfiguredStubHandler', (StubHandler,), dict(
+        faults,
+        reply=reply,
+        delay=delay,
+        first_delay=first_delay,
+        stats=stats,
+        lock=threading.Lock()
+    ))
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stats = stats
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="本地SSE测试服务器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--delay', type=float, default=0.03, help="每个片段之间的间隔（秒）")
+    parser.add_argument('--first-delay', type=float, default=0.2, help="首个片段之前的等待（秒）")
+    parser.add_argument('--reply', default=DEFAULT_REPLY, help="返回的回复内容")
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="每隔几个请求返回一次429，0表示不返回")
+    parser.add_argument('--retry-after', type=int, default=1, help="429响应的Retry-After（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回503的概率")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="流式响应中途断开的概率")
+    parser.add_argument('--drop-after', type=int, default=5, help="中途断开前发送的片段数")
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host, args.port, args.reply, args.delay, args.first_delay,
+        rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        drop_after=args.drop_after
+    )
+    print(f"测试服务器已启动: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,403 @@
+# 导入必要的库
+import itertools  # 导入itertools用于生成消息标签编号
+from collections import deque  # 导入双端队列用于记录已显示的消息
+from tkinter import END  # 导入Text控件的结束位置常量
+from markdown_text import MARKDOWN_TAGS, MarkdownStream, render_markdown  # 导入增量的Markdown渲染
+
+# 对话区域使用的文本样式
+TRANSCRIPT_TAGS = {
+    'user_name': {'foreground': '#60A5FA', 'font': ('Segoe UI', 12, 'bold')},
+    'user_message': {'foreground': '#E5E7EB', 'font': ('Segoe UI', 12)},
+    'ai_name': {'foreground': '#34D399', 'font': ('Segoe UI', 12, 'bold')},
+    'ai_message': {'foreground': '#E5E7EB', 'font': ('Segoe UI', 12)},
+    'ai_complete': {'foreground': '#34D399', 'font': ('Segoe UI', 12)},
+}
+# 按Markdown显示的消息内容样式
+MARKDOWN_STYLES = ('ai_message',)
+
+# 消息之间的分隔符
+SEPARATOR = "\n\n"
+
+
+class TranscriptRenderer:
+    """只追加的对话渲染器
+
+    新的文本先放进缓冲区，每一帧最多写入Text控件一次，
+    每次写入的开销只和新内容的长度有关，与整个对话的长度无关。
+    每条显示的消息都带有一个独立的标签，可以直接定位到这条消息：
+    窗口化显示时整条删除或在前面补充消息，回复时替换占位文字或继续追加内容，都不需要搜索整个对话。
+    模型的回复按Markdown显示；流式追加时只重新解析和替换还没有结束的最后一行，已经写入的行不会再改变。
+    """
+
+    # 两次写入之间的间隔（毫秒），约等于一帧
+    FLUSH_INTERVAL_MS = 16
+
+    def __init__(self, master, text, max_messages=None):
+        """初始化渲染器
+
+        Args:
+            master: tkinter根窗口对象，用于安排定时刷新
+            text: 显示对话的Text控件
+            max_messages: 最多保留的消息条数，超出时从顶部移除，None表示不限制
+        """
+        self.master = master
+        self.text = text
+        self.max_messages = max_messages
+        # 等待写入的 (目标消息标签, 文本, 样式元组) 片段，目标为None表示追加到末尾
+        self.pending = []
+        # 已经安排的刷新任务
+        self.flush_job = None
+        # 按显示顺序排列的消息标签
+        self.messages = deque()
+        # 消息标签 -> 消息键，消息键一般是聊天历史中的下标
+        self.message_keys = {}
+        self.tag_ids = itertools.count()
+        # 流式追加Markdown内容的消息：消息标签 -> MarkdownStream
+        self.streams = {}
+        # 有新内容等待写入的流式消息的标签
+        self.dirty_streams = []
+
+        # 样式只需要配置一次，Markdown样式在后面配置，优先级更高
+        for tag, options in TRANSCRIPT_TAGS.items():
+            self.text.tag_configure(tag, **options)
+        for tag, options in MARKDOWN_TAGS.items():
+            self.text.tag_configure(tag, **options)
+        # 标记最后一条消息的开始位置，新文本插入在它之后
+        self.text.mark_set('last_message_start', '1.0')
+        self.text.mark_gravity('last_message_start', 'left')
+
+    @property
+    def has_content(self):
+        """对话区域是否已经有消息（包括缓冲区中的）"""
+        return bool(self.messages)
+
+    def new_message_tag(self, key):
+        """为一条新消息分配标签并记录它的消息键"""
+        tag = f"msg{next(self.tag_ids)}"
+        self.message_keys[tag] = key
+        return tag
+
+    def message_segments(self, entry, tag, separator):
+        """生成一条消息需要插入的 (文本, 样式元组) 片段
+
+        Args:
+            entry: (发送者, 消息内容, 名称样式, 内容样式) 元组
+            tag: 消息标签
+            separator: 是否在消息前加分隔符
+        """
+        sender, message, name_tag, msg_tag = entry[:4]
+        segments = []
+        if separator:
+            segments.append((SEPARATOR, (tag,)))
+        segments.append((f"{sender}: ", (name_tag, tag)))
+        if message and msg_tag in MARKDOWN_STYLES:
+            segments.extend((text, tags + (tag,)) for text, tags in render_markdown(message, msg_tag))
+        elif message:
+            segments.append((message, (msg_tag, tag)))
+        return segments
+
+    def insert_segments(self, index, segments):
+        """用一次插入写入多个片段
+
+        Args:
+            index: 插入位置
+            segments: (文本, 样式元组) 片段的列表
+        """
+        args = []
+        for text, tags in segments:
+            args.extend((text, tags))
+        if args:
+            self.text.insert(index, *args)
+
+    def add_message(self, sender, message, name_tag, msg_tag, key=None):
+        """追加一条新消息
+
+        Args:
+            sender: 显示的发送者名称
+            message: 消息内容
+            name_tag: 发送者名称的样式
+            msg_tag: 消息内容的样式
+            key: 消息键，通常是消息在聊天历史中的下标
+
+        Returns:
+            这条消息的标签，之后可以用它向这条消息追加或替换内容
+        """
+        tag = self.new_message_tag(key)
+        separator = self.has_content
+        # 文本为None表示从这里开始新的一条消息，写入时更新标记
+        self.pending.append((None, None, None))
+        for text, tags in self.message_segments((sender, message, name_tag, msg_tag), tag, separator):
+            self.pending.append((None, text, tags))
+        self.messages.append(tag)
+        self.schedule_flush()
+        return tag
+
+    def append(self, text, tag, message_tag=None):
+        """向一条消息的末尾追加文本
+
+        Args:
+            text: 追加的文本
+            tag: 文本样式
+            message_tag: 目标消息的标签，为None时追加到最后一条消息
+        """
+        if not text:
+            return
+        if message_tag is None:
+            message_tag = self.messages[-1] if self.messages else None
+        elif message_tag not in self.message_keys:
+            # 目标消息已经不在对话区域中（例如被清空或移除）
+            return
+        if message_tag is not None and tag in MARKDOWN_STYLES:
+            # Markdown内容交给这条消息的解析器，写入时只重新处理最后一行
+            stream = self.streams.get(message_tag)
+            if stream is None:
+                stream = self.streams[message_tag] = MarkdownStream(tag)
+            stream.feed(text)
+            if message_tag not in self.dirty_streams:
+                self.dirty_streams.append(message_tag)
+            self.schedule_flush()
+            return
+        tags = (tag, message_tag) if message_tag else (tag,)
+        # 最后一条消息直接追加到末尾，便于合并
+        target = None if not self.messages or message_tag == self.messages[-1] else message_tag
+        self.pending.append((target, text, tags))
+        self.schedule_flush()
+
+    def replace_content(self, message_tag, segments):
+        """替换一条消息的内容（保留它前面的分隔符）
+
+        Args:
+            message_tag: 目标消息的标签
+            segments: (文本, 样式) 片段的列表，样式为None表示不加样式
+        """
+        if message_tag not in self.message_keys:
+            return
+        self.flush()
+        self.forget_stream(message_tag)
+        start = f"{message_tag}.first"
+        if message_tag != self.messages[0]:
+            start += f" + {len(SEPARATOR)} chars"
+        # 先记下绝对位置，删除后标签范围会改变
+        start = self.text.index(start)
+        self.text.configure(state='normal')
+        self.text.delete(start, f"{message_tag}.last")
+        self.insert_segments(start, [
+            (text, (style, message_tag) if style else (message_tag,))
+            for text, style in segments
+        ])
+        self.text.configure(state='disabled')
+
+    def set_key(self, message_tag, key):
+        """设置一条消息的消息键，例如回复完成后记录它在聊天历史中的下标"""
+        if message_tag in self.message_keys:
+            self.message_keys[message_tag] = key
+
+    def schedule_flush(self):
+        """安排在下一帧写入缓冲区的内容"""
+        if self.flush_job is None:
+            self.flush_job = self.master.after(self.FLUSH_INTERVAL_MS, self.flush)
+
+    def flush(self):
+        """把缓冲区中的内容写入Text控件，连续的片段合并成一次插入"""
+        if self.flush_job is not None:
+            self.master.after_cancel(self.flush_job)
+            self.flush_job = None
+        if not self.pending and not self.dirty_streams:
+            return
+
+        pending, self.pending = self.pending, []
+        self.text.configure(state='normal')
+        segments = []
+        segments_target = None
+        for target, text, tags in pending:
+            # 目标改变或遇到新消息时，先写入之前积累的内容
+            if segments and (text is None or target != segments_target):
+                self.insert_at(segments_target, segments)
+                segments = []
+            if text is None:
+                self.text.mark_set('last_message_start', 'end-1c')
+                continue
+            segments_target = target
+            # 合并相同样式的相邻片段，减少插入次数
+            if segments and segments[-1][1] == tags:
+                segments[-1] = (segments[-1][0] + text, tags)
+            else:
+                segments.append((text, tags))
+        if segments:
+            self.insert_at(segments_target, segments)
+        dirty, self.dirty_streams = self.dirty_streams, []
+        for message_tag in dirty:
+            self.render_stream(message_tag)
+        # 超出上限时从顶部移除最早的消息
+        if self.max_messages is not None and len(self.messages) > self.max_messages:
+            self.trim_top(len(self.messages) - self.max_messages)
+        self.text.configure(state='disabled')
+        self.text.see(END)
+
+    def render_stream(self, message_tag):
+        """写入流式消息的新内容：删除上次写入的最后一行，写入新完成的行和新的最后一行
+
+        最后一行的开始位置用一个标记记录，不需要搜索或者重新设置整条消息的样式。
+        """
+        stream = self.streams.get(message_tag)
+        if stream is None:
+            return
+        committed, tail = stream.update()
+        mark = f"{message_tag}_tail"
+        if mark in self.text.mark_names():
+            self.text.delete(mark, f"{message_tag}.last")
+        else:
+            self.text.mark_set(mark, f"{message_tag}.last")
+        # 新完成的行写在标记之前，标记移动到它们之后；最后一行写在标记之后
+        self.text.mark_gravity(mark, 'right')
+        self.insert_segments(mark, [(text, tags + (message_tag,)) for text, tags in committed if text])
+        self.text.mark_gravity(mark, 'left')
+        self.insert_segments(mark, [(text, tags + (message_tag,)) for text, tags in tail if text])
+
+    def forget_stream(self, message_tag):
+        """删除一条消息的Markdown解析器和它的标记"""
+        if self.streams.pop(message_tag, None) is not None:
+            self.text.mark_unset(f"{message_tag}_tail")
+
+    def insert_at(self, target, segments):
+        """把片段写入到末尾或者某条消息的末尾"""
+        if target is None:
+            self.insert_segments(END, segments)
+        elif target in self.message_keys:
+            self.insert_segments(f"{target}.last", segments)
+
+    def build_messages(self, entries, separator):
+        """为一批消息分配标签并生成需要插入的片段
+
+        Args:
+            entries: (发送者, 消息内容, 名称样式, 内容样式, 消息键) 元组的列表
+            separator: 第一条消息前是否加分隔符
+
+        Returns:
+            (消息标签列表, 片段列表)
+        """
+        tags = []
+        segments = []
+        for index, entry in enumerate(entries):
+            tag = self.new_message_tag(entry[4])
+            segments.extend(self.message_segments(entry, tag, separator or index > 0))
+            tags.append(tag)
+        return tags, segments
+
+    def show_messages(self, entries):
+        """清空对话区域，并用一次插入显示一批消息
+
+        Args:
+            entries: (发送者, 消息内容, 名称样式, 内容样式, 消息键) 元组的列表
+        """
+        self.clear()
+        self.append_messages(entries)
+        self.text.see(END)
+
+    def append_messages(self, entries):
+        """在对话区域底部用一次插入补充一批消息，不改变当前的滚动位置
+
+        Args:
+            entries: (发送者, 消息内容, 名称样式, 内容样式, 消息键) 元组的列表
+        """
+        if not entries:
+            return
+        self.flush()
+        tags, segments = self.build_messages(entries, self.has_content)
+        self.messages.extend(tags)
+        self.text.configure(state='normal')
+        self.insert_segments(END, segments)
+        self.text.mark_set('last_message_start', f"{tags[-1]}.first")
+        self.text.configure(state='disabled')
+
+    def prepend_messages(self, entries):
+        """在对话区域顶部补充一批较早的消息，并保持当前看到的内容不动
+
+        Args:
+            entries: (发送者, 消息内容, 名称样式, 内容样式, 消息键) 元组的列表，按时间顺序排列
+        """
+        if not entries:
+            return
+        self.flush()
+        first_tag = self.messages[0] if self.messages else None
+        tags, segments = self.build_messages(entries, False)
+        # 原来的第一条消息前面需要补一个分隔符
+        if first_tag is not None:
+            segments.append((SEPARATOR, (first_tag,)))
+
+        self.text.configure(state='normal')
+        self.insert_segments("1.0", segments)
+        self.text.configure(state='disabled')
+        self.messages.extendleft(reversed(tags))
+        # 让原来的第一条消息仍然显示在顶部
+        if first_tag is not None:
+            self.text.yview(f"{first_tag}.first + {len(SEPARATOR)} chars")
+
+    def forget(self, tags):
+        """删除已经移除的消息的标签"""
+        for tag in tags:
+            del self.message_keys[tag]
+            self.forget_stream(tag)
+        self.text.tag_delete(*tags)
+
+    def trim_top(self, count):
+        """移除最上面的若干条消息"""
+        self.flush()
+        count = min(count, len(self.messages))
+        if count <= 0:
+            return
+        removed = [self.messages.popleft() for _ in range(count)]
+        state = self.text.cget('state')
+        self.text.configure(state='normal')
+        if self.messages:
+            # 新的第一条消息前面的分隔符也要删除
+            end = f"{self.messages[0]}.first + {len(SEPARATOR)} chars"
+        else:
+            end = 'end-1c'
+        self.text.delete("1.0", end)
+        self.text.configure(state=state)
+        self.forget(removed)
+
+    def trim_bottom(self, count):
+        """移除最下面的若干条消息"""
+        self.flush()
+        count = min(count, len(self.messages))
+        if count <= 0:
+            return
+        removed = [self.messages.pop() for _ in range(count)]
+        state = self.text.cget('state')
+        self.text.configure(state='normal')
+        self.text.delete(f"{removed[-1]}.first", 'end-1c')
+        self.text.configure(state=state)
+        self.forget(removed)
+
+    def first_key(self):
+        """返回最上面一条带消息键的消息的键，没有时返回None"""
+        for tag in self.messages:
+            key = self.message_keys[tag]
+            if key is not None:
+                return key
+        return None
+
+    def last_key(self):
+        """返回最下面一条带消息键的消息的键，没有时返回None"""
+        for tag in reversed(self.messages):
+            key = self.message_keys[tag]
+            if key is not None:
+                return key
+        return None
+
+    def clear(self):
+        """清空对话区域和缓冲区"""
+        self.pending = []
+        self.dirty_streams = []
+        if self.flush_job is not None:
+            self.master.after_cancel(self.flush_job)
+            self.flush_job = None
+        self.text.configure(state='normal')
+        self.text.delete("1.0", END)
+        self.text.configure(state='disabled')
+        if self.messages:
+            self.forget(list(self.messages))
+        self.messages.clear()
+        self.text.mark_set('last_message_start', '1.0')
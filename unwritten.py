@@ -0,0 +1,96 @@
+# 导入必要的库
+import sqlite3  # 导入sqlite3用于在后台线程中打开单独的连接
+import threading  # 导入线程模块用于保护还没有写入的消息
+import uuid  # 导入uuid模块用于生成唯一的写入ID
+
+
+class UnwrittenMessages:
+    """后台写入的对话存储（日志、工作进程）共用的部分：记录还没有写入数据库的消息，读取时补在后面
+
+    每条消息有一个唯一的写入ID，写入数据库时一起保存。读取时在同一次查询中检查哪些写入ID
+    已经写入，不依赖时间戳（快速连续的消息可能有相同的时间戳）。
+
+    子类在 __init__ 中设置 self.reader（只用于读取的 ConversationStore）并调用 init_unwritten。
+    """
+
+    def init_unwritten(self):
+        """初始化还没有写入的消息"""
+        # 对话ID -> {写入ID: Message}，按追加的顺序；大的对话在后台线程中读取，需要加锁
+        self.unwritten = {}
+        self.lock = threading.Lock()
+
+    def add_unwritten(self, conversation_id, message):
+        """记录一条交给后台写入的消息
+
+        Returns:
+            消息的写入ID
+        """
+        write_id = uuid.uuid4().hex
+        with self.lock:
+            self.unwritten.setdefault(conversation_id, {})[write_id] = message
+        return write_id
+
+    def mark_written(self, conversation_id, write_id):
+        """消息已经写入数据库，不再补在读取结果后面"""
+        with self.lock:
+            pending = self.unwritten.get(conversation_id)
+            if pending is not None:
+                pending.pop(write_id, None)
+                if not pending:
+                    del self.unwritten[conversation_id]
+
+    def discard_unwritten(self, conversation_id):
+        """对话被删除，丢弃它还没有写入的消息"""
+        with self.lock:
+            self.unwritten.pop(conversation_id, None)
+
+    def pending(self, conversation_id):
+        """返回一个对话中还没有写入的 (写入ID, Message)"""
+        with self.lock:
+            return list(self.unwritten.get(conversation_id, {}).items())
+
+    def list_conversations(self):
+        """读取所有对话的元数据，见 ConversationStore.list_conversations"""
+        return self.reader.list_conversations()
+
+    def load_messages(self, conversation_id, connection=None):
+        """读取一个对话的全部消息，包括还没有写入的
+
+        pending 在读取数据库之前取得：之后才写入的消息要么在 pending 中，要么已经在数据库中，
+        两边都有的按写入ID去掉。
+        """
+        pending = self.pending(conversation_id)
+        if not pending:
+            return self.reader.load_messages(conversation_id, connection)
+        messages, written = self.reader.load_messages_with_written(
+            conversation_id, [write_id for write_id, message in pending], connection
+        )
+        return messages + [message for write_id, message in pending if write_id not in written]
+
+    def read_messages(self, conversation_id):
+        """和 load_messages 相同，使用单独的数据库连接，可以在后台线程中调用"""
+        if self.reader.path == ":memory:":
+            # 内存数据库无法从另一个连接访问
+            return self.load_messages(conversation_id)
+        connection = sqlite3.connect(self.reader.path)
+        try:
+            return self.load_messages(conversation_id, connection)
+        finally:
+            connection.close()
+
+    def conversation_size(self, conversation_id):
+        """返回对话的消息条数，包括还没有写入的"""
+        return self.reader.conversation_size(conversation_id) + len(self.pending(conversation_id))
+
+    def get_messages(self, message_ids):
+        """按消息ID读取已经写入的消息"""
+        return self.reader.get_messages(message_ids)
+
+    def iter_messages(self, max_id=None, batch_size=10000):
+        """逐批读取已经写入的 (消息ID, 消息内容)，用于建立搜索索引"""
+        return self.reader.iter_messages(max_id, batch_size)
+
+    def last_message_id(self):
+        """返回已经写入的最大消息ID"""
+        return self.reader.last_message_id()
+
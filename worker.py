@@ -0,0 +1,323 @@
+# 导入必要的库
+import itertools  # 导入itertools用于生成请求编号
+import multiprocessing  # 导入多进程模块用于运行工作进程
+import queue  # 导入队列模块用于非阻塞地取出结果
+import sqlite3  # 导入sqlite3用于捕获数据库错误
+import sys  # 导入sys模块用于报告放弃的写入
+import threading  # 导入线程模块用于在工作进程中同时生成多个回复
+import time  # 导入时间模块用于记录时间戳
+from backend import LatencyMeter  # 导入回复的延迟统计
+from messages import Message  # 导入紧凑的消息类型
+from storage import ConversationStore, default_database_path  # 导入SQLite对话存储
+from journal import open_store  # 导入先恢复上次留下的日志再打开数据库的函数
+from unwritten import UnwrittenMessages  # 导入后台写入的存储共用的还没有写入的消息记录
+
+# 界面发给工作进程的命令：
+#     ("create", 对话ID, 标题, 时间戳)
+#     ("append", 对话ID, 角色, 内容, token数量, 时间戳, 写入ID)：写入后回复 ("written", 对话ID, 写入ID, 是否保存)
+#     ("rename", 对话ID, 标题)
+#     ("touch", 对话ID, 时间戳)
+#     ("delete", 对话ID)
+#     ("reply", 回复编号, 聊天历史)：回复 ("token", 编号, 文本)、("error", 编号, 错误信息)、("done", 编号)
+#     ("cancel", 回复编号)
+#     ("search", 请求编号, 搜索内容, 数量)：回复 ("search", 编号, [(消息ID, 分数), ...])
+#     ("build_index",)：建立完成后回复 ("index_built",)
+#     ("stop",)
+# 命令执行失败时另外回复 ("failed", 错误信息)，工作进程继续执行之后的命令
+
+
+def stream_reply(backend, stream_id, history, cancelled, results):
+    """在工作进程的线程中生成一个回复，把片段发回界面"""
+    try:
+        for text in backend.stream_reply(history):
+            if cancelled.is_set():
+                break
+            results.put(("token", stream_id, text))
+    except Exception as e:
+        results.put(("error", stream_id, str(e)))
+    results.put(("done", stream_id))
+
+
+def serve(commands, results, db_path):
+    """工作进程的主循环：持有模型后端、回复缓存、对话存储和搜索索引，按顺序执行界面发来的命令
+
+    回复和建立索引在工作进程自己的线程中进行，主循环只负责分发命令，
+    所以生成回复时仍然可以写入消息和响应搜索。
+    """
+    # 这些模块只在工作进程中需要
+    from backend import create_backend_from_env
+    from response_cache import wrap_backend_from_env
+    from search_index import SearchIndex
+
+    # 界面进程不使用工作进程时可能留下了日志，先恢复它
+    store = open_store(db_path)
+    index = SearchIndex()
+    backend = wrap_backend_from_env(create_backend_from_env())
+    # 回复编号 -> 取消标志
+    streams = {}
+
+    def notify_built(thread):
+        thread.join()
+        results.put(("index_built",))
+
+    while True:
+        command = commands.get()
+        kind = command[0]
+        if kind == "stop":
+            break
+        try:
+            if kind == "create":
+                store.create_conversation(*command[1:])
+            elif kind == "append":
+                conversation_id, role, content, tokens, created_at, write_id = command[1:]
+                message_id = store.append_message(conversation_id, role, content, tokens, created_at, write_id=write_id)
+                index.add(message_id, content)
+                results.put(("written", conversation_id, write_id, True))
+            elif kind == "rename":
+                store.rename_conversation(*command[1:])
+            elif kind == "touch":
+                store.touch_conversation(*command[1:])
+            elif kind == "delete":
+                store.delete_conversation(command[1])
+            elif kind == "reply":
+                stream_id, history = command[1:]
+                cancelled = streams[stream_id] = threading.Event()
+                threading.Thread(
+                    target=stream_reply, args=(backend, stream_id, history, cancelled, results), daemon=True
+                ).start()
+            elif kind == "cancel":
+                cancelled = streams.pop(command[1], None)
+                if cancelled is not None:
+                    cancelled.set()
+            elif kind == "search":
+                request_id, query, limit = command[1:]
+                try:
+                    found = index.search(query, limit)
+                except Exception as e:
+                    # 搜索失败时也要回复，界面不会一直等待结果
+                    found = []
+                    results.put(("failed", f"搜索失败: {e}"))
+                results.put(("search", request_id, found))
+            elif kind == "build_index":
+                # 在主循环中确定已保存消息的范围并进入建立状态，之后写入的消息由索引暂存，不会遗漏或重复
+                thread = index.build_in_background(store.iter_messages(store.last_message_id()))
+                threading.Thread(target=notify_built, args=(thread,), daemon=True).start()
+        except sqlite3.Error as e:
+            # 一条命令失败不能让工作进程退出，否则之后的写入确认、回复和搜索都不会再到达
+            results.put(("failed", f"工作进程读写数据库失败: {e}"))
+            if kind == "append":
+                results.put(("written", command[1], command[6], False))
+    store.close()
+
+
+class RemoteStream:
+    """在工作进程中生成的回复，接口与StreamWorker相同，可以直接交给回复调度器"""
+
+    def __init__(self, client, stream_id, history):
+        self.client = client
+        self.stream_id = stream_id
+        self.history = history
+        self.events = []
+        self.meter = LatencyMeter()
+        # 界面线程已经显示的回复内容
+        self.text = ""
+
+    def start(self):
+        """请工作进程开始生成"""
+        self.client.streams[self.stream_id] = self
+        self.client.send("reply", self.stream_id, self.history)
+
+    def cancel(self):
+        """请工作进程停止生成，之后收到的片段会被丢弃"""
+        self.client.streams.pop(self.stream_id, None)
+        self.client.send("cancel", self.stream_id)
+
+    def drain(self):
+        """取出当前所有已到达的事件，不会阻塞"""
+        self.client.pump()
+        events, self.events = self.events, []
+        return events
+
+
+class WorkerClient:
+    """界面一侧的工作进程代理
+
+    命令通过队列发给工作进程，put 不会等待工作进程处理；
+    结果由界面定期调用 pump 非阻塞地取出并分发，工作进程再忙也不会卡住界面。
+    """
+
+    def __init__(self, db_path=None):
+        """启动工作进程
+
+        Args:
+            db_path: 数据库路径，为None时使用默认路径
+        """
+        # 在界面进程中确定路径，工作进程和界面读取的一定是同一个数据库
+        self.db_path = db_path or default_database_path()
+        # 界面进程已经加载了Tk，用spawn启动干净的新进程，不复制界面的状态
+        context = multiprocessing.get_context("spawn")
+        self.commands = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(target=serve, args=(self.commands, self.results, self.db_path), daemon=True)
+        self.process.start()
+        self.ids = itertools.count()
+        # 回复编号 -> RemoteStream
+        self.streams = {}
+        # 搜索请求编号 -> 回调
+        self.searches = {}
+        # 其它结果的处理函数：结果名称 -> 函数
+        self.handlers = {}
+        # 是否已经报告过工作进程意外退出
+        self.exited = False
+
+    def send(self, *command):
+        """发送一条命令，不等待执行"""
+        self.commands.put(command)
+
+    def stream_worker(self, history):
+        """创建一个在工作进程中生成的回复，用作回复调度器的 worker_factory"""
+        return RemoteStream(self, next(self.ids), history)
+
+    def search(self, query, limit, callback):
+        """请工作进程搜索，结果到达后在 pump 中调用 callback"""
+        request_id = next(self.ids)
+        self.searches[request_id] = callback
+        self.send("search", request_id, query, limit)
+
+    def pump(self):
+        """取出并分发所有已经到达的结果，不会阻塞"""
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return
+            kind = result[0]
+            if kind in ("token", "error", "done"):
+                stream = self.streams.get(result[1])
+                if stream is not None:
+                    stream.events.append((kind, result[2] if kind != "done" else None))
+                    if kind == "done":
+                        del self.streams[result[1]]
+            elif kind == "search":
+                callback = self.searches.pop(result[1], None)
+                if callback is not None:
+                    callback(result[2])
+            elif kind in self.handlers:
+                self.handlers[kind](*result[1:])
+            elif kind == "failed":
+                print(result[1], file=sys.stderr)
+
+    def check_alive(self):
+        """工作进程意外退出时报告一次，之后发送的命令都不会被执行"""
+        if self.exited or self.process.is_alive():
+            return
+        self.exited = True
+        message = f"工作进程意外退出（退出码 {self.process.exitcode}），之后的消息不会被保存"
+        if "failed" in self.handlers:
+            self.handlers["failed"](message)
+        else:
+            print(message, file=sys.stderr)
+
+    def close(self, timeout=30):
+        """等待工作进程写完已经发送的命令后退出
+
+        命令按顺序执行，stop 之前的写入都会完成；超时后强制结束，并报告放弃了剩下的写入。
+        """
+        self.send("stop")
+        self.process.join(timeout)
+        if self.process.is_alive():
+            print(f"工作进程在 {timeout} 秒内没有写完，放弃还没有写入的消息", file=sys.stderr)
+            self.process.terminate()
+
+
+class RemoteStore(UnwrittenMessages):
+    """写入交给工作进程的对话存储
+
+    写入只是把命令放进队列；读取使用界面进程自己的数据库连接（WAL模式下读写互不阻塞）。
+    已经发送但工作进程还没有写入的消息记在内存中，读取对话时补在后面，读到的内容总是完整的。
+    """
+
+    def __init__(self, client, path=None):
+        """初始化
+
+        Args:
+            client: WorkerClient对象
+            path: 数据库路径，默认使用工作进程的数据库
+        """
+        self.client = client
+        # 只用于读取，不压缩也不训练字典，写入都由工作进程完成
+        self.reader = ConversationStore(path or client.db_path, compress_level=0)
+        self.path = self.reader.path
+        self.init_unwritten()
+        # 写入ID -> 确认保存的回调
+        self.saved_callbacks = {}
+        client.handlers["written"] = self.on_written
+
+    def on_written(self, conversation_id, write_id, saved):
+        """工作进程处理完了一条消息，没能写入的消息留在内存中，这次运行中仍然可以读到"""
+        if saved:
+            self.mark_written(conversation_id, write_id)
+        on_saved = self.saved_callbacks.pop(write_id, None)
+        if on_saved is not None:
+            on_saved(saved)
+
+    def create_conversation(self, conversation_id, title, timestamp=None):
+        """请工作进程新建一个对话"""
+        self.client.send("create", conversation_id, title, timestamp or time.time())
+
+    def append_message(self, conversation_id, role, content, tokens=None, created_at=None, on_saved=None):
+        """发送一条消息给工作进程写入
+
+        Args:
+            on_saved: 工作进程写入之后在 pump 中调用，参数为是否保存
+
+        Returns:
+            None，消息ID由工作进程分配，搜索索引也由工作进程更新
+        """
+        created_at = created_at or time.time()
+        write_id = self.add_unwritten(conversation_id, Message(role, content, created_at, tokens))
+        if on_saved is not None:
+            self.saved_callbacks[write_id] = on_saved
+        self.client.send("append", conversation_id, role, content, tokens, created_at, write_id)
+
+    def rename_conversation(self, conversation_id, title):
+        """请工作进程修改对话标题"""
+        self.client.send("rename", conversation_id, title)
+
+    def touch_conversation(self, conversation_id, timestamp=None):
+        """请工作进程更新对话的最近活动时间"""
+        self.client.send("touch", conversation_id, timestamp or time.time())
+
+    def delete_conversation(self, conversation_id):
+        """请工作进程删除对话，丢弃它还没有写入的消息"""
+        self.discard_unwritten(conversation_id)
+        self.client.send("delete", conversation_id)
+
+    def close(self):
+        """关闭读取使用的数据库连接"""
+        self.reader.close()
+
+
+class RemoteSearchIndex:
+    """在工作进程中的搜索索引，只能异步搜索"""
+
+    def __init__(self, client):
+        self.client = client
+        self.building = False
+        client.handlers["index_built"] = self.on_built
+
+    def on_built(self):
+        self.building = False
+
+    def add(self, message_id, text):
+        """工作进程写入消息时自己更新索引，这里不需要做什么"""
+
+    def build_in_background(self, rows):
+        """请工作进程从它的存储建立索引，rows 不会被使用"""
+        rows.close()
+        self.building = True
+        self.client.send("build_index")
+
+    def search_async(self, query, limit, callback):
+        """搜索，结果到达后调用 callback"""
+        self.client.search(query, limit, callback)